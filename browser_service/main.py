@@ -1,27 +1,27 @@
 # main.py
+import os
+import uuid
+import asyncio
 import uvicorn
 import logging
+from typing import Any, Dict
 from contextlib import asynccontextmanager
 from fastapi import FastAPI, WebSocket, WebSocketDisconnect
 from fastapi.responses import HTMLResponse
 
-# Настраиваем логирование ПЕРЕД импортом модулей, чтобы все логгеры получили правильные настройки
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-    force=True  # Перезаписываем существующие настройки (важно если модули импортировались ранее)
-)
+from playwright_bot.log_config import setup_logging
 
-# Явно настраиваем уровень логирования для playwright_bot (мог быть создан до basicConfig)
-playwright_logger = logging.getLogger("playwright_bot")
-playwright_logger.setLevel(logging.INFO)
+# Настраиваем логирование ПЕРЕД импортом модулей, чтобы все логгеры получили правильные настройки.
+# Запись в поток вывода идет из отдельного потока (QueueListener), не из event loop.
+# Уровень playwright_bot задаем явно (логгер мог быть создан до настройки)
+setup_logging("browser_service", os.getenv("LOG_LEVEL", "INFO"), levels={"playwright_bot": "INFO"})
 
 logger = logging.getLogger(__name__)
 
 # --- ⬇️ ВОТ СВЯЗЬ ⬇️ ---
 # Импортируем наш ПУЛ и Менеджер Тасок (после настройки логирования)
 from browser_service.browser_pool import BrowserPool
-from browser_service.task_manager import SessionManager
+from browser_service.task_manager import SessionManager, PipelineStepError, PIPELINES, SEND_STEP
 # --- ⬆️ ВОТ СВЯЗЬ ⬆️ ---
 
 # --- Глобальный Пул и Менеджер Сессий ---
@@ -49,6 +49,7 @@ async def lifespan(app: FastAPI):
     # Остановка: закрываем все активные сессии и пул
     logger.info("Остановка FastAPI: закрытие пула браузеров...")
     await session_manager.cleanup_all_active_sessions()  # Закрывает все активные сессии
+    await session_manager.close()  # Закрывает хранилище сессий
     await pool.stop()
     logger.info("Пул браузеров закрыт")
 
@@ -56,103 +57,233 @@ async def lifespan(app: FastAPI):
 app = FastAPI(title="Завод Исполнителей (MS)", lifespan=lifespan)
 
 # --- WebSocket API ---
-@app.websocket("/api/ws")
-async def websocket_endpoint(websocket: WebSocket):
+class WorkerConnection:
     """
-    Основная "дверь" для "Рабочих" (W1-W4).
-    Управляет сессией и вызывает "мозг" (task_manager).
+    Состояние одного соединения Рабочего.
+    Команды выполняются параллельно (каждая - своя задача по request_id), ответы
+    отправляются по мере готовности с response_to; отправка в сокет сериализована.
     """
-    await websocket.accept()
-    logger.info(f"Клиент (Рабочий) подключился: {websocket.client.host}")
     
-    session_id: str | None = None
+    def __init__(self, websocket: WebSocket):
+        self.websocket = websocket
+        self.sessions: set[str] = set()  # Пошаговые сессии, открытые через это соединение
+        self.tasks: Dict[str, asyncio.Task] = {}  # request_id -> выполняющаяся команда
+        # request_id команд, которые уже отправляют сообщение клиенту: при обрыве не отменяются
+        self.sending: set[str] = set()
+        self._send_lock = asyncio.Lock()
     
-    try:
-        while True:
-            data = await websocket.receive_json()
-            command = data.get("command")
-            task_data = data.get("data", {})
-            req_id = data.get("request_id", "unknown")
+    async def send(self, message: Dict[str, Any]):
+        async with self._send_lock:
+            await self.websocket.send_json(message)
+    
+    def dispatch(self, data: Dict[str, Any]):
+        """Запускает команду отдельной задачей, не дожидаясь ее завершения."""
+        req_id = data.get("request_id") or f"unknown-{uuid.uuid4().hex[:8]}"
+        if req_id in self.tasks:
+            # response_to должен однозначно указывать на запрос
+            task = asyncio.create_task(self.send({
+                "status": "error",
+                "response_to": req_id,
+                "message": f"request_id {req_id} уже выполняется"
+            }))
+        else:
+            task = asyncio.create_task(self.handle_command(req_id, data))
+            self.tasks[req_id] = task
+            task.add_done_callback(lambda _: self._forget(req_id))
+    
+    def _forget(self, req_id: str):
+        self.tasks.pop(req_id, None)
+        self.sending.discard(req_id)
+    
+    def _resolve_session(self, data: Dict[str, Any]) -> str:
+        sid = data.get("session_id")
+        # Без явного session_id - единственная сессия соединения (старые клиенты)
+        if not sid and len(self.sessions) == 1:
+            sid = next(iter(self.sessions))
+        if not sid:
+            raise ValueError("No session_id provided")
+        return sid
+    
+    async def handle_command(self, req_id: str, data: Dict[str, Any]):
+        command = data.get("command")
+        task_data = data.get("data", {})
 
-            logger.info(f"[{req_id}] Получена команда: {command}")
+        logger.log(logging.DEBUG if command == "ping" else logging.INFO, f"[{req_id}] Получена команда: {command}")
 
-            try:
-                match command:
-                    case "session_start":
-                        account_id = task_data.get("account_id")
-                        if not account_id:
-                            raise ValueError("account_id is required")
-                        
-                        session_id = await session_manager.session_start(account_id)
-                        
-                        await websocket.send_json({
-                            "status": "ok",
-                            "response_to": req_id,
-                            "session_id": session_id
-                        })
-                        logger.info(f"[{req_id}] Session started: {session_id}")
-
-                    case "session_stop":
-                        sid = data.get("session_id") or session_id
-                        if sid:
-                            await session_manager.session_stop(sid)
-                            await websocket.send_json({
-                                "status": "ok",
-                                "response_to": req_id
-                            })
-                            session_id = None
-                            break
-                        else:
-                            raise ValueError("No session_id provided")
-
-                    # --- "Умные" ручки (шаги обработки лида) ---
-                    # Последовательность: step_open_leads -> step_open_lead_details -> step_extract_full_name -> step_send_message -> step_extract_phone
-                    case "step_open_leads" | "step_open_lead_details" | "step_extract_full_name" | "step_send_message" | "step_extract_phone":
-                        sid = data.get("session_id") or session_id
-                        if not sid:
-                            raise ValueError("No session_id provided")
-                        
-                        # 1. "Завод" (MS) выполняет шаг
-                        result = await session_manager.execute_step(
-                            session_id=sid,
-                            command=command,
-                            task_data=task_data
-                        )
-                        
-                        # 2. ✅ "Завод" (MS) ГОВОРИТ ВОРКЕРУ, ЧТО СДЕЛАНО
-                        await websocket.send_json({
-                            "status": "ok",
+        try:
+            match command:
+                case "session_start":
+                    account_id = task_data.get("account_id")
+                    if not account_id:
+                        raise ValueError("account_id is required")
+                    
+                    session_id = await session_manager.session_start(account_id)
+                    self.sessions.add(session_id)
+                    
+                    await self.send({
+                        "status": "ok",
+                        "response_to": req_id,
+                        "session_id": session_id
+                    })
+                    logger.info(f"[{req_id}] Session started: {session_id}")
+
+                case "session_stop":
+                    sid = self._resolve_session(data)
+                    await session_manager.session_stop(sid)
+                    self.sessions.discard(sid)
+                    await self.send({
+                        "status": "ok",
+                        "response_to": req_id
+                    })
+
+                case "ping":
+                    await self.send({
+                        "status": "ok",
+                        "response_to": req_id
+                    })
+
+                # --- Весь сценарий обработки лида одной командой ---
+                # Прогресс идет событиями {"status": "progress", "step": ...}, итог - {"status": "ok"}
+                # data.mode: full - с открытием /pro-leads, fast - сразу на страницу лида
+                case "process_lead":
+                    account_id = task_data.get("account_id")
+                    if not account_id:
+                        raise ValueError("account_id is required")
+                    
+                    mode = task_data.get("mode", "full")
+                    steps = ("session_start",) + PIPELINES.get(mode, ())
+                    # После этого шага сценарий отправляет сообщение клиенту
+                    before_send = steps[steps.index(SEND_STEP) - 1] if SEND_STEP in steps else None
+                    
+                    async def send_to_worker(message: Dict[str, Any]):
+                        try:
+                            await self.send(message)
+                        except Exception as e:
+                            # После отправки сообщения клиенту сценарий доводится до конца и без Рабочего
+                            if req_id not in self.sending:
+                                raise
+                            logger.warning(f"[{req_id}] Рабочий отключился, ответ не доставлен ({message.get('step', 'result')}): {e}")
+                    
+                    async def send_progress(step: str, result):
+                        if step == before_send:
+                            self.sending.add(req_id)
+                        await send_to_worker({
+                            "status": "progress",
                             "response_to": req_id,
-                            "command": command,  # Явно указываем, какой шаг выполнен
-                            "session_id": sid,
+                            "command": command,
+                            "step": step,
                             "result": result
                         })
-                        logger.info(f"[{req_id}] Step '{command}' completed successfully")
+                    
+                    result = await session_manager.process_lead(
+                        account_id=account_id,
+                        lead=task_data.get("lead", {}),
+                        message_text=task_data.get("message_text"),
+                        on_progress=send_progress,
+                        mode=mode
+                    )
+                    await send_to_worker({
+                        "status": "ok",
+                        "response_to": req_id,
+                        "command": command,
+                        "result": result
+                    })
+                    logger.info(f"[{req_id}] Pipeline '{command}' completed successfully")
+
+                # --- "Умные" ручки (шаги обработки лида, для отладки сценария по шагам) ---
+                # Последовательность: step_open_leads -> step_open_lead_details -> step_extract_full_name -> step_send_message -> step_extract_phone
+                # (step_open_lead_fast заменяет первые два шага)
+                case "step_open_leads" | "step_open_lead_details" | "step_open_lead_fast" | "step_extract_full_name" | "step_send_message" | "step_extract_phone":
+                    sid = self._resolve_session(data)
+                    if command == SEND_STEP:
+                        self.sending.add(req_id)
+                    
+                    # 1. "Завод" (MS) выполняет шаг
+                    result = await session_manager.execute_step(
+                        session_id=sid,
+                        command=command,
+                        task_data=task_data
+                    )
+                    
+                    # 2. ✅ "Завод" (MS) ГОВОРИТ ВОРКЕРУ, ЧТО СДЕЛАНО
+                    await self.send({
+                        "status": "ok",
+                        "response_to": req_id,
+                        "command": command,  # Явно указываем, какой шаг выполнен
+                        "session_id": sid,
+                        "result": result
+                    })
+                    logger.info(f"[{req_id}] Step '{command}' completed successfully")
 
-                    case _:
-                        raise ValueError(f"Неизвестная команда: {command}")
+                case _:
+                    raise ValueError(f"Неизвестная команда: {command}")
 
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.error(f"[{req_id}] Ошибка выполнения команды {command}{f' (шаг {e.step})' if isinstance(e, PipelineStepError) else ''}: {e}", exc_info=True)
+            # 3. ✅ "Завод" (MS) ГОВОРИТ ВОРКЕРУ, ЧТО ВСЕ ПЛОХО
+            error_response = {
+                "status": "error",
+                "response_to": req_id,
+                "message": str(e)
+            }
+            if isinstance(e, PipelineStepError):
+                error_response["step"] = e.step
+            try:
+                await self.send(error_response)
+            except Exception as send_error:
+                logger.warning(f"[{req_id}] Не удалось отправить ошибку Рабочему: {send_error}")
+    
+    async def close(self):
+        """
+        Отменяет незавершенные команды и закрывает сессии соединения.
+        Команды, уже отправляющие сообщение клиенту, не отменяются: отмена между отправкой
+        и ответом оставила бы сообщение отправленным, но без результата - дожидаемся их.
+        """
+        tasks = list(self.tasks.items())
+        for req_id, task in tasks:
+            if req_id in self.sending:
+                logger.warning(f"[{req_id}] Клиент отключился во время отправки сообщения, команда доводится до конца")
+                continue
+            task.cancel()
+        # process_lead закрывает свою сессию сам (finally) - дожидаемся
+        await asyncio.gather(*(task for _, task in tasks), return_exceptions=True)
+        for sid in list(self.sessions):
+            try:
+                logger.warning(f"Клиент отключился, принудительная очистка сессии {sid}")
+                await session_manager.session_stop(sid)
             except Exception as e:
-                logger.error(f"[{req_id}] Ошибка выполнения команды {command}: {e}", exc_info=True)
-                # 3. ✅ "Завод" (MS) ГОВОРИТ ВОРКЕРУ, ЧТО ВСЕ ПЛОХО
-                await websocket.send_json({
-                    "status": "error",
-                    "response_to": req_id,
-                    "message": str(e)
-                })
+                logger.error(f"Ошибка при очистке сессии {sid}: {e}")
+        self.sessions.clear()
+
+
+@app.websocket("/api/ws")
+async def websocket_endpoint(websocket: WebSocket):
+    """
+    Основная "дверь" для "Рабочих" (W1-W4).
+    Управляет сессиями и вызывает "мозг" (task_manager).
+    Протокол мультиплексированный: по одному соединению идет много запросов одновременно,
+    ответ находится по response_to == request_id. Соединение переживает session_stop
+    (ping - проверка соединения).
+    """
+    await websocket.accept()
+    logger.info(f"Клиент (Рабочий) подключился: {websocket.client.host}")
+    
+    connection = WorkerConnection(websocket)
+    
+    try:
+        while True:
+            data = await websocket.receive_json()
+            connection.dispatch(data)
 
     except WebSocketDisconnect:
         logger.info(f"Клиент (Рабочий) отключился: {websocket.client.host}")
     except Exception as e:
         logger.error(f"Критическая ошибка WebSocket: {e}", exc_info=True)
     finally:
-        # Гарантированно закрываем сессию при отключении
-        if session_id:
-            try:
-                logger.warning(f"Клиент отключился, принудительная очистка сессии {session_id}")
-                await session_manager.session_stop(session_id)
-            except Exception as e:
-                logger.error(f"Ошибка при очистке сессии {session_id}: {e}")
+        # Гарантированно закрываем сессии при отключении
+        await connection.close()
 
 
 # --- Health Check ---
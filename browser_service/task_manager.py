@@ -2,15 +2,49 @@
 import logging
 import uuid
 import os
-import json
 import asyncio
-from typing import Optional, Dict, Any
-from playwright.async_api import BrowserContext, Page
+from typing import Optional, Dict, Any, Callable, Awaitable
+from playwright.async_api import Page
 from browser_service.browser_pool import BrowserPool
 from playwright_bot.thumbtack_bot import ThumbTackBot
+from playwright_bot.session_store import create_session_store
 
 logger = logging.getLogger(__name__)
 
+# Шаги сценария обработки лида (команда process_lead) в порядке выполнения
+PIPELINE_STEPS = (
+    "step_open_leads",
+    "step_open_lead_details",
+    "step_extract_full_name",
+    "step_send_message",
+    "step_extract_phone",
+)
+
+# Быстрый путь: сразу на страницу лида, сессия проверяется в той же навигации (без /pro-leads);
+# если страница лида не открылась - полный путь через /pro-leads внутри step_open_lead_fast
+FAST_PIPELINE_STEPS = (
+    "step_open_lead_fast",
+    "step_extract_full_name",
+    "step_send_message",
+    "step_extract_phone",
+)
+
+PIPELINES = {"full": PIPELINE_STEPS, "fast": FAST_PIPELINE_STEPS}
+
+# Шаг, после начала которого сценарий нельзя прерывать (сообщение уже может уйти клиенту)
+SEND_STEP = "step_send_message"
+
+# Колбэк прогресса сценария: (шаг, результат шага)
+ProgressCallback = Callable[[str, Optional[Dict[str, Any]]], Awaitable[None]]
+
+
+class PipelineStepError(Exception):
+    """Ошибка шага сценария process_lead (step - на каком шаге сценарий прервался)."""
+
+    def __init__(self, step: str, error: Exception):
+        super().__init__(str(error))
+        self.step = step
+
 
 class SessionManager:
     """
@@ -21,6 +55,9 @@ class SessionManager:
     def __init__(self, pool: BrowserPool, sessions_dir: str = "sessions"):
         self.pool = pool
         self.sessions_dir = sessions_dir
+        # Общее хранилище сессий с monitor_service (SESSION_STORE_BACKEND: file/redis/postgres).
+        # Cookies кэшируются в памяти и перечитываются только при смене версии.
+        self.store = create_session_store(sessions_dir)
         self.sessions: Dict[str, Dict[str, Any]] = {}
         self._lock = asyncio.Lock()  # Защищает доступ к self.sessions
     
@@ -29,16 +66,15 @@ class SessionManager:
         os.makedirs(self.sessions_dir, exist_ok=True)
         logger.info(f"Папка сессий {self.sessions_dir} готова.")
     
-    def _get_session_path(self, account_id: str) -> str:
-        """Генерирует стандартизированный путь к файлу сессии."""
-        return os.path.join(self.sessions_dir, f"session_{account_id}.json")
+    async def close(self):
+        """Закрывает хранилище сессий. Вызывается из main.py при остановке."""
+        await self.store.close()
     
     async def session_start(self, account_id: str) -> str:
         """
         Создает новую сессию для аккаунта.
         Получает контекст из пула, загружает cookies, создает бота.
         """
-        session_path = self._get_session_path(account_id)
         session_id = f"session_{uuid.uuid4().hex[:8]}"
         context = None
         page = None
@@ -51,17 +87,14 @@ class SessionManager:
             context, page, browser_for_session = await self.pool.get_preloaded_context()
             logger.info(f"[SessionManager] ✅ Контекст получен для {account_id}")
             
-            # Загружаем cookies из файла сессии (если есть)
-            if os.path.exists(session_path):
-                try:
-                    with open(session_path, 'r') as f:
-                        storage_state = json.load(f)
-                    cookies = storage_state.get("cookies", [])
-                    if cookies:
-                        await context.add_cookies(cookies)
-                        logger.info(f"[SessionManager] Загружено {len(cookies)} cookies для {account_id}")
-                except Exception as e:
-                    logger.warning(f"[SessionManager] Ошибка при загрузке сессии: {e}")
+            # Загружаем cookies из хранилища сессий (если есть)
+            try:
+                cookies = await self.store.get_cookies(account_id)
+                if cookies:
+                    await context.add_cookies(cookies)
+                    logger.info(f"[SessionManager] Загружено {len(cookies)} cookies для {account_id}")
+            except Exception as e:
+                logger.warning(f"[SessionManager] Ошибка при загрузке сессии: {e}")
             
             # Регистрируем сессию
             async with self._lock:
@@ -70,7 +103,6 @@ class SessionManager:
                     "page": page,
                     "bot": None,
                     "account_id": account_id,
-                    "session_path": session_path,
                     "is_preloaded": True,
                     "browser": browser_for_session
                 }
@@ -86,20 +118,29 @@ class SessionManager:
             logger.info(f"[SessionManager] Session {session_id} created for {account_id}")
             return session_id
             
-        except Exception as e:
-            # При ошибке очищаем сессию и возвращаем контекст в пул
-            async with self._lock:
-                self.sessions.pop(session_id, None)
+        except BaseException as e:
+            # При ошибке или отмене (клиент отключился) очищаем сессию и возвращаем контекст в пул.
+            # Без await до запуска возврата: повторная отмена не должна оставить контекст вне пула.
+            self.sessions.pop(session_id, None)
             
             if context and page and browser_for_session:
-                logger.warning(f"[SessionManager] Ошибка при старте сессии {session_id}: {e}. Возвращаем контекст.")
-                try:
-                    await self.pool.release_preloaded_context(context, page, browser_for_session)
-                except Exception as release_error:
-                    logger.error(f"[SessionManager] Ошибка при возврате контекста: {release_error}")
+                if isinstance(e, asyncio.CancelledError):
+                    logger.warning(f"[SessionManager] Старт сессии {session_id} отменен. Возвращаем контекст.")
+                else:
+                    logger.warning(f"[SessionManager] Ошибка при старте сессии {session_id}: {e}. Возвращаем контекст.")
+                await asyncio.shield(asyncio.ensure_future(
+                    self._release_context(context, page, browser_for_session)
+                ))
             
             raise
     
+    async def _release_context(self, context, page: Page, browser_for_session) -> None:
+        """Возвращает контекст в пул, ошибки только логируются."""
+        try:
+            await self.pool.release_preloaded_context(context, page, browser_for_session)
+        except Exception as release_error:
+            logger.error(f"[SessionManager] Ошибка при возврате контекста: {release_error}")
+    
     async def session_stop(self, session_id: str) -> None:
         """
         Закрывает сессию и возвращает контекст в пул.
@@ -117,17 +158,16 @@ class SessionManager:
         # Извлекаем данные из сессии
         context = session.get("context")
         page = session.get("page")
-        session_path = session.get("session_path")
+        account_id = session.get("account_id")
         is_preloaded = session.get("is_preloaded", False)
         browser_for_session = session.get("browser") if is_preloaded else None
 
         try:
             # Пытаемся сохранить сессию (не критично, если не удастся)
-            if context and session_path:
+            if context and account_id:
                 try:
                     storage_state = await context.storage_state()
-                    with open(session_path, 'w') as f:
-                        json.dump(storage_state, f)
+                    await self.store.put(account_id, storage_state)
                     logger.info(f"[SessionManager] 💾 Сессия {session_id} сохранена")
                 except Exception as e:
                     logger.warning(f"[SessionManager] Ошибка при сохранении сессии {session_id}: {e}")
@@ -172,6 +212,14 @@ class SessionManager:
                 await bot.open_lead_details(lead)
                 return {"url": page.url, "status": "opened"}
             
+            case "step_open_lead_fast":
+                # step_open_leads + step_open_lead_details одной навигацией
+                lead = task_data.get("lead", {})
+                if not lead:
+                    raise ValueError("lead data is required")
+                await bot.open_lead_details(lead, detect_login=True)
+                return {"url": page.url, "status": "opened"}
+            
             case "step_extract_full_name":
                 full_name = await bot.extract_full_name_from_details()
                 return {"full_name": full_name}
@@ -187,3 +235,51 @@ class SessionManager:
             
             case _:
                 raise ValueError(f"Unknown command: {command}")
+    
+    async def process_lead(
+        self,
+        account_id: str,
+        lead: Dict[str, Any],
+        message_text: Optional[str] = None,
+        on_progress: Optional[ProgressCallback] = None,
+        mode: str = "full"
+    ) -> Dict[str, Any]:
+        """
+        Весь сценарий обработки лида за одну команду: session_start -> PIPELINES[mode] -> session_stop.
+        После каждого шага вызывается on_progress(step, result). Сессия закрывается всегда.
+        """
+        if not lead:
+            raise ValueError("lead data is required")
+        if mode not in PIPELINES:
+            raise ValueError(f"Unknown pipeline mode: {mode}")
+        
+        step = "session_start"
+        try:
+            session_id = await self.session_start(account_id)
+        except Exception as e:
+            raise PipelineStepError(step, e) from e
+        results: Dict[str, Optional[Dict[str, Any]]] = {}
+        try:
+            if on_progress:
+                await on_progress(step, {"session_id": session_id})
+            
+            step_data = {
+                "step_open_lead_details": {"lead": lead},
+                "step_open_lead_fast": {"lead": lead},
+                "step_send_message": {"message_text": message_text},
+            }
+            for step in PIPELINES[mode]:
+                results[step] = await self.execute_step(session_id, step, step_data.get(step, {}))
+                if on_progress:
+                    await on_progress(step, results[step])
+        except Exception as e:
+            raise PipelineStepError(step, e) from e
+        finally:
+            # Отмена команды (клиент отключился) не должна прервать возврат контекста в пул
+            await asyncio.shield(asyncio.ensure_future(self.session_stop(session_id)))
+        
+        return {
+            "session_id": session_id,
+            "full_name": (results.get("step_extract_full_name") or {}).get("full_name"),
+            "phone": (results.get("step_extract_phone") or {}).get("phone"),
+        }
@@ -0,0 +1,94 @@
+#!/usr/bin/env python3
+"""
+Замер стоимости разбора ответа /api/pro/new-leads (monitor_service.lead_parser).
+Прогоняет parse_new_leads на ответах из 1, 50 и 500 лидов: первый разбор
+(lead_key еще не в кэше) и повторный (тот же ответ в следующем цикле опроса).
+
+Ответ берется из --payload (сохраненный JSON /api/pro/new-leads); newLeads из него
+размножаются до нужного размера с уникальными bidPK. Без --payload используется
+встроенный образец лида.
+"""
+
+import os
+import sys
+import copy
+import json
+import timeit
+import argparse
+from typing import Any, Dict, List
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from monitor_service.lead_parser import parse_new_leads, lead_key_for_bid
+
+SAMPLE_LEAD: Dict[str, Any] = {
+    "bidPK": "500000000000000000",
+    "isUnread": True,
+    "customerContactTime": "2024-01-01T12:00:00Z",
+    "componentGroups": [
+        {
+            "intentComponents": [
+                {"type": "avatarTitleSubtitle", "title": "John D.", "subtitle": "Just now"},
+            ],
+            "requestDetailComponents": [
+                {
+                    "title": "House Cleaning",
+                    "iconTitleAddressGroups": [
+                        {
+                            "iconTitleAddresses": [
+                                {"icon": "calendar--small", "title": "Flexible"},
+                                {"icon": "map-pin--small", "title": "Austin, TX 78701"},
+                            ]
+                        }
+                    ],
+                }
+            ],
+        }
+    ],
+}
+
+
+def build_payload(template_leads: List[Dict[str, Any]], size: int) -> Dict[str, Any]:
+    """Ответ API из size лидов (копии образцов с уникальными bidPK)."""
+    leads = []
+    for i in range(size):
+        lead = copy.deepcopy(template_leads[i % len(template_leads)])
+        lead["bidPK"] = str(500000000000000000 + i)
+        leads.append(lead)
+    return {"newLeads": leads}
+
+
+def bench(payload: Dict[str, Any], number: int) -> Dict[str, float]:
+    """Среднее время разбора в микросекундах: с холодным и прогретым кэшем lead_key."""
+    cold = 0.0
+    for _ in range(number):
+        lead_key_for_bid.cache_clear()
+        cold += timeit.timeit(lambda: parse_new_leads(payload), number=1)
+    warm = timeit.timeit(lambda: parse_new_leads(payload), number=number)
+    return {"cold_us": cold / number * 1e6, "warm_us": warm / number * 1e6}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Бенчмарк разбора ответа /api/pro/new-leads")
+    parser.add_argument("--payload", help="Сохраненный JSON ответа /api/pro/new-leads")
+    parser.add_argument("--sizes", default="1,50,500", help="Количество лидов в ответе (через запятую)")
+    parser.add_argument("--number", type=int, default=200, help="Повторов на каждый размер")
+    args = parser.parse_args()
+
+    template_leads = [SAMPLE_LEAD]
+    if args.payload:
+        with open(args.payload, "r", encoding="utf-8") as f:
+            template_leads = json.load(f).get("newLeads") or template_leads
+
+    print(f"{'leads':>6} {'cold, us':>12} {'warm, us':>12} {'warm/lead, us':>14}")
+    for size in (int(s) for s in args.sizes.split(",")):
+        payload = build_payload(template_leads, size)
+        result = bench(payload, args.number)
+        print(
+            f"{size:>6} {result['cold_us']:>12.1f} {result['warm_us']:>12.1f} "
+            f"{result['warm_us'] / size:>14.2f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,135 @@
+#!/usr/bin/env python3
+"""
+Замер time-to-phone на сохраненной странице треда: фиксированные паузы (как было:
+500 мс после перехода, 600 мс до и после клика "show phone") против ожиданий по условию
+в ThumbTackBot._show_and_extract_in_current_thread (ссылка tel: / кнопка показа телефона).
+
+Страница (по умолчанию cli/fixtures/send_thread.html) открывается через
+set_content без сети; отрисовка React эмулируется: контент появляется в #app-page-root
+через --render-ms, телефон после клика по кнопке - через --reveal-ms.
+Сценарии:
+  shown - ссылка tel: уже есть в отрисованной странице
+  click - телефон появляется только после клика по кнопке показа
+"""
+
+import os
+import re
+import sys
+import json
+import time
+import asyncio
+import argparse
+import statistics
+from typing import List, Optional
+
+from playwright.async_api import async_playwright
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from playwright_bot.thumbtack_bot import ThumbTackBot
+from playwright_bot.tt_selectors import SHOW_PHONE_BUTTON, SHOW_PHONE_BUTTON_CLASS
+
+DEFAULT_FIXTURE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures", "send_thread.html")
+PHONE = "+15550100000"
+PHONE_LINK_HTML = f'<a href="tel:{PHONE}">{PHONE}</a>'
+SHOW_PHONE_HTML = '<button class="_3HFh8Wm0kL8FRvqW7u0LOA" type="button">Click to show phone number</button>'
+TEL_RE = re.compile(r'href="tel:(\+\d+)"')
+SCRIPT_RE = re.compile(r"<script\b.*?</script>", re.S | re.I)
+
+SHELL = """<html><head></head><body><div id="app-page-root"></div><script>
+const CONTENT = %(content)s;
+const PHONE_LINK = %(phone_link)s;
+setTimeout(() => { document.getElementById('app-page-root').innerHTML = CONTENT; }, %(render_ms)d);
+document.addEventListener('click', (e) => {
+  if (e.target.closest('button._3HFh8Wm0kL8FRvqW7u0LOA')) {
+    setTimeout(() => document.getElementById('app-page-root').insertAdjacentHTML('afterbegin', PHONE_LINK), %(reveal_ms)d);
+  }
+});
+</script></body></html>"""
+
+
+def build_page(fixture_html: str, scenario: str, render_ms: int, reveal_ms: int) -> str:
+    """HTML страницы-стенда: контент фикстуры без скриптов + телефон или кнопка показа."""
+    body = fixture_html.split("<body>", 1)[-1].rsplit("</body>", 1)[0]
+    body = SCRIPT_RE.sub("", body)
+    body = (PHONE_LINK_HTML if scenario == "shown" else SHOW_PHONE_HTML) + body
+    return SHELL % {
+        "content": json.dumps(body),
+        "phone_link": json.dumps(PHONE_LINK_HTML),
+        "render_ms": render_ms,
+        "reveal_ms": reveal_ms,
+    }
+
+
+async def legacy_extract(page) -> Optional[str]:
+    """Прежний алгоритм с фиксированными паузами (для сравнения)."""
+    await page.wait_for_timeout(500)  # extract_phone: пауза после перехода на тред
+    await page.wait_for_timeout(600)
+    match = TEL_RE.search(await page.content())
+    if match:
+        return match.group(1)
+    button = page.locator(SHOW_PHONE_BUTTON_CLASS)
+    if await button.count() == 0:
+        button = page.locator(SHOW_PHONE_BUTTON)
+    if await button.count() > 0:
+        await button.first.click()
+        await page.wait_for_timeout(600)
+        match = TEL_RE.search(await page.content())
+    return match.group(1) if match else None
+
+
+async def bench(page, html: str, mode: str, number: int) -> dict:
+    """Время до телефона (мс) и доля успешных извлечений за number прогонов."""
+    bot = ThumbTackBot(page)
+    timings: List[float] = []
+    found = 0
+    for _ in range(number):
+        await page.set_content(html, wait_until="domcontentloaded")
+        start = time.perf_counter()
+        if mode == "legacy":
+            phone = await legacy_extract(page)
+        else:
+            phone = await bot._show_and_extract_in_current_thread()
+        timings.append((time.perf_counter() - start) * 1000)
+        found += phone == PHONE
+    timings.sort()
+    return {
+        "mean_ms": statistics.mean(timings),
+        "p95_ms": timings[min(len(timings) - 1, int(0.95 * len(timings)))],
+        "found": found / number,
+    }
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="Бенчмарк time-to-phone: фиксированные паузы против ожиданий по условию")
+    parser.add_argument("--fixture", default=DEFAULT_FIXTURE, help="Сохраненный HTML страницы треда")
+    parser.add_argument("--render-ms", default="100,400,900", help="Задержки отрисовки контента (через запятую)")
+    parser.add_argument("--reveal-ms", type=int, default=150, help="Задержка появления телефона после клика")
+    parser.add_argument("--number", type=int, default=10, help="Прогонов на каждый вариант")
+    args = parser.parse_args()
+
+    with open(args.fixture, "r", encoding="utf-8") as f:
+        fixture_html = f.read()
+
+    async with async_playwright() as pw:
+        browser = await pw.chromium.launch(headless=True)
+        page = await browser.new_page()
+        # Стенд без сети: ресурсы фикстуры (картинки, стили) не загружаются
+        await page.route("**/*", lambda route: route.abort())
+        try:
+            print(f"{'scenario':>8} {'render, ms':>10} {'mode':>7} {'mean, ms':>9} {'p95, ms':>8} {'found':>6}")
+            for scenario in ("shown", "click"):
+                for render_ms in (int(v) for v in args.render_ms.split(",")):
+                    html = build_page(fixture_html, scenario, render_ms, args.reveal_ms)
+                    for mode in ("legacy", "waits"):
+                        result = await bench(page, html, mode, args.number)
+                        print(
+                            f"{scenario:>8} {render_ms:>10} {mode:>7} {result['mean_ms']:>9.0f} "
+                            f"{result['p95_ms']:>8.0f} {result['found']:>6.0%}"
+                        )
+        finally:
+            await browser.close()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,149 @@
+#!/usr/bin/env python3
+"""
+Проверяет FactoryConnectionPool (workers/factory_pool.py) без Завода (MS):
+переиспользование свежего соединения, ping после простоя и закрытие
+соединений, простаивающих дольше idle_timeout.
+Запуск: python cli/test_factory_pool.py или python -m pytest cli/test_factory_pool.py
+"""
+
+import json
+import os
+import sys
+from typing import List
+
+# Добавляем путь к воркерам (factory_pool импортирует config из своей папки)
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "workers"))
+
+from factory_pool import FactoryConnectionPool, PooledConnection
+
+
+class FakeWebSocket:
+    """WebSocket-заглушка: на ping отвечает ok (или ошибкой, если ping_ok=False)."""
+
+    def __init__(self, ping_ok: bool = True):
+        self.ping_ok = ping_ok
+        self.sent: List[dict] = []
+        self.closed = False
+
+    def send(self, data: str):
+        self.sent.append(json.loads(data))
+
+    def recv(self) -> str:
+        if not self.ping_ok:
+            raise ConnectionError("connection reset")
+        return json.dumps({"status": "ok", "response_to": self.sent[-1]["request_id"]})
+
+    def close(self):
+        self.closed = True
+
+
+class FakePool(FactoryConnectionPool):
+    """Пул, который вместо подключения к Заводу создает FakeWebSocket."""
+
+    def __init__(self, **kwargs):
+        super().__init__("ws://factory.invalid", max_size=2, **kwargs)
+        self.created: List[FakeWebSocket] = []
+
+    def _connect(self) -> PooledConnection:
+        ws = FakeWebSocket()
+        self.created.append(ws)
+        self.connects += 1
+        return PooledConnection(ws)
+
+
+def make_idle(conn: PooledConnection, seconds: float):
+    """Сдвигает время последнего использования соединения на seconds назад."""
+    conn.last_used -= seconds
+
+
+def test_fresh_connection_reused_without_ping():
+    pool = FakePool(idle_timeout_sec=300, ping_after_idle_sec=30)
+    conn = pool.acquire()
+    pool.release(conn)
+    again = pool.acquire()
+    assert again is conn
+    assert conn.ws.sent == []
+    assert pool.stats() == {"idle": 0, "connects": 1, "reuses": 1}
+    pool.release(again)
+
+
+def test_ping_after_idle():
+    pool = FakePool(idle_timeout_sec=300, ping_after_idle_sec=30)
+    conn = pool.acquire()
+    pool.release(conn)
+    make_idle(conn, 60)
+    again = pool.acquire()
+    assert again is conn
+    assert [message["command"] for message in conn.ws.sent] == ["ping"]
+    pool.release(again)
+
+
+def test_failed_ping_reconnects():
+    pool = FakePool(idle_timeout_sec=300, ping_after_idle_sec=30)
+    conn = pool.acquire()
+    pool.release(conn)
+    make_idle(conn, 60)
+    conn.ws.ping_ok = False
+    again = pool.acquire()
+    assert again is not conn
+    assert conn.ws.closed
+    assert pool.connects == 2
+    pool.release(again)
+
+
+def test_idle_eviction_on_acquire():
+    """Соединения, простоявшие дольше idle_timeout после затишья, закрываются при следующей выдаче без ping."""
+    pool = FakePool(idle_timeout_sec=300, ping_after_idle_sec=30)
+    first = pool.acquire()
+    second = pool.acquire()
+    pool.release(first)
+    pool.release(second)
+    make_idle(first, 600)
+    make_idle(second, 600)
+    conn = pool.acquire()
+    assert first.ws.closed and second.ws.closed
+    assert first.ws.sent == [] and second.ws.sent == []
+    assert conn not in (first, second)
+    assert pool.stats()["idle"] == 0
+    pool.release(conn)
+
+
+def test_idle_eviction_on_release():
+    pool = FakePool(idle_timeout_sec=300, ping_after_idle_sec=30)
+    stale = pool.acquire()
+    busy = pool.acquire()
+    pool.release(stale)
+    make_idle(stale, 600)
+    pool.release(busy)
+    assert stale.ws.closed
+    assert not busy.ws.closed
+    assert pool.stats()["idle"] == 1
+
+
+def test_broken_connection_not_returned():
+    pool = FakePool(idle_timeout_sec=300, ping_after_idle_sec=30)
+    conn = pool.acquire()
+    pool.release(conn, broken=True)
+    assert conn.ws.closed
+    assert pool.stats()["idle"] == 0
+    # Слот освобожден: можно взять max_size соединений
+    pool.release(pool.acquire(timeout=0.1))
+
+
+def main():
+    print("🧪 Тест FactoryConnectionPool")
+    print("=" * 50)
+    for test in (
+        test_fresh_connection_reused_without_ping,
+        test_ping_after_idle,
+        test_failed_ping_reconnects,
+        test_idle_eviction_on_acquire,
+        test_idle_eviction_on_release,
+        test_broken_connection_not_returned,
+    ):
+        test()
+        print(f"✅ {test.__name__}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,141 @@
+#!/usr/bin/env python3
+"""
+Проверяет, что monitor_service.lead_parser.parse_new_leads разбирает ответ
+/api/pro/new-leads так же, как прежний разбор в AccountMonitor (до выноса в lead_parser).
+Запуск: python cli/test_lead_parser.py или python -m pytest cli/test_lead_parser.py
+"""
+
+import copy
+import hashlib
+import os
+import sys
+from typing import Any, Dict, List
+
+# Добавляем путь к проекту
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from monitor_service.lead_parser import parse_new_leads, lead_key_for_bid
+
+SAMPLE_LEAD: Dict[str, Any] = {
+    "bidPK": "500000000000000000",
+    "isUnread": True,
+    "customerContactTime": "2024-01-01T12:00:00Z",
+    "componentGroups": [
+        {
+            "intentComponents": [
+                {"type": "avatarTitleSubtitle", "title": " John D. ", "subtitle": "Just now"},
+            ],
+            "requestDetailComponents": [
+                {
+                    "title": "House Cleaning ",
+                    "iconTitleAddressGroups": [
+                        {
+                            "iconTitleAddresses": [
+                                {"icon": "calendar--small", "title": "Flexible"},
+                                {"icon": "map-pin--small", "title": "Austin, TX 78701"},
+                            ]
+                        }
+                    ],
+                }
+            ],
+        }
+    ],
+}
+
+
+def legacy_parse(json_data: Any) -> List[Dict[str, Any]]:
+    """Прежний разбор из AccountMonitor (эталон для сравнения)."""
+    if not isinstance(json_data, dict):
+        return []
+    leads = []
+    for index, lead_data in enumerate(json_data.get("newLeads", [])):
+        bid_pk = lead_data.get("bidPK", "")
+        name = ""
+        category = ""
+        location = ""
+        for group in lead_data.get("componentGroups", []):
+            for component in group.get("intentComponents", []):
+                if component.get("type") == "avatarTitleSubtitle":
+                    name = component.get("title", "")
+            for component in group.get("requestDetailComponents", []):
+                category = component.get("title", "")
+                for icon_group in component.get("iconTitleAddressGroups", []):
+                    for addr in icon_group.get("iconTitleAddresses", []):
+                        if addr.get("icon") == "map-pin--small":
+                            location = addr.get("title", "")
+        href = f"/pro-leads/{bid_pk}" if bid_pk else ""
+        if not href:
+            continue
+        leads.append({
+            "index": index,
+            "href": href,
+            "lead_id": href.replace("/pro-leads/", ""),
+            "lead_key": hashlib.md5(href.encode("utf-8")).hexdigest(),
+            "name": name.strip(),
+            "category": category.strip(),
+            "location": location.strip(),
+            "has_view": True,
+        })
+    return leads
+
+
+def build_payloads() -> List[Any]:
+    """Ответы API: обычный, с пропусками, с повторами компонентов и нестроковым bidPK."""
+    no_bid = copy.deepcopy(SAMPLE_LEAD)
+    del no_bid["bidPK"]
+
+    empty_bid = copy.deepcopy(SAMPLE_LEAD)
+    empty_bid["bidPK"] = ""
+
+    int_bid = copy.deepcopy(SAMPLE_LEAD)
+    int_bid["bidPK"] = 500000000000000001
+
+    no_groups = {"bidPK": "500000000000000002"}
+
+    # Повторы: при нескольких значениях берется последнее
+    repeated = copy.deepcopy(SAMPLE_LEAD)
+    repeated["bidPK"] = "500000000000000003"
+    second_group = copy.deepcopy(SAMPLE_LEAD["componentGroups"][0])
+    second_group["intentComponents"][0]["title"] = "Jane S."
+    second_group["requestDetailComponents"][0]["title"] = "Plumbing"
+    second_group["requestDetailComponents"][0]["iconTitleAddressGroups"][0]["iconTitleAddresses"] = [
+        {"icon": "calendar--small", "title": "ASAP"},
+    ]
+    repeated["componentGroups"].append(second_group)
+
+    return [
+        {"newLeads": [SAMPLE_LEAD, no_bid, empty_bid, int_bid, no_groups, repeated]},
+        {"newLeads": []},
+        {},
+        [],
+        None,
+    ]
+
+
+def test_parse_matches_legacy():
+    """Новый разбор дает те же записи, что и прежний."""
+    for payload in build_payloads():
+        expected = legacy_parse(payload)
+        actual = [lead.to_dict() for lead in parse_new_leads(payload)]
+        assert actual == expected, f"Разбор отличается для {payload!r}:\n{actual}\n!=\n{expected}"
+    # newLeads: null прежний разбор не поддерживал (падал), новый считает пустым списком
+    assert parse_new_leads({"newLeads": None}) == []
+
+
+def test_lead_key_matches_bot():
+    """lead_key совпадает с ThumbTackBot.lead_key_from_url(href)."""
+    href = "/pro-leads/500000000000000000"
+    assert lead_key_for_bid("500000000000000000") == hashlib.md5(href.encode("utf-8")).hexdigest()
+
+
+def main():
+    print("🧪 Тест lead_parser: сравнение с прежним разбором")
+    print("=" * 50)
+    test_parse_matches_legacy()
+    print("✅ parse_new_leads совпадает с прежним разбором")
+    test_lead_key_matches_bot()
+    print("✅ lead_key совпадает с lead_key_from_url")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,107 @@
+#!/usr/bin/env python3
+"""
+Проверяет SessionWriter (monitor_service.session_writer): debounce, пропуск
+неизмененного состояния и сохранение, пришедшее во время записи.
+Запуск: python cli/test_session_writer.py или python -m pytest cli/test_session_writer.py
+"""
+
+import asyncio
+import os
+import sys
+from typing import Any, Dict, List, Optional
+
+# Добавляем путь к проекту
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from monitor_service.session_writer import SessionWriter
+from playwright_bot.session_store import SessionEntry, SessionStore
+
+
+class SlowStore(SessionStore):
+    """Хранилище в памяти с медленной записью (put_delay сек)."""
+
+    def __init__(self, put_delay: float = 0.0):
+        super().__init__(cache_ttl_sec=0)
+        self.put_delay = put_delay
+        self.puts: List[Dict[str, Any]] = []
+
+    async def _read(self, account_id: str) -> Optional[SessionEntry]:
+        if not self.puts:
+            return None
+        return SessionEntry(version=len(self.puts), storage_state=self.puts[-1])
+
+    async def _read_version(self, account_id: str) -> Optional[int]:
+        return len(self.puts) or None
+
+    async def _write(self, account_id: str, storage_state: Dict[str, Any]) -> int:
+        await asyncio.sleep(self.put_delay)
+        self.puts.append(storage_state)
+        return len(self.puts)
+
+
+def state(value: int) -> Dict[str, Any]:
+    return {"cookies": [{"name": "sid", "value": str(value)}], "origins": []}
+
+
+async def check_debounce():
+    """Серия сохранений подряд схлопывается в одну запись, повтор того же состояния не пишется."""
+    store = SlowStore()
+    writer = SessionWriter("acc", store, debounce_sec=0.05)
+    for value in range(5):
+        await writer.save(state(value))
+    await asyncio.sleep(0.15)
+    assert store.puts == [state(4)], store.puts
+
+    await writer.save(state(4))
+    await asyncio.sleep(0.15)
+    assert len(store.puts) == 1, store.puts
+
+
+async def check_save_during_flush():
+    """Состояние, сохраненное во время записи, записывается следующей отложенной записью."""
+    store = SlowStore(put_delay=0.1)
+    writer = SessionWriter("acc", store, debounce_sec=0.05)
+    await writer.save(state(1))
+    # Ждем, пока отложенная запись начнется (debounce прошел, put еще идет)
+    await asyncio.sleep(0.08)
+    await writer.save(state(2))
+    await asyncio.sleep(0.4)
+    assert store.puts == [state(1), state(2)], store.puts
+    assert writer._flush_task.done()
+
+
+async def check_close_flushes():
+    """close() отменяет ожидание debounce и сразу записывает последнее состояние."""
+    store = SlowStore()
+    writer = SessionWriter("acc", store, debounce_sec=10)
+    await writer.save(state(7))
+    await writer.close()
+    assert store.puts == [state(7)], store.puts
+    assert await writer.load() == state(7)
+
+
+def test_debounce():
+    asyncio.run(check_debounce())
+
+
+def test_save_during_flush():
+    asyncio.run(check_save_during_flush())
+
+
+def test_close_flushes():
+    asyncio.run(check_close_flushes())
+
+
+def main():
+    print("🧪 Тест SessionWriter")
+    print("=" * 50)
+    test_debounce()
+    print("✅ Debounce и пропуск неизмененного состояния")
+    test_save_during_flush()
+    print("✅ Сохранение во время записи не теряется")
+    test_close_flushes()
+    print("✅ close() записывает последнее состояние")
+
+
+if __name__ == "__main__":
+    main()
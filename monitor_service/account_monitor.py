@@ -14,8 +14,16 @@ from playwright.async_api import Browser, BrowserContext, Page
 
 from monitor_service.config import CONFIG
 from monitor_service.database.schemas import Account
+from monitor_service.dedup_cache import LeadDedupCache
+from monitor_service.poll_scheduler import create_poll_scheduler
+from monitor_service.hedging import RequestHedger
+from monitor_service.lead_parser import NewLead, parse_new_leads
+from monitor_service.metrics import AccountMetrics
+from monitor_service.restart_coordinator import RestartCoordinator
+from monitor_service.session_writer import SessionWriter
 
 from playwright_bot.thumbtack_bot import ThumbTackBot
+from playwright_bot.session_store import SessionStore, FileSessionStore
 
 logger = logging.getLogger(__name__)
 
@@ -26,23 +34,66 @@ class AccountMonitor:
     Запускает бесконечный цикл проверки новых лидов.
     """
     
-    def __init__(self, account: Account, celery_app, browser_pool, db_client):
+    def __init__(
+        self,
+        account: Account,
+        publisher,
+        browser_pool,
+        db_client,
+        restart_coordinator: Optional[RestartCoordinator] = None,
+        session_store: Optional[SessionStore] = None,
+        metrics: Optional[AccountMetrics] = None,
+    ):
         self.account = account
-        self.celery_app = celery_app
+        self.publisher = publisher  # Неблокирующая отправка лидов в RabbitMQ
         self.browser_pool = browser_pool  # Пул браузеров (один браузер для всех)
         self.db_client = db_client  # Клиент БД для дедупликации лидов
+        # Общий координатор перезапусков контекстов (разносит рестарты по времени)
+        self.restart_coordinator = restart_coordinator or RestartCoordinator(CONFIG.restart_interval_sec)
+        # Кэш обработанных лидов (повторные ключи не идут в БД)
+        self.dedup_cache = LeadDedupCache(
+            max_size=CONFIG.dedup_cache_size,
+            ttl_sec=CONFIG.dedup_cache_ttl_sec
+        )
         self.stop_event = asyncio.Event()
+        # Гистограммы и счетчики цикла (отдаются MonitorService на /metrics)
+        self.metrics = metrics or AccountMetrics(CONFIG.metrics_window)
+        # Планировщик пауз между циклами опроса
+        self.scheduler = create_poll_scheduler(CONFIG)
+        # Hedged-запросы к API (опционально, CONFIG.hedged_requests)
+        self.hedger: Optional[RequestHedger] = None
+        if CONFIG.hedged_requests:
+            self.hedger = RequestHedger(
+                min_delay_sec=CONFIG.hedge_min_delay_sec,
+                max_delay_sec=CONFIG.hedge_max_delay_sec
+            )
+        
+        # Отпечаток последнего ответа /api/pro/new-leads: если тело не изменилось,
+        # лиды уже разобраны и прошли дедупликацию - повторно не обрабатываем
+        self._last_payload_fingerprint: Optional[bytes] = None
         
         # Playwright ресурсы
         # НЕ храним playwright и browser - они в browser_pool
         self.context: Optional[BrowserContext] = None
         self.page: Optional[Page] = None
         self.bot: Optional[ThumbTackBot] = None
-        
-        # Путь к файлу сессии
-        self.session_path = os.path.join(
-            CONFIG.sessions_dir,
-            f"session_{account.account_id}.json"
+        # Фоновая подготовка резервного контекста для перезапуска без паузы
+        self._standby_task: Optional[asyncio.Task] = None
+        # Текущее восстановление сессии (WAF challenge / 401) - одно на аккаунт, остальные его ждут
+        self._repair_task: Optional[asyncio.Task] = None
+        
+        # HTTP fast-path (CONFIG.poll_backend == "http"): опрос API без BrowserContext.
+        # Контекст открывается только для WAF challenge / переавторизации и закрывается после.
+        self.http_session = None
+        if CONFIG.poll_backend == "http":
+            from monitor_service.http_poller import HttpSession
+            self.http_session = HttpSession(CONFIG.http_user_agent, CONFIG.http_max_connections)
+        
+        # Запись сессии в общее хранилище (файлы/Redis/Postgres) вне event loop и с debounce
+        self.session_writer = SessionWriter(
+            account.account_id,
+            session_store or FileSessionStore(CONFIG.sessions_dir),
+            debounce_sec=CONFIG.session_save_debounce_sec
         )
         
         logger.info(f"[Monitor {account.account_id}] Инициализирован")
@@ -55,6 +106,9 @@ class AccountMonitor:
             # Создаем папку для сессий
             os.makedirs(CONFIG.sessions_dir, exist_ok=True)
             
+            # Прогреваем кэш дедупликации недавними лидами из БД
+            await self._warm_dedup_cache()
+            
             # Инициализируем Playwright
             await self._init_browser()
             
@@ -64,27 +118,60 @@ class AccountMonitor:
         except Exception as e:
             logger.error(f"[Monitor {self.account.account_id}] Критическая ошибка: {e}", exc_info=True)
         finally:
-            # Гарантированная очистка
-            await self._cleanup()
+            # Гарантированная очистка: отмена задачи монитора не прерывает ее на середине
+            cleanup = asyncio.ensure_future(self._cleanup())
+            try:
+                await asyncio.shield(cleanup)
+            except asyncio.CancelledError:
+                await asyncio.wait({cleanup})
+                raise
+    
+    async def _warm_dedup_cache(self):
+        """Загружает в кэш дедупликации лиды, обработанные за последние N дней."""
+        if CONFIG.dedup_cache_warmup_days <= 0:
+            return
+        try:
+            lead_keys = await self.db_client.get_recent_lead_keys(
+                self.account.account_id,
+                days=CONFIG.dedup_cache_warmup_days,
+                limit=CONFIG.dedup_cache_size
+            )
+            # Ключи приходят от свежих к старым - добавляем в обратном порядке, чтобы свежие были "горячими"
+            self.dedup_cache.add_many(reversed(lead_keys))
+            logger.info(f"[Monitor {self.account.account_id}] Кэш дедупликации прогрет: {len(lead_keys)} лидов")
+        except Exception as e:
+            logger.warning(f"[Monitor {self.account.account_id}] Не удалось прогреть кэш дедупликации: {e}")
     
     async def _init_browser(self):
-        """Инициализирует контекст (вкладку) из общего браузера."""
-        logger.info(f"[Monitor {self.account.account_id}] Инициализация контекста...")
-        
-        # Берем браузер из пула (один браузер для всех мониторов)
-        browser = await self.browser_pool.get_browser()
-        
-        # Загружаем сессию, если есть
-        storage_state = None
-        if os.path.exists(self.session_path):
-            logger.info(f"[Monitor {self.account.account_id}] Загрузка сессии из {self.session_path}")
-            try:
-                with open(self.session_path, 'r') as f:
-                    storage_state = json.load(f)
-            except Exception as e:
-                logger.warning(f"[Monitor {self.account.account_id}] Не удалось загрузить сессию: {e}")
+        """Инициализирует контекст и, в режиме HTTP fast-path, переносит cookies в HTTP-клиент."""
+        await self._open_context()
+        if self.http_session is not None:
+            await self._switch_to_http()
+    
+    async def _ensure_context(self):
+        """Открывает контекст, если он был закрыт (HTTP fast-path)."""
+        if self.context is None:
+            logger.info(f"[Monitor {self.account.account_id}] Открываем контекст браузера для восстановления сессии")
+            await self._open_context()
+    
+    async def _switch_to_http(self):
+        """Переносит cookies из контекста в HTTP-клиент и закрывает контекст (освобождает память)."""
+        if self.context is None or self.http_session is None:
+            return
+        storage_state = await self.context.storage_state()
+        self.http_session.load_storage_state(storage_state)
+        await self._save_session()
         
-        # Создаем контекст (вкладку) из общего браузера
+        context = self.context
+        self.context = None
+        try:
+            await context.close()
+        except Exception:
+            pass
+        logger.info(f"[Monitor {self.account.account_id}] Опрос API через HTTP-клиент, контекст браузера закрыт")
+    
+    async def _new_context(self, browser: Browser, storage_state: Optional[Dict[str, Any]]) -> BrowserContext:
+        """Создает контекст с настройками монитора (и cookies из storage_state, если есть)."""
         context_options = {
             "locale": "en-US",
             "viewport": {"width": 1920, "height": 1080}
@@ -92,9 +179,96 @@ class AccountMonitor:
         if storage_state:
             context_options["storage_state"] = storage_state
         
-        self.context = await browser.new_context(**context_options)
+        context = await browser.new_context(**context_options)
         # Устанавливаем явный default timeout для всех операций (чтобы избежать 20 сек по умолчанию)
-        self.context.set_default_timeout(5000)  # 5 секунд вместо дефолтных 30
+        context.set_default_timeout(5000)  # 5 секунд вместо дефолтных 30
+        return context
+    
+    async def _prepare_standby_context(self) -> Optional[BrowserContext]:
+        """
+        Готовит замену текущему контексту (make-before-break), пока основной цикл продолжает опрос.
+        Возвращает проверенный контекст (storage_state загружен, /api/pro/new-leads отвечает 200)
+        или None, если замена не прошла проверку и нужен обычный перезапуск с авторизацией.
+        """
+        async with self.restart_coordinator.slot(self.account.account_id):
+            storage_state = await self._current_storage_state()
+            if not storage_state:
+                return None
+            
+            browser = await self.browser_pool.get_browser()
+            standby = await self._new_context(browser, storage_state)
+            ready = False
+            try:
+                try:
+                    response = await standby.request.get(
+                        f"{CONFIG.base_url}/api/pro/new-leads",
+                        timeout=5000
+                    )
+                    if response.status == 200:
+                        logger.info(f"[Monitor {self.account.account_id}] Резервный контекст готов")
+                        ready = True
+                        return standby
+                    logger.warning(
+                        f"[Monitor {self.account.account_id}] Резервный контекст не прошел проверку (status {response.status})"
+                    )
+                except Exception as e:
+                    logger.warning(f"[Monitor {self.account.account_id}] Ошибка проверки резервного контекста: {e}")
+                return None
+            finally:
+                # Закрываем и при отмене задачи (_cleanup), иначе контекст остается в браузере
+                if not ready:
+                    try:
+                        await standby.close()
+                    except Exception:
+                        pass
+    
+    async def _swap_context(self, standby: BrowserContext):
+        """Атомарно подменяет текущий контекст готовым резервным и закрывает старый."""
+        # Пока резервный контекст готовился, cookies активной сессии могли обновиться -
+        # переносим актуальные, иначе подмена откатила бы сессию к снимку
+        try:
+            storage_state = await self._current_storage_state()
+            if storage_state and storage_state.get("cookies"):
+                await standby.add_cookies(storage_state["cookies"])
+        except Exception as e:
+            logger.warning(f"[Monitor {self.account.account_id}] Не удалось обновить cookies резервного контекста, подмена отменена: {e}")
+            try:
+                await standby.close()
+            except Exception:
+                pass
+            return
+        
+        old_context = self.context
+        self.context = standby
+        if old_context:
+            try:
+                await old_context.close()
+            except Exception:
+                pass
+        await self._save_session()
+        # В режиме HTTP fast-path обновляем cookies клиента и закрываем контекст
+        if self.http_session is not None:
+            await self._switch_to_http()
+        logger.info(f"[Monitor {self.account.account_id}] Контекст заменен без паузы в опросе")
+    
+    async def _open_context(self):
+        """Создает контекст (вкладку) из общего браузера и проверяет авторизацию."""
+        logger.info(f"[Monitor {self.account.account_id}] Инициализация контекста...")
+        
+        # Берем браузер из пула (один браузер для всех мониторов)
+        browser = await self.browser_pool.get_browser()
+        
+        # Загружаем сессию, если есть (последнее сохраненное состояние, даже если еще не на диске)
+        storage_state = None
+        try:
+            storage_state = await self.session_writer.load()
+            if storage_state:
+                logger.info(f"[Monitor {self.account.account_id}] Загружена сохраненная сессия")
+        except Exception as e:
+            logger.warning(f"[Monitor {self.account.account_id}] Не удалось загрузить сессию: {e}")
+        
+        # Создаем контекст (вкладку) из общего браузера
+        self.context = await self._new_context(browser, storage_state)
         
         # Блокируем ненужные ресурсы для ускорения и добавляем заголовки против кеширования
         async def handle_route(route):
@@ -185,77 +359,59 @@ class AccountMonitor:
         # Переинициализируем браузер (используем ту же логику)
         await self._init_browser()
     
-    async def _get_leads_from_api(self) -> Optional[List[Dict[str, Any]]]:
+    async def _get_leads_from_api(self) -> Optional[List[NewLead]]:
         """
         Получает лиды напрямую через API, без загрузки страницы.
         Использует авторизацию из контекста (cookies).
         
         Returns:
-            Список лидов в формате, совместимом с list_new_leads(), 
+            Список NewLead (поля как в list_new_leads()),
             или None если нужна переавторизация (401)
         """
-        # Добавляем timestamp для гарантированного обхода кеша (как window.location.reload(true))
-        # Это гарантирует, что каждый запрос уникален и не будет кешироваться
-        timestamp = int(time.time() * 1000)  # миллисекунды
-        api_url = f"{CONFIG.base_url}/api/pro/new-leads?_t={timestamp}"
-        
-        headers = {
-            "Accept": "application/json",
-            "Cache-Control": "no-cache, no-store, must-revalidate",
-            "Pragma": "no-cache",
-            "Expires": "0",
-            "X-Requested-With": "XMLHttpRequest",  # Указываем, что это AJAX запрос
-        }
-        
         try:
-            # Используем request из контекста (он уже авторизован через cookies)
-            response = await self.context.request.get(
-                api_url,
-                headers=headers,
-                timeout=2000  # Быстрый таймаут - 2 секунды
-            )
+            response = await self._request_new_leads()
             
-            # Проверяем WAF challenge (202 с заголовком x-amzn-waf-action: challenge)
-            waf_action = response.headers.get('x-amzn-waf-action', '')
-            if response.status == 202 and waf_action == 'challenge':
+            # WAF challenge (202 с заголовком x-amzn-waf-action: challenge): восстанавливаем сессию
+            # и повторяем запрос ровно один раз
+            if self._is_waf_challenge(response):
+                self.metrics.inc("waf_challenges_total")
                 logger.warning(
-                    f"[Monitor {self.account.account_id}] API вернул 202 с WAF challenge - нужно открыть страницу для прохождения challenge"
+                    f"[Monitor {self.account.account_id}] API вернул 202 с WAF challenge - восстанавливаем сессию"
                 )
-                # Открываем страницу в браузере для прохождения WAF challenge
-                if not self.page or self.page.is_closed():
-                    self.page = await self.context.new_page()
-                try:
-                    await self.page.goto(f"{CONFIG.base_url}/pro-leads", wait_until="networkidle", timeout=20000)
-                    await asyncio.sleep(3)  # Даем время на прохождение challenge
-                    # Сохраняем обновленную сессию после прохождения challenge
-                    await self._save_session()
-                    # Закрываем страницу
-                    await self.page.close()
-                    self.page = None
-                    logger.info(f"[Monitor {self.account.account_id}] WAF challenge пройден, повторяем API запрос")
-                    # Повторяем API запрос после прохождения challenge
-                    return await self._get_leads_from_api()
-                except Exception as e:
-                    logger.error(f"[Monitor {self.account.account_id}] Ошибка при прохождении WAF challenge: {e}")
-                    if self.page and not self.page.is_closed():
-                        await self.page.close()
-                    self.page = None
+                if not await self._repair_session("waf"):
+                    return []
+                response = await self._request_new_leads()
+                if self._is_waf_challenge(response):
+                    logger.error(
+                        f"[Monitor {self.account.account_id}] WAF challenge повторился сразу после восстановления сессии"
+                    )
                     return []
             
             if response.status == 200 or response.status == 202:
                 # 200 OK или 202 Accepted (без WAF challenge) - оба статуса означают успешный ответ
                 try:
-                    json_data = await response.json()
+                    body = await response.body()
+                    fingerprint = hashlib.blake2b(body, digest_size=16).digest()
+                    if fingerprint == self._last_payload_fingerprint:
+                        logger.debug(
+                            f"[Monitor {self.account.account_id}] Ответ API не изменился, пропускаем разбор",
+                            extra=self._log_extra("same_payload")
+                        )
+                        return []
+                    json_data = json.loads(body)
                     # Логируем количество лидов в ответе для отладки
                     new_leads_count = len(json_data.get("newLeads", []))
                     logger.info(
                         f"[Monitor {self.account.account_id}] API вернул JSON (status {response.status}), "
-                        f"newLeads в ответе: {new_leads_count}"
+                        f"newLeads в ответе: {new_leads_count}",
+                        extra=self._log_extra("api_response")
                     )
-                    leads = self._extract_leads_from_api_response(json_data)
+                    leads = parse_new_leads(json_data, f"[Monitor {self.account.account_id}]")
                     logger.info(
-                        f"[Monitor {self.account.account_id}] Извлечено {len(leads)} лидов после обработки"
+                        f"[Monitor {self.account.account_id}] Извлечено {len(leads)} лидов после обработки",
+                        extra=self._log_extra("api_response_parsed")
                     )
+                    self._last_payload_fingerprint = fingerprint
                     return leads
                 except Exception as json_error:
                     # Если не JSON, логируем первые 200 символов ответа для отладки
@@ -267,6 +423,7 @@ class AccountMonitor:
                     )
                     return []
             elif response.status == 401:
+                self.metrics.inc("unauthorized_total")
                 logger.warning(
                     f"[Monitor {self.account.account_id}] API вернул 401 - нужна переавторизация"
                 )
@@ -287,103 +444,175 @@ class AccountMonitor:
             )
             return []
     
-    def _extract_leads_from_api_response(self, json_data: Dict[str, Any]) -> List[Dict[str, Any]]:
-        """
-        Извлекает лиды из ответа API /api/pro/new-leads.
-        Формат данных идентичен list_new_leads() для совместимости.
+    async def _request_new_leads(self):
+        """Один запрос к /api/pro/new-leads через текущий контекст или HTTP-клиент (с hedging, если включен)."""
+        # Добавляем timestamp для гарантированного обхода кеша (как window.location.reload(true))
+        # Это гарантирует, что каждый запрос уникален и не будет кешироваться
+        timestamp = int(time.time() * 1000)  # миллисекунды
+        api_url = f"{CONFIG.base_url}/api/pro/new-leads?_t={timestamp}"
+        
+        headers = {
+            "Accept": "application/json",
+            "Cache-Control": "no-cache, no-store, must-revalidate",
+            "Pragma": "no-cache",
+            "Expires": "0",
+            "X-Requested-With": "XMLHttpRequest",  # Указываем, что это AJAX запрос
+        }
+        
+        # Используем request из контекста (он уже авторизован через cookies)
+        context = self.context
         
-        Args:
-            json_data: JSON ответ от API
+        def make_request():
+            return context.request.get(
+                api_url,
+                headers=headers,
+                timeout=2000  # Быстрый таймаут - 2 секунды
+            )
+        
+        if self.http_session is not None:
+            http_session = self.http_session
             
+            def make_request():
+                return http_session.get(api_url, headers=headers, timeout=2000)
+        
+        if self.hedger:
+            return await self.hedger.run(make_request)
+        return await make_request()
+    
+    @staticmethod
+    def _is_waf_challenge(response) -> bool:
+        return response.status == 202 and response.headers.get('x-amzn-waf-action', '') == 'challenge'
+    
+    async def _repair_session(self, reason: str) -> bool:
+        """
+        Восстанавливает сессию после WAF challenge ("waf") или 401 ("auth").
+        Single-flight: пока восстановление идет, повторные вызовы ждут его результат, а не запускают свое.
+        
         Returns:
-            Список лидов в формате, идентичном list_new_leads()
+            True, если после восстановления API снова отвечает 200
         """
-        leads = []
+        if self._repair_task is None or self._repair_task.done():
+            self._repair_task = asyncio.ensure_future(self._run_session_repair(reason))
+        # shield: отмена одного из ожидающих не прерывает восстановление для остальных
+        return await asyncio.shield(self._repair_task)
     
-        if not isinstance(json_data, dict):
-            logger.error(
-                f"[Monitor {self.account.account_id}] API ответ имеет неожиданный тип: {type(json_data)}. "
-                f"Ожидается dict с ключом 'newLeads'"
-            )
-            return []
-        
-        # Извлекаем список лидов из ответа
-        new_leads = json_data.get("newLeads", [])
+    async def _run_session_repair(self, reason: str) -> bool:
+        """Попытки восстановления с ограничением по времени и экспоненциальным backoff между ними."""
+        repair_start = asyncio.get_event_loop().time()
+        max_attempts = max(1, CONFIG.session_repair_max_attempts)
+        for attempt in range(1, max_attempts + 1):
+            try:
+                repaired = await asyncio.wait_for(
+                    self._repair_session_once(reason),
+                    timeout=CONFIG.session_repair_timeout_sec
+                )
+            except asyncio.TimeoutError:
+                logger.warning(
+                    f"[Monitor {self.account.account_id}] Восстановление сессии ({reason}): "
+                    f"попытка {attempt}/{max_attempts} не уложилась в {CONFIG.session_repair_timeout_sec:.0f}сек"
+                )
+                repaired = False
+            except Exception as e:
+                logger.warning(
+                    f"[Monitor {self.account.account_id}] Восстановление сессии ({reason}): "
+                    f"попытка {attempt}/{max_attempts} завершилась ошибкой: {e}"
+                )
+                repaired = False
+            finally:
+                await self._close_repair_page()
+            
+            if repaired:
+                # Новые cookies - в HTTP-клиент, контекст закрываем
+                await self._switch_to_http()
+                self.metrics.observe("session_repair_seconds", asyncio.get_event_loop().time() - repair_start)
+                logger.info(
+                    f"[Monitor {self.account.account_id}] Сессия восстановлена ({reason}) за "
+                    f"{asyncio.get_event_loop().time() - repair_start:.2f}сек, попытка {attempt}"
+                )
+                return True
+            
+            if attempt < max_attempts:
+                await asyncio.sleep(CONFIG.session_repair_backoff_sec * 2 ** (attempt - 1))
         
-        logger.info(
-            f"[Monitor {self.account.account_id}] API ответ содержит {len(new_leads)} элементов в newLeads"
+        self.metrics.observe("session_repair_seconds", asyncio.get_event_loop().time() - repair_start)
+        logger.error(
+            f"[Monitor {self.account.account_id}] Не удалось восстановить сессию ({reason}) "
+            f"за {max_attempts} попыток, повторим в следующем цикле"
         )
+        # Контекст не держим открытым до следующей попытки (в режиме HTTP fast-path)
+        if self.http_session is not None and self.context is not None:
+            context = self.context
+            self.context = None
+            try:
+                await context.close()
+            except Exception:
+                pass
+        return False
+    
+    async def _repair_session_once(self, reason: str) -> bool:
+        """Одна попытка: открыть /pro-leads, дождаться прохождения challenge, при необходимости войти, проверить API."""
+        await self._ensure_context()
+        waf_token_before = await self._get_waf_token()
         
-        # Логируем bidPK всех лидов для отладки
-        if new_leads:
-            bid_pks = [lead.get("bidPK", "N/A") for lead in new_leads]
-            logger.info(f"[Monitor {self.account.account_id}] Найдено лидов в API: {len(new_leads)}, bidPK: {bid_pks}")
+        self.page = await self.context.new_page()
+        await self.page.goto(f"{CONFIG.base_url}/pro-leads", wait_until="domcontentloaded", timeout=10000)
         
-        for index, lead_data in enumerate(new_leads):
-            bid_pk = lead_data.get("bidPK", "")
-            customer_contact_time = lead_data.get("customerContactTime", "")
-            is_unread = lead_data.get("isUnread", True)
-            
-            # Логируем информацию о каждом лиде
-            logger.info(
-                f"[Monitor {self.account.account_id}] Лид #{index+1}: bidPK={bid_pk}, "
-                f"isUnread={is_unread}, customerContactTime={customer_contact_time}"
+        if reason == "waf" and not await self._wait_for_waf_token(waf_token_before):
+            logger.warning(
+                f"[Monitor {self.account.account_id}] Cookie WAF не обновился за {CONFIG.waf_challenge_timeout_sec:.0f}сек"
             )
-            
-            # Извлекаем данные из componentGroups
-            component_groups = lead_data.get("componentGroups", [])
-            
-            name = ""
-            category = ""
-            location = ""
-            
-            for group in component_groups:
-                # Извлекаем имя из intentComponents
-                intent_components = group.get("intentComponents", [])
-                for component in intent_components:
-                    if component.get("type") == "avatarTitleSubtitle":
-                        name = component.get("title", "")
-                
-                # Извлекаем категорию и адрес из requestDetailComponents
-                request_components = group.get("requestDetailComponents", [])
-                for component in request_components:
-                    category = component.get("title", "")
-                    
-                    # Извлекаем адрес
-                    icon_groups = component.get("iconTitleAddressGroups", [])
-                    for icon_group in icon_groups:
-                        icon_addresses = icon_group.get("iconTitleAddresses", [])
-                        for addr in icon_addresses:
-                            if addr.get("icon") == "map-pin--small":
-                                location = addr.get("title", "")
-            
-            # Формируем href (используем bidPK)
-            href = f"/pro-leads/{bid_pk}" if bid_pk else ""
-            
-            if not href:
-                continue
-            
-            # Извлекаем lead_id из href (как в list_new_leads)
-            if href.startswith("/pro-leads/"):
-                lead_id = href.replace("/pro-leads/", "")
-            else:
-                lead_id = hashlib.md5((href or "").encode("utf-8")).hexdigest()[:12]
-            
-            # Формат идентичен list_new_leads() для совместимости
-            lead = {
-                "index": index,
-                "href": href,
-                "lead_id": lead_id,
-                "lead_key": self.bot.lead_key_from_url(href) if self.bot else "",
-                "name": name.strip(),
-                "category": category.strip(),
-                "location": location.strip(),
-                "has_view": True,
-            }
-            
-            leads.append(lead)
+            return False
         
-        return leads
+        if "login" in self.page.url.lower():
+            # Бот с реальной страницей нужен только на время входа
+            self.bot = ThumbTackBot(
+                self.page,
+                email=self.account.email,
+                password=self.account.password
+            )
+            await self._ensure_authenticated(self.page)
+        
+        response = await self.context.request.get(f"{CONFIG.base_url}/api/pro/new-leads", timeout=5000)
+        if response.status != 200:
+            logger.warning(
+                f"[Monitor {self.account.account_id}] После восстановления сессии API вернул {response.status}"
+            )
+            return False
+        
+        await self._save_session()
+        return True
+    
+    async def _get_waf_token(self) -> Optional[str]:
+        """Значение cookie aws-waf-token в текущем контексте (его выставляет скрипт WAF challenge)."""
+        for cookie in await self.context.cookies(CONFIG.base_url):
+            if cookie.get("name") == "aws-waf-token":
+                return cookie.get("value")
+        return None
+    
+    async def _wait_for_waf_token(self, previous: Optional[str]) -> bool:
+        """Ждет нового aws-waf-token (challenge пройден) вместо фиксированной паузы."""
+        deadline = asyncio.get_event_loop().time() + CONFIG.waf_challenge_timeout_sec
+        while asyncio.get_event_loop().time() < deadline:
+            token = await self._get_waf_token()
+            if token and token != previous:
+                return True
+            await asyncio.sleep(0.2)
+        return False
+    
+    async def _close_repair_page(self):
+        """Закрывает страницу восстановления; бот снова работает без страницы (API режим)."""
+        if self.page is not None:
+            try:
+                if not self.page.is_closed():
+                    await self.page.close()
+            except Exception:
+                pass
+            self.page = None
+        self.bot = ThumbTackBot(
+            None,
+            email=self.account.email,
+            password=self.account.password
+        )
     
     async def _ensure_authenticated(self, page=None):
         """Проверяет авторизацию и переавторизуется при необходимости."""
@@ -400,13 +629,20 @@ class AccountMonitor:
             # Сохраняем новое состояние после переавторизации
             await self._save_session()
     
+    async def _current_storage_state(self) -> Optional[Dict[str, Any]]:
+        """Актуальное состояние сессии: из контекста или (HTTP fast-path) из HTTP-клиента."""
+        if self.context:
+            return await self.context.storage_state()
+        if self.http_session is not None and self.http_session.loaded:
+            return self.http_session.storage_state()
+        return None
+    
     async def _save_session(self):
-        """Сохраняет сессию в файл."""
+        """Сохраняет сессию (запись в файл отложенная и пропускается, если cookies не изменились)."""
         try:
-            if self.context:
-                storage_state = await self.context.storage_state()
-                with open(self.session_path, 'w') as f:
-                    json.dump(storage_state, f)
+            storage_state = await self._current_storage_state()
+            if storage_state:
+                await self.session_writer.save(storage_state)
                 logger.debug(f"[Monitor {self.account.account_id}] Сессия сохранена")
         except Exception as e:
             logger.warning(f"[Monitor {self.account.account_id}] Ошибка при сохранении сессии: {e}")
@@ -417,30 +653,54 @@ class AccountMonitor:
         Получает лиды напрямую через API /api/pro/new-leads.
         """
         cycle_count = 0
-        last_restart_time = asyncio.get_event_loop().time()
+        self.restart_coordinator.register(self.account.account_id)
         last_cycle_start = asyncio.get_event_loop().time()
         last_auth_check_time = asyncio.get_event_loop().time()
         auth_check_interval = 300  # Проверяем авторизацию раз в 5 минут
         
         logger.info(f"[Monitor {self.account.account_id}] Запуск цикла мониторинга (API режим)...")
         
+        # Разносим старт мониторов, чтобы аккаунты не опрашивались синхронно
+        await asyncio.sleep(self.scheduler.initial_delay())
+        
         while not self.stop_event.is_set():
             try:
                 cycle_start = asyncio.get_event_loop().time()
                 cycle_count += 1
                 
-                # Проверяем, не пора ли перезапустить браузер (каждые 3 часа)
+                # Перезапуск контекста (по расписанию координатора или по памяти) - make-before-break:
+                # резервный контекст готовится в фоне, опрос идет через текущий, затем подмена
                 current_time = asyncio.get_event_loop().time()
-                if current_time - last_restart_time > CONFIG.restart_interval_sec:
-                    logger.info(f"[Monitor {self.account.account_id}] Перезапуск браузера (прошло {CONFIG.restart_interval_sec} сек)")
-                    await self._restart_browser()
-                    last_restart_time = current_time
+                if self._standby_task is not None and self._standby_task.done():
+                    standby = None
+                    try:
+                        standby = self._standby_task.result()
+                    except Exception as e:
+                        logger.warning(f"[Monitor {self.account.account_id}] Ошибка подготовки резервного контекста: {e}")
+                    self._standby_task = None
+                    if standby is not None:
+                        await self._swap_context(standby)
+                    else:
+                        # Резервный контекст не годится (например, нужна авторизация) - обычный перезапуск
+                        async with self.restart_coordinator.slot(self.account.account_id):
+                            logger.info(f"[Monitor {self.account.account_id}] Перезапуск контекста")
+                            await self._restart_browser()
                     last_auth_check_time = current_time
+                elif self._standby_task is None and self.restart_coordinator.should_restart(self.account.account_id):
+                    if self.http_session is not None:
+                        # HTTP fast-path: контекст закрыт, резервный был бы сразу закрыт после подмены -
+                        # только отмечаем перезапуск у координатора
+                        async with self.restart_coordinator.slot(self.account.account_id):
+                            pass
+                    else:
+                        logger.info(f"[Monitor {self.account.account_id}] Подготовка резервного контекста для перезапуска")
+                        self._standby_task = asyncio.ensure_future(self._prepare_standby_context())
                 
                 # Периодически проверяем авторизацию через API (раз в 5 минут)
                 # Если API вернет 401, тогда откроем страницу для переавторизации
                 auth_time = 0.0
-                if current_time - last_auth_check_time > auth_check_interval:
+                # В режиме HTTP fast-path отдельная проверка не нужна - 401 виден в каждом опросе
+                if self.http_session is None and current_time - last_auth_check_time > auth_check_interval:
                     auth_start = asyncio.get_event_loop().time()
                     # Проверяем авторизацию через API запрос
                     try:
@@ -449,17 +709,9 @@ class AccountMonitor:
                             timeout=2000
                         )
                         if test_response.status == 401:
+                            self.metrics.inc("unauthorized_total")
                             logger.warning(f"[Monitor {self.account.account_id}] API вернул 401, нужна переавторизация")
-                            # Открываем страницу для переавторизации
-                            if not self.page or self.page.is_closed():
-                                self.page = await self.context.new_page()
-                            await self.page.goto(f"{CONFIG.base_url}/pro-leads", wait_until="domcontentloaded", timeout=10000)
-                            await self._ensure_authenticated(self.page)
-                            # Сохраняем сессию после переавторизации
-                            await self._save_session()
-                            # Закрываем страницу после переавторизации
-                            await self.page.close()
-                            self.page = None
+                            await self._repair_session("auth")
                     except Exception as e:
                         logger.warning(f"[Monitor {self.account.account_id}] Ошибка при проверке авторизации: {e}")
                     auth_time = asyncio.get_event_loop().time() - auth_start
@@ -469,48 +721,14 @@ class AccountMonitor:
                 api_start = asyncio.get_event_loop().time()
                 leads = await self._get_leads_from_api()
                 api_time = asyncio.get_event_loop().time() - api_start
+                self.metrics.observe("poll_latency_seconds", api_time)
+                self.metrics.observe("leads_per_cycle", len(leads) if leads else 0)
                 
                 # Если API вернул 401 (leads == None), нужна немедленная переавторизация
                 if leads is None:
                     logger.warning(f"[Monitor {self.account.account_id}] API вернул 401, немедленная переавторизация...")
                     auth_start = asyncio.get_event_loop().time()
-                    try:
-                        # Открываем страницу для переавторизации
-                        if not self.page or (self.page and self.page.is_closed()):
-                            self.page = await self.context.new_page()
-                        await self.page.goto(f"{CONFIG.base_url}/pro-leads", wait_until="domcontentloaded", timeout=10000)
-                        
-                        # Создаем бота с правильной страницей для переавторизации
-                        self.bot = ThumbTackBot(
-                            self.page,
-                            email=self.account.email,
-                            password=self.account.password
-                        )
-                        
-                        await self._ensure_authenticated(self.page)
-                        # Сохраняем сессию после переавторизации
-                        await self._save_session()
-                        # Закрываем страницу после переавторизации
-                        await self.page.close()
-                        self.page = None
-                        # Обновляем бота для API режима (без страницы)
-                        self.bot = ThumbTackBot(
-                            None,
-                            email=self.account.email,
-                            password=self.account.password
-                        )
-                        logger.info(f"[Monitor {self.account.account_id}] Переавторизация завершена")
-                    except Exception as e:
-                        logger.error(f"[Monitor {self.account.account_id}] Ошибка при переавторизации: {e}", exc_info=True)
-                        # В случае ошибки закрываем страницу и сбрасываем бота
-                        if self.page and not self.page.is_closed():
-                            await self.page.close()
-                        self.page = None
-                        self.bot = ThumbTackBot(
-                            None,
-                            email=self.account.email,
-                            password=self.account.password
-                        )
+                    await self._repair_session("auth")
                     auth_time = asyncio.get_event_loop().time() - auth_start
                     last_auth_check_time = current_time
                     # После переавторизации пропускаем обработку лидов в этом цикле
@@ -518,22 +736,26 @@ class AccountMonitor:
                 
                 # Логируем результат API запроса
                 if leads:
-                    logger.info(
-                        f"[Monitor {self.account.account_id}][cycle={cycle_count}]: "
-                        f"Найдено {len(leads)} лидов через API (за {api_time:.2f}сек)"
-                    )
                     processed = await self._process_leads(leads)
+                    self.scheduler.on_cycle_result(processed)
+                    # Те же лиды повторно (все уже обработаны) - выборочно
                     logger.info(
                         f"[Monitor {self.account.account_id}][cycle={cycle_count}]: "
-                        f"обработано {processed}/{len(leads)} лидов"
+                        f"найдено {len(leads)} лидов через API (за {api_time:.2f}сек), обработано {processed}",
+                        extra=self._log_extra(None if processed else "same_leads")
                     )
                 else:
                     logger.debug(
                         f"[Monitor {self.account.account_id}][cycle={cycle_count}]: "
-                        f"лидов не найдено (API запрос: {api_time:.2f}сек)"
+                        f"лидов не найдено (API запрос: {api_time:.2f}сек)",
+                        extra=self._log_extra("no_leads")
                     )
                 
                 cycle_duration = asyncio.get_event_loop().time() - cycle_start
+                self.metrics.observe("cycle_seconds", cycle_duration)
+                self.metrics.inc("cycles_total")
+                self.metrics.set("dedup_cache_hits_total", self.dedup_cache.hits)
+                self.metrics.set("dedup_cache_misses_total", self.dedup_cache.misses)
                 time_since_last = cycle_start - last_cycle_start if cycle_count > 1 else 0
                 last_cycle_start = cycle_start
                 
@@ -541,17 +763,27 @@ class AccountMonitor:
                     f"[Monitor {self.account.account_id}][cycle={cycle_count}] "
                     f"Время цикла: {cycle_duration:.2f}сек "
                     f"(API: {api_time:.2f}сек, auth: {auth_time:.2f}сек) "
-                    f"С момента прошлого цикла: {time_since_last:.2f}сек"
+                    f"С момента прошлого цикла: {time_since_last:.2f}сек "
+                    f"(кэш дедупликации: hits={self.dedup_cache.hits}, misses={self.dedup_cache.misses})",
+                    extra=self._log_extra("cycle_timing" if not leads else None, cycle=cycle_count,
+                                          cycle_sec=round(cycle_duration, 3), api_sec=round(api_time, 3))
                 )
+                if self.hedger:
+                    self.metrics.set("hedges_total", self.hedger.hedges)
+                    self.metrics.set("hedge_wins_total", self.hedger.hedge_wins)
+                    self.metrics.set("primary_wins_total", self.hedger.primary_wins)
                 
-                await asyncio.sleep(CONFIG.poll_interval_sec)
+                await asyncio.sleep(self.scheduler.next_delay(cycle_duration))
                 
             except Exception as e:
                 logger.error(
                     f"[Monitor {self.account.account_id}][cycle={cycle_count}]: ошибка: {e}",
                     exc_info=True
                 )
-                await asyncio.sleep(CONFIG.poll_interval_sec)
+                self.metrics.inc("errors_total")
+                # Цикл мог прерваться посреди обработки - следующий ответ разбираем полностью
+                self._last_payload_fingerprint = None
+                await asyncio.sleep(self.scheduler.next_delay(asyncio.get_event_loop().time() - cycle_start))
     
     async def _restart_browser(self):
         """Перезапускает контекст (для обновления сессии и очистки памяти)."""
@@ -576,94 +808,161 @@ class AccountMonitor:
         # _init_browser_context() сам сохранит сессию, поэтому не нужно делать это дважды
         await self._init_browser_context()
     
-    async def _process_leads(self, leads: List[Dict[str, Any]]) -> int:
+    async def _process_leads(self, leads: List[NewLead]) -> int:
         """
         Обрабатывает найденные лиды и отправляет их в RabbitMQ.
-        Использует БД для дедупликации (проверяет processed_leads).
+        Дедупликация: сначала кэш, затем атомарный claim в processed_leads
+        (INSERT ... ON CONFLICT DO NOTHING RETURNING) - в очередь уходят только
+        лиды, забранные этим монитором, поэтому повторной отправки не бывает.
         Возвращает количество обработанных лидов.
         """
-        processed_count = 0
-        
-        for lead in leads:
-            lead_key = lead.get("lead_key")
-            if not lead_key:
-                continue
-            
-            # Проверяем в БД, не обработан ли уже этот лид
+        leads = [lead for lead in leads if lead.lead_key]
+        if not leads:
+            return 0
+        
+        # Сначала кэш: повторные ключи отвечаются без обращения к БД
+        dedup_start = asyncio.get_event_loop().time()
+        lead_keys = [lead.lead_key for lead in leads]
+        cached, missing = self.dedup_cache.split(lead_keys)
+        claimed: Set[str] = set()
+        
+        # Промахи кэша забираем в БД одним запросом
+        if missing:
             db_check_start = asyncio.get_event_loop().time()
             try:
-                is_processed = await self.db_client.is_lead_processed(
+                claimed = await self.db_client.claim_leads(
                     self.account.account_id,
-                    lead_key
+                    missing
                 )
                 db_check_time = asyncio.get_event_loop().time() - db_check_start
-                if db_check_time > 0.1:  # Логируем только если проверка заняла больше 100мс
+                if db_check_time > 0.1:  # Логируем только если запрос занял больше 100мс
                     logger.warning(
-                        f"[Monitor {self.account.account_id}] Проверка БД для лида {lead_key} заняла {db_check_time:.3f}сек"
+                        f"[Monitor {self.account.account_id}] Claim в БД для {len(missing)} лидов занял {db_check_time:.3f}сек"
                     )
-                if is_processed:
-                    logger.info(f"[Monitor {self.account.account_id}] Лид {lead_key} уже был обработан (проверка БД вернула True), пропускаем")
-                    continue
-                else:
-                    logger.debug(f"[Monitor {self.account.account_id}] Лид {lead_key} НЕ обработан (проверка БД вернула False), продолжаем обработку")
+                # И забранные, и уже обработанные ранее лиды теперь есть в БД
+                self.dedup_cache.add_many(missing)
             except Exception as e:
                 db_check_time = asyncio.get_event_loop().time() - db_check_start
                 logger.warning(
-                    f"[Monitor {self.account.account_id}] Ошибка при проверке лида в БД (заняло {db_check_time:.3f}сек): {e}"
-                )
-                # Продолжаем обработку, если БД недоступна
-            
-            # Отправляем задачу в RabbitMQ через Celery
-            try:
-                logger.info(
-                    f"[Monitor {self.account.account_id}] Отправка лида {lead_key} (bidPK={lead.get('lead_id', 'N/A')}) "
-                    f"в RabbitMQ очередь {CONFIG.queue_name}"
-                )
-                self.celery_app.send_task(
-                    CONFIG.task_name,
-                    args=[self.account.account_id, lead],
-                    queue=CONFIG.queue_name,
-                    retry=False
-                )
-                logger.info(f"[Monitor {self.account.account_id}] Лид {lead_key} отправлен в RabbitMQ")
-                
-                # Помечаем лид как обработанный в БД
-                try:
-                    await self.db_client.mark_lead_as_processed(
-                        self.account.account_id,
-                        lead_key
-                    )
-                    logger.info(f"[Monitor {self.account.account_id}] Лид {lead_key} помечен как обработанный в БД")
-                except Exception as e:
-                    logger.warning(f"[Monitor {self.account.account_id}] Ошибка при сохранении лида в БД: {e}")
-                
-                processed_count += 1
-                
-                logger.info(
-                    f"[Monitor {self.account.account_id}] "
-                    f"Лид {lead_key} отправлен в очередь {CONFIG.queue_name}"
-                )
-                
-            except Exception as e:
-                logger.error(
-                    f"[Monitor {self.account.account_id}] "
-                    f"Ошибка при отправке лида {lead_key}: {e}",
-                    exc_info=True
+                    f"[Monitor {self.account.account_id}] Ошибка при claim лидов в БД (заняло {db_check_time:.3f}сек), "
+                    f"{len(missing)} лидов отложены до следующего цикла: {e}"
                 )
+                # Незабранные лиды не отправляем и не кэшируем (иначе после TTL кэша - повторная отправка);
+                # тот же ответ API разбираем заново в следующем цикле
+                self._last_payload_fingerprint = None
+                self.metrics.observe("dedup_seconds", asyncio.get_event_loop().time() - dedup_start)
+                return 0
+        
+        self.metrics.observe("dedup_seconds", asyncio.get_event_loop().time() - dedup_start)
         
-        return processed_count
+        skipped = len(set(lead_keys) - claimed)
+        if skipped:
+            logger.info(
+                f"[Monitor {self.account.account_id}] {skipped} лидов уже были обработаны "
+                f"(кэш: {len(cached)}, БД: {skipped - len(cached)}), пропускаем",
+                extra=self._log_extra("same_leads_skipped")
+            )
+        
+        to_send: List[NewLead] = []
+        for lead in leads:
+            lead_key = lead.lead_key
+            if lead_key not in claimed:
+                continue
+            # Дубликаты внутри одного ответа отправляем один раз
+            claimed.discard(lead_key)
+            to_send.append(lead)
+        
+        if not to_send:
+            return 0
+        
+        # Отправляем пачку в RabbitMQ через publisher (не блокирует event loop)
+        logger.info(
+            f"[Monitor {self.account.account_id}] Отправка {len(to_send)} лидов "
+            f"(bidPK={[lead.lead_id for lead in to_send]}) в RabbitMQ очередь {CONFIG.queue_name}"
+        )
+        publish_start = asyncio.get_event_loop().time()
+        try:
+            failed = await self.publisher.publish(self.account.account_id, to_send)
+        except Exception as e:
+            logger.error(
+                f"[Monitor {self.account.account_id}] Ошибка при отправке лидов: {e}",
+                exc_info=True
+            )
+            failed = {lead.lead_key for lead in to_send}
+        self.metrics.observe("publish_seconds", asyncio.get_event_loop().time() - publish_start)
+        
+        failed_keys = [lead.lead_key for lead in to_send if lead.lead_key in failed]
+        sent_keys = [lead.lead_key for lead in to_send if lead.lead_key not in failed]
+        self.dedup_cache.add_many(sent_keys)
+        self.metrics.inc("leads_published_total", len(sent_keys))
+        if sent_keys:
+            logger.info(
+                f"[Monitor {self.account.account_id}] "
+                f"{len(sent_keys)} лидов отправлено в очередь {CONFIG.queue_name}"
+            )
+        
+        # Неотправленные лиды освобождаем, чтобы повторить их в следующем цикле
+        if failed_keys:
+            await self._release_leads(failed_keys)
+        
+        return len(sent_keys)
+    
+    async def _release_leads(self, lead_keys: List[str]):
+        """Снимает claim с лидов, которые не удалось отправить в очередь."""
+        # Тот же ответ API нужно разобрать заново, чтобы повторить отправку
+        self._last_payload_fingerprint = None
+        for key in lead_keys:
+            self.dedup_cache.discard(key)
+        try:
+            await self.db_client.release_leads(self.account.account_id, lead_keys)
+            logger.info(f"[Monitor {self.account.account_id}] {len(lead_keys)} неотправленных лидов освобождены для повтора")
+        except Exception as e:
+            logger.warning(f"[Monitor {self.account.account_id}] Ошибка при освобождении лидов в БД: {e}")
+    
+    def _log_extra(self, sample_key: Optional[str] = None, **fields) -> Dict[str, Any]:
+        """
+        Поля записи лога: account_id (в JSON-формате) и ключ выборки повторяющихся сообщений
+        (из серии с одним ключом выводится одно за окно LOG_SAMPLE_WINDOW_SEC, см. playwright_bot/log_config.py).
+        """
+        extra: Dict[str, Any] = {"account_id": self.account.account_id, **fields}
+        if sample_key:
+            extra["sample_key"] = f"{self.account.account_id}:{sample_key}"
+        return extra
     
     async def stop(self):
         """Останавливает мониторинг."""
         logger.info(f"[Monitor {self.account.account_id}] Остановка...")
         self.stop_event.set()
+        self.restart_coordinator.unregister(self.account.account_id)
     
     async def _cleanup(self):
         """Очищает ресурсы (закрывает только контекст, браузер остается в пуле)."""
         logger.info(f"[Monitor {self.account.account_id}] Очистка ресурсов...")
         
-        # Сохраняем сессию
+        # Резервный контекст (если готовился) больше не нужен
+        if self._standby_task is not None:
+            task, self._standby_task = self._standby_task, None
+            if not task.done():
+                task.cancel()
+            # Дожидаемся отмены: задача сама закрывает недоготовленный контекст
+            standby = (await asyncio.gather(task, return_exceptions=True))[0]
+            if standby is not None and not isinstance(standby, BaseException):
+                try:
+                    await standby.close()
+                except Exception:
+                    pass
+        
+        # Незавершенное восстановление сессии прерываем
+        if self._repair_task is not None and not self._repair_task.done():
+            self._repair_task.cancel()
+        self._repair_task = None
+        
+        # Сохраняем сессию и дописываем ее на диск без задержки
         await self._save_session()
+        try:
+            await self.session_writer.close()
+        except Exception as e:
+            logger.warning(f"[Monitor {self.account.account_id}] Ошибка при записи сессии: {e}")
         
         # Закрываем контекст (браузер остается в пуле для других мониторов)
         if self.context:
@@ -672,5 +971,12 @@ class AccountMonitor:
             except Exception:
                 pass
         
+        # HTTP-клиент аккаунта (общий пул соединений закрывает сервис при остановке)
+        if self.http_session is not None:
+            try:
+                await self.http_session.close()
+            except Exception:
+                pass
+        
         logger.info(f"[Monitor {self.account.account_id}] Очистка завершена")
 
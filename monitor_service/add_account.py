@@ -110,7 +110,7 @@ async def add_account(email: str, password: str, account_id: str = None, enabled
             logger.info(f"   Enabled: {new_account.enabled}")
             logger.info("")
             logger.info("=" * 60)
-            logger.info("Аккаунт будет использоваться мониторами при следующем запуске")
+            logger.info("Аккаунт будет подхвачен мониторами при следующей сверке (MONITOR_ACCOUNTS_RELOAD_INTERVAL_SEC)")
             logger.info("=" * 60)
             
             return new_account
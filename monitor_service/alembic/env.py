@@ -22,7 +22,7 @@ sys.path.insert(0, project_root)
 
 # Импортируем Base и модели
 from monitor_service.database.base import Base
-from monitor_service.database.models import ThumbtackAccount, ProcessedLead  # noqa
+from monitor_service.database.models import ThumbtackAccount, ProcessedLead, AccountSession  # noqa
 
 # this is the Alembic Config object
 config = context.config
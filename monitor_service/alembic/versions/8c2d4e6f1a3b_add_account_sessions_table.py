@@ -0,0 +1,30 @@
+"""Add account_sessions table for the shared session store
+
+Revision ID: 8c2d4e6f1a3b
+Revises: 3f1595bd7f7c
+Create Date: 2026-10-17 12:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+# revision identifiers, used by Alembic.
+revision = '8c2d4e6f1a3b'
+down_revision = '3f1595bd7f7c'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_table('account_sessions',
+    sa.Column('account_id', sa.String(), nullable=False),
+    sa.Column('version', sa.BigInteger(), nullable=False),
+    sa.Column('storage_state', postgresql.JSONB(astext_type=sa.Text()), nullable=False),
+    sa.Column('updated_at', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=False),
+    sa.PrimaryKeyConstraint('account_id')
+    )
+
+
+def downgrade() -> None:
+    op.drop_table('account_sessions')
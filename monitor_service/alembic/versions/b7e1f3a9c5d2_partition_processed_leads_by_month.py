@@ -0,0 +1,100 @@
+"""Partition processed_leads by month of processed_at
+
+Revision ID: b7e1f3a9c5d2
+Revises: 8c2d4e6f1a3b
+Create Date: 2026-10-17 15:00:00.000000
+
+"""
+from datetime import date, datetime, timezone
+
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = 'b7e1f3a9c5d2'
+down_revision = '8c2d4e6f1a3b'
+branch_labels = None
+depends_on = None
+
+# Партиции создаются на столько месяцев вперед; дальше их создает обслуживание (monitor_service/leads_retention.py)
+MONTHS_AHEAD = 2
+
+
+def _month_start(value: date, shift: int = 0) -> date:
+    index = value.year * 12 + value.month - 1 + shift
+    return date(index // 12, index % 12 + 1, 1)
+
+
+def _create_partition(bind, month: date) -> None:
+    name = f"processed_leads_p{month:%Y%m}"
+    start = datetime(month.year, month.month, 1, tzinfo=timezone.utc)
+    end_month = _month_start(month, 1)
+    end = datetime(end_month.year, end_month.month, 1, tzinfo=timezone.utc)
+    bind.execute(sa.text(
+        f"CREATE TABLE {name} PARTITION OF processed_leads "
+        f"FOR VALUES FROM ('{start.isoformat()}') TO ('{end.isoformat()}')"
+    ))
+    bind.execute(sa.text(f"CREATE UNIQUE INDEX {name}_account_lead ON {name} (account_id, lead_key)"))
+
+
+def upgrade() -> None:
+    bind = op.get_bind()
+
+    # Старая таблица остается до переноса данных
+    op.execute("ALTER TABLE processed_leads RENAME TO processed_leads_legacy")
+    op.execute("ALTER TABLE processed_leads_legacy RENAME CONSTRAINT processed_leads_pkey TO processed_leads_legacy_pkey")
+    op.execute("ALTER INDEX idx_processed_leads_account_lead RENAME TO idx_processed_leads_legacy_account_lead")
+    op.execute("ALTER INDEX ix_processed_leads_account_id RENAME TO ix_processed_leads_legacy_account_id")
+
+    # Уникальный индекс на партиционированной таблице обязан включать ключ партиционирования,
+    # поэтому (account_id, lead_key) уникален в пределах партиции - индекс создается на каждой
+    op.execute("""
+        CREATE TABLE processed_leads (
+            id UUID NOT NULL DEFAULT gen_random_uuid(),
+            account_id VARCHAR NOT NULL,
+            lead_key VARCHAR NOT NULL,
+            processed_at TIMESTAMP WITH TIME ZONE NOT NULL DEFAULT now(),
+            CONSTRAINT processed_leads_pkey PRIMARY KEY (id, processed_at)
+        ) PARTITION BY RANGE (processed_at)
+    """)
+    # DEFAULT - страховка, если обслуживание не успело создать партицию месяца
+    op.execute("CREATE TABLE processed_leads_default PARTITION OF processed_leads DEFAULT")
+    op.execute("CREATE UNIQUE INDEX processed_leads_default_account_lead ON processed_leads_default (account_id, lead_key)")
+
+    today = datetime.now(timezone.utc).date()
+    oldest = bind.execute(sa.text("SELECT min(processed_at) FROM processed_leads_legacy")).scalar()
+    month = _month_start(oldest.astimezone(timezone.utc).date() if oldest else today)
+    last = _month_start(today, MONTHS_AHEAD)
+    while month <= last:
+        _create_partition(bind, month)
+        month = _month_start(month, 1)
+
+    op.execute("""
+        INSERT INTO processed_leads (id, account_id, lead_key, processed_at)
+        SELECT id, account_id, lead_key, processed_at FROM processed_leads_legacy
+    """)
+    op.execute("DROP TABLE processed_leads_legacy")
+
+
+def downgrade() -> None:
+    op.execute("""
+        CREATE TABLE processed_leads_plain (
+            id UUID NOT NULL DEFAULT gen_random_uuid(),
+            account_id VARCHAR NOT NULL,
+            lead_key VARCHAR NOT NULL,
+            processed_at TIMESTAMP WITH TIME ZONE NOT NULL DEFAULT now(),
+            CONSTRAINT processed_leads_plain_pkey PRIMARY KEY (id)
+        )
+    """)
+    # Между партициями ключ мог повториться - оставляем самую раннюю отметку
+    op.execute("""
+        INSERT INTO processed_leads_plain (id, account_id, lead_key, processed_at)
+        SELECT DISTINCT ON (account_id, lead_key) id, account_id, lead_key, processed_at
+        FROM processed_leads
+        ORDER BY account_id, lead_key, processed_at
+    """)
+    op.execute("DROP TABLE processed_leads CASCADE")
+    op.execute("ALTER TABLE processed_leads_plain RENAME TO processed_leads")
+    op.execute("ALTER TABLE processed_leads RENAME CONSTRAINT processed_leads_plain_pkey TO processed_leads_pkey")
+    op.create_index(op.f('ix_processed_leads_account_id'), 'processed_leads', ['account_id'], unique=False)
+    op.create_index('idx_processed_leads_account_lead', 'processed_leads', ['account_id', 'lead_key'], unique=True)
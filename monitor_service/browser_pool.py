@@ -5,6 +5,8 @@
 """
 import asyncio
 import logging
+import os
+from typing import Dict, Optional
 from playwright.async_api import async_playwright, Playwright, Browser
 
 logger = logging.getLogger(__name__)
@@ -59,3 +61,48 @@ class MonitorBrowserPool:
             raise RuntimeError("Браузер не инициализирован.")
         return self.browser
 
+    
+    def get_uss_mb(self) -> Optional[float]:
+        """
+        Суммарная USS (MB) процессов браузера - потомков текущего процесса.
+        USS - только приватные страницы процесса: общие страницы (код Chromium, shared memory
+        между renderer'ами) не считаются по разу на процесс, как при сложении RSS.
+        Работает только на Linux (/proc/<pid>/smaps_rollup, ядро 4.14+), иначе возвращает None.
+        """
+        if not os.path.exists("/proc/self/smaps_rollup"):
+            return None
+        parents: Dict[int, int] = {}
+        for entry in os.listdir("/proc"):
+            if not entry.isdigit():
+                continue
+            try:
+                with open(f"/proc/{entry}/status") as f:
+                    for line in f:
+                        if line.startswith("PPid:"):
+                            parents[int(entry)] = int(line.split()[1])
+                            break
+            except (OSError, ValueError, IndexError):
+                continue
+        
+        # Потомки текущего процесса: драйвер Playwright и все процессы Chromium
+        own_pid = os.getpid()
+        descendants = {own_pid}
+        changed = True
+        while changed:
+            changed = False
+            for pid, ppid in parents.items():
+                if ppid in descendants and pid not in descendants:
+                    descendants.add(pid)
+                    changed = True
+        descendants.discard(own_pid)
+        
+        uss_kb = 0
+        for pid in descendants:
+            try:
+                with open(f"/proc/{pid}/smaps_rollup") as f:
+                    for line in f:
+                        if line.startswith(("Private_Clean:", "Private_Dirty:", "Private_Hugetlb:")):
+                            uss_kb += int(line.split()[1])
+            except (OSError, ValueError, IndexError):
+                continue
+        return uss_kb / 1024
@@ -2,7 +2,7 @@
 """
 CRUD операции для работы с БД.
 """
-from . import accounts, leads
+from . import accounts, leads, partitions
 
-__all__ = ["accounts", "leads"]
+__all__ = ["accounts", "leads", "partitions"]
 
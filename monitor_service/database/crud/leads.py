@@ -2,29 +2,101 @@
 """
 CRUD операции для обработанных лидов.
 """
+from datetime import datetime
+from typing import Iterable, List, Optional, Set
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select
-from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy import select, delete, exists, literal, any_, func, text, String
+from sqlalchemy.dialects.postgresql import insert, ARRAY
 from ..models import ProcessedLead
 
+# Пространство ключей pg_advisory_xact_lock(int, int) для claim: (CLAIM_LOCK_NAMESPACE, hashtext(account_id)).
+# Двухаргументные ключи не пересекаются с одноаргументными (partitions.MAINTENANCE_LOCK_KEY)
+CLAIM_LOCK_NAMESPACE = 0x6C656164  # "lead"
 
-async def is_lead_processed(db: AsyncSession, account_id: str, lead_key: str) -> bool:
-    """Проверить, обработан ли лид."""
+
+async def mark_lead_as_processed(db: AsyncSession, account_id: str, lead_key: str, since: datetime):
+    """Пометить лид как обработанный (с той же проверкой уникальности между партициями, что и claim_leads)."""
+    await claim_leads(db, account_id, [lead_key], since)
+
+
+async def _lock_account(db: AsyncSession, account_id: str):
+    """
+    Блокировка claim аккаунта до конца транзакции. Уникальный индекс партиции не видит
+    другие месяцы, поэтому проверка NOT EXISTS + вставка атомарны только под этой блокировкой.
+    """
+    await db.execute(
+        text("SELECT pg_advisory_xact_lock(:namespace, hashtext(:account_id))"),
+        {"namespace": CLAIM_LOCK_NAMESPACE, "account_id": account_id}
+    )
+
+
+def _insert_keys(account_id: str, keys: List[str], since: datetime):
+    """
+    ``INSERT ... SELECT :account_id, k FROM unnest(:keys) k ON CONFLICT DO NOTHING``.
+    В отличие от multi-row VALUES текст запроса не зависит от количества ключей,
+    поэтому prepared statement asyncpg готовится один раз на соединение и переиспользуется.
+    
+    Уникальный индекс (account_id, lead_key) действует в пределах месячной партиции,
+    поэтому NOT EXISTS отсекает ключи, уже обработанные в других партициях. Проверка
+    ограничена processed_at >= since: читаются индексы только свежих партиций (держатся в памяти).
+    Выполнять под _lock_account.
+    """
+    new_keys = func.unnest(literal(keys, ARRAY(String))).table_valued("lead_key").alias("new_keys")
+    processed = exists().where(
+        ProcessedLead.account_id == account_id,
+        ProcessedLead.lead_key == new_keys.c.lead_key,
+        ProcessedLead.processed_at >= since
+    )
+    rows = select(literal(account_id, String), new_keys.c.lead_key).where(~processed)
+    return insert(ProcessedLead).from_select(["account_id", "lead_key"], rows).on_conflict_do_nothing()
+
+
+async def get_recent_lead_keys(db: AsyncSession, account_id: str, since: datetime, limit: int) -> List[str]:
+    """Получить ключи лидов аккаунта, обработанных после since (самые свежие первыми)."""
     result = await db.execute(
-        select(ProcessedLead).where(
+        select(ProcessedLead.lead_key).where(
             ProcessedLead.account_id == account_id,
-            ProcessedLead.lead_key == lead_key
-        )
+            ProcessedLead.processed_at >= since
+        ).order_by(ProcessedLead.processed_at.desc()).limit(limit)
     )
-    return result.scalar_one_or_none() is not None
+    return list(result.scalars().all())
 
 
-async def mark_lead_as_processed(db: AsyncSession, account_id: str, lead_key: str):
-    """Пометить лид как обработанный."""
-    stmt = insert(ProcessedLead).values(
-        account_id=account_id,
-        lead_key=lead_key
-    ).on_conflict_do_nothing()
-    await db.execute(stmt)
+async def claim_leads(db: AsyncSession, account_id: str, lead_keys: Iterable[str], since: datetime) -> Set[str]:
+    """
+    Атомарно "забрать" лиды на обработку.
+    ``INSERT ... ON CONFLICT DO NOTHING RETURNING lead_key`` - возвращаются только
+    ключи, которых не было в партициях после since.
+    Claim одного аккаунта сериализуется advisory-блокировкой, поэтому два монитора
+    не получат один лид, даже если вставляют его в партиции разных месяцев.
+    """
+    keys = list(dict.fromkeys(lead_keys))
+    if not keys:
+        return set()
+    
+    await _lock_account(db, account_id)
+    result = await db.execute(_insert_keys(account_id, keys, since).returning(ProcessedLead.lead_key))
+    claimed = set(result.scalars().all())
     await db.commit()
+    return claimed
+
 
+async def release_leads(
+    db: AsyncSession, account_id: str, lead_keys: Iterable[str], since: Optional[datetime] = None
+):
+    """
+    Снять отметку с лидов (например, если задачу не удалось отправить после claim_leads).
+    since ограничивает удаление недавними партициями (лиды только что забраны).
+    """
+    keys = list(dict.fromkeys(lead_keys))
+    if not keys:
+        return
+    
+    stmt = delete(ProcessedLead).where(
+        ProcessedLead.account_id == account_id,
+        ProcessedLead.lead_key == any_(literal(keys, ARRAY(String)))
+    )
+    if since is not None:
+        stmt = stmt.where(ProcessedLead.processed_at >= since)
+    await db.execute(stmt)
+    await db.commit()
@@ -0,0 +1,130 @@
+"""
+Обслуживание помесячных партиций processed_leads (PARTITION BY RANGE (processed_at)).
+Партиция processed_leads_pYYYYMM хранит лиды одного месяца (UTC) и имеет свой
+уникальный индекс (account_id, lead_key) - индекс текущего месяца небольшой и держится в памяти.
+"""
+import logging
+from datetime import date, datetime, timezone
+from typing import List, Tuple
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncSession
+
+logger = logging.getLogger(__name__)
+
+PARENT_TABLE = "processed_leads"
+PARTITION_PREFIX = "processed_leads_p"
+DEFAULT_PARTITION = "processed_leads_default"
+
+# Ключ pg_advisory_xact_lock: обслуживание из нескольких шардов не выполняется параллельно
+MAINTENANCE_LOCK_KEY = 0x70726F63  # "proc"
+
+
+def month_start(value: date, shift: int = 0) -> date:
+    """Первое число месяца value, сдвинутого на shift месяцев."""
+    index = value.year * 12 + value.month - 1 + shift
+    return date(index // 12, index % 12 + 1, 1)
+
+
+def partition_name(month: date) -> str:
+    return f"{PARTITION_PREFIX}{month:%Y%m}"
+
+
+def _month_bounds(month: date) -> Tuple[datetime, datetime]:
+    """Границы партиции месяца [start, end) в UTC."""
+    end_month = month_start(month, 1)
+    return (
+        datetime(month.year, month.month, 1, tzinfo=timezone.utc),
+        datetime(end_month.year, end_month.month, 1, tzinfo=timezone.utc),
+    )
+
+
+def partition_month(name: str) -> date:
+    """Месяц партиции по ее имени (processed_leads_p202610 -> 2026-10-01)."""
+    suffix = name[len(PARTITION_PREFIX):]
+    return date(int(suffix[:4]), int(suffix[4:6]), 1)
+
+
+async def try_lock(db: AsyncSession) -> bool:
+    """Блокировка обслуживания до конца транзакции (False - уже выполняется в другом процессе)."""
+    result = await db.execute(text("SELECT pg_try_advisory_xact_lock(:key)"), {"key": MAINTENANCE_LOCK_KEY})
+    return bool(result.scalar())
+
+
+async def list_partitions(db: AsyncSession) -> List[str]:
+    """Имена помесячных партиций processed_leads (без DEFAULT)."""
+    result = await db.execute(text(
+        "SELECT c.relname FROM pg_inherits i "
+        "JOIN pg_class c ON c.oid = i.inhrelid "
+        "JOIN pg_class p ON p.oid = i.inhparent "
+        "WHERE p.relname = :parent AND c.relname ~ :pattern "
+        "ORDER BY c.relname"
+    ), {"parent": PARENT_TABLE, "pattern": f"^{PARTITION_PREFIX}[0-9]{{6}}$"})
+    return list(result.scalars().all())
+
+
+async def _default_has_rows(db: AsyncSession, start: datetime, end: datetime) -> bool:
+    """Есть ли в DEFAULT-партиции строки из диапазона [start, end)."""
+    if (await db.execute(text("SELECT to_regclass(:name)"), {"name": DEFAULT_PARTITION})).scalar() is None:
+        return False
+    result = await db.execute(text(
+        f"SELECT EXISTS (SELECT 1 FROM {DEFAULT_PARTITION} WHERE processed_at >= :start AND processed_at < :end)"
+    ), {"start": start, "end": end})
+    return bool(result.scalar())
+
+
+async def create_partition(db: AsyncSession, month: date):
+    """Создает партицию месяца с уникальным индексом (account_id, lead_key), если ее еще нет."""
+    name = partition_name(month)
+    start, end = _month_bounds(month)
+    await db.execute(text(
+        f"CREATE TABLE IF NOT EXISTS {name} PARTITION OF {PARENT_TABLE} "
+        f"FOR VALUES FROM ('{start.isoformat()}') TO ('{end.isoformat()}')"
+    ))
+    await db.execute(text(
+        f"CREATE UNIQUE INDEX IF NOT EXISTS {name}_account_lead ON {name} (account_id, lead_key)"
+    ))
+
+
+async def ensure_partitions(db: AsyncSession, today: date, months_ahead: int) -> List[str]:
+    """
+    Создает партиции с текущего месяца на months_ahead (не меньше 1) вперед, чтобы DEFAULT
+    оставалась пустой. Месяц, строки которого уже попали в DEFAULT, пропускается: перенос
+    потребовал бы DETACH/ATTACH DEFAULT (ACCESS EXCLUSIVE на всю таблицу). Возвращает созданные.
+    """
+    existing = set(await list_partitions(db))
+    created = []
+    for shift in range(0, max(1, months_ahead) + 1):
+        month = month_start(today, shift)
+        name = partition_name(month)
+        if name in existing:
+            continue
+        if await _default_has_rows(db, *_month_bounds(month)):
+            logger.warning(f"processed_leads: строки месяца {month:%Y-%m} уже в {DEFAULT_PARTITION}, партиция {name} не создана")
+            continue
+        await create_partition(db, month)
+        created.append(name)
+    return created
+
+
+async def expire_partitions(db: AsyncSession, today: date, retention_months: int, archive: bool) -> List[Tuple[str, str]]:
+    """
+    Убирает партиции старше retention_months полных месяцев.
+    archive=True - партиция отсоединяется и остается отдельной таблицей (для pg_dump / переноса),
+    иначе удаляется.
+
+    Returns:
+        [(имя партиции, "archived" | "dropped")]
+    """
+    oldest_kept = month_start(today, -retention_months)
+    expired = []
+    for name in await list_partitions(db):
+        if partition_month(name) >= oldest_kept:
+            continue
+        if archive:
+            await db.execute(text(f"ALTER TABLE {PARENT_TABLE} DETACH PARTITION {name}"))
+            await db.execute(text(f"ALTER TABLE {name} RENAME TO {name}_archived"))
+            expired.append((name, "archived"))
+        else:
+            await db.execute(text(f"DROP TABLE {name}"))
+            expired.append((name, "dropped"))
+    return expired
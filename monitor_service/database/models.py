@@ -2,7 +2,7 @@
 """
 SQLAlchemy ORM модели для БД.
 """
-from sqlalchemy import Column, String, Boolean, DateTime, JSON, Index
+from sqlalchemy import Column, String, Boolean, DateTime, JSON, BigInteger
 from sqlalchemy.dialects.postgresql import JSONB, UUID
 from sqlalchemy.sql import func
 from datetime import datetime
@@ -27,19 +27,36 @@ class ThumbtackAccount(Base):
 
 
 class ProcessedLead(Base):
-    """Модель обработанного лида (для дедупликации)."""
+    """
+    Модель обработанного лида (для дедупликации).
+    Таблица партиционирована по месяцам processed_at (партиции processed_leads_pYYYYMM,
+    см. crud/partitions.py); уникальный индекс (account_id, lead_key) есть на каждой партиции.
+    """
     __tablename__ = "processed_leads"
     
     id = Column(UUID(as_uuid=True), primary_key=True, server_default=func.gen_random_uuid())
-    account_id = Column(String, nullable=False, index=True)
+    account_id = Column(String, nullable=False)
     lead_key = Column(String, nullable=False)
-    processed_at = Column(DateTime(timezone=True), server_default=func.now(), nullable=False)
+    # Ключ партиционирования входит в первичный ключ
+    processed_at = Column(DateTime(timezone=True), primary_key=True, server_default=func.now(), nullable=False)
     
-    # Уникальный индекс для пары (account_id, lead_key)
     __table_args__ = (
-        Index('idx_processed_leads_account_lead', 'account_id', 'lead_key', unique=True),
+        {"postgresql_partition_by": "RANGE (processed_at)"},
     )
     
     def __repr__(self):
         return f"<ProcessedLead(account_id={self.account_id}, lead_key={self.lead_key})>"
 
+
+
+class AccountSession(Base):
+    """Модель сохраненной сессии (storage_state) аккаунта для общего хранилища сессий."""
+    __tablename__ = "account_sessions"
+    
+    account_id = Column(String, primary_key=True)
+    version = Column(BigInteger, nullable=False, default=1)
+    storage_state = Column(JSONB, nullable=False)
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), nullable=False)
+    
+    def __repr__(self):
+        return f"<AccountSession(account_id={self.account_id}, version={self.version})>"
@@ -4,14 +4,45 @@
 Обертка над database.crud для monitor_service.
 """
 import logging
-from typing import List
-from monitor_service.database.database import AsyncSessionLocal, init_db, close_db
-from monitor_service.database.crud import accounts, leads
+import math
+import time
+from contextlib import asynccontextmanager
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, List, Iterable, Optional, Set
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError
+from monitor_service.config import CONFIG
+from monitor_service.database.database import DATABASE_URL, make_engine, make_session_factory
+from monitor_service.database.crud import accounts, leads, partitions
 from monitor_service.database.schemas import Account
+from monitor_service.metrics import Histogram
 
 logger = logging.getLogger(__name__)
 
 
+class PoolStats:
+    """Ожидание соединения из пула и выдачи соединений (отдаются на /metrics)."""
+    
+    def __init__(self, window: int = 1024):
+        self.wait = Histogram(window)
+        self.checkouts = 0
+        self.timeouts = 0
+    
+    def snapshot(self, engine) -> Dict[str, Any]:
+        pool = engine.pool
+        wait = self.wait.snapshot()
+        return {
+            "size": pool.size(),
+            "checked_out": pool.checkedout(),
+            "overflow": max(0, pool.overflow()),
+            "checkouts_total": self.checkouts,
+            "timeouts_total": self.timeouts,
+            "wait_p50_seconds": wait["p50"],
+            "wait_p95_seconds": wait["p95"],
+            "wait_p99_seconds": wait["p99"],
+            "wait_max_seconds": wait["max"],
+        }
+
+
 class DBClient:
     """
     Клиент для работы с БД.
@@ -25,11 +56,13 @@ class DBClient:
         Args:
             db_url: PostgreSQL connection string (опционально, берется из DATABASE_URL)
         """
-        self.db_url = db_url
-        if db_url:
-            # Устанавливаем DATABASE_URL для database.py
-            import os
-            os.environ["DATABASE_URL"] = db_url
+        self.db_url = db_url or DATABASE_URL
+        self.pool_stats = PoolStats(CONFIG.metrics_window)
+        # Свой engine и фабрика сессий (глобальный engine из database.py не используется)
+        self.pool_size = 0
+        self.engine = None
+        self.session_factory = None
+        self._configure_pool(CONFIG.db_pool_size_min)
         logger.info("DBClient инициализирован")
     
     async def initialize(self):
@@ -43,9 +76,61 @@ class DBClient:
         # Не создаем таблицы автоматически
         logger.info("Database client initialized (use 'alembic upgrade head' to create tables)")
     
+    def _configure_pool(self, pool_size: int):
+        """Создает engine с пулом pool_size и возвращает предыдущий (его закрывает вызывающий)."""
+        old_engine = self.engine
+        self.engine = make_engine(
+            self.db_url,
+            pool_size=pool_size,
+            max_overflow=CONFIG.db_max_overflow,
+            pool_timeout=CONFIG.db_pool_timeout_sec,
+            pool_recycle=CONFIG.db_pool_recycle_sec,
+            pool_pre_ping=CONFIG.db_pool_pre_ping,
+            statement_cache_size=CONFIG.db_statement_cache_size
+        )
+        self.session_factory = make_session_factory(self.engine)
+        self.pool_size = pool_size
+        logger.info(
+            f"Пул соединений с БД: pool_size={pool_size}, max_overflow={CONFIG.db_max_overflow}, "
+            f"pool_timeout={CONFIG.db_pool_timeout_sec}сек"
+        )
+        return old_engine
+    
+    async def ensure_pool_capacity(self, account_count: int):
+        """
+        Подстраивает пул под число аккаунтов (db_pool_per_account на аккаунт, в пределах min..max).
+        Пул и растет, и сжимается: выданные соединения старого engine дорабатывают и закрываются при возврате.
+        """
+        wanted = math.ceil(account_count * CONFIG.db_pool_per_account)
+        wanted = max(CONFIG.db_pool_size_min, min(CONFIG.db_pool_size_max, wanted))
+        if wanted == self.pool_size:
+            return
+        old_engine = self._configure_pool(wanted)
+        await old_engine.dispose()
+    
+    def pool_metrics(self) -> Dict[str, Any]:
+        """Состояние пула и время ожидания соединения (для /metrics)."""
+        return self.pool_stats.snapshot(self.engine)
+    
+    @asynccontextmanager
+    async def _session(self):
+        """Сессия с уже выданным соединением: время ожидания пула попадает в pool_stats."""
+        async with self.session_factory() as db:
+            start = time.monotonic()
+            try:
+                await db.connection()
+            except PoolTimeoutError:
+                self.pool_stats.timeouts += 1
+                raise
+            finally:
+                self.pool_stats.wait.observe(time.monotonic() - start)
+            self.pool_stats.checkouts += 1
+            yield db
+    
     async def close(self):
         """Закрывает соединения с БД."""
-        await close_db()
+        await self.engine.dispose()
+        logger.info("Database connections closed")
     
     async def get_active_accounts(self) -> List[Account]:
         """
@@ -54,7 +139,7 @@ class DBClient:
         Returns:
             List[Account]: Список активных аккаунтов
         """
-        async with AsyncSessionLocal() as db:
+        async with self.session_factory() as db:
             accounts_list = await accounts.get_active_accounts(db)
             logger.info(f"Найдено {len(accounts_list)} активных аккаунтов")
             return accounts_list
@@ -67,21 +152,75 @@ class DBClient:
             account_id: ID аккаунта
             lead_key: Уникальный ключ лида
         """
-        async with AsyncSessionLocal() as db:
-            await leads.mark_lead_as_processed(db, account_id, lead_key)
+        async with self._session() as db:
+            await leads.mark_lead_as_processed(db, account_id, lead_key, self._dedup_since())
             logger.debug(f"Lead {lead_key} marked as processed for account {account_id}")
     
-    async def is_lead_processed(self, account_id: str, lead_key: str) -> bool:
+    async def get_recent_lead_keys(self, account_id: str, days: int, limit: int) -> List[str]:
         """
-        Проверяет, был ли лид уже обработан.
+        Возвращает ключи лидов, обработанных за последние days дней (для прогрева кэша).
         
         Args:
             account_id: ID аккаунта
-            lead_key: Уникальный ключ лида
+            days: Глубина выборки в днях
+            limit: Максимальное количество ключей
             
         Returns:
-            bool: True если лид уже обработан, False иначе
+            List[str]: Ключи лидов, самые свежие первыми
         """
-        async with AsyncSessionLocal() as db:
-            return await leads.is_lead_processed(db, account_id, lead_key)
-
+        since = datetime.now(timezone.utc) - timedelta(days=days)
+        async with self._session() as db:
+            return await leads.get_recent_lead_keys(db, account_id, since, limit)
+    
+    async def claim_leads(self, account_id: str, lead_keys: Iterable[str]) -> Set[str]:
+        """
+        Атомарно помечает лиды как обработанные и возвращает те, что были помечены этим вызовом.
+        Только их можно отправлять в очередь.
+        
+        Args:
+            account_id: ID аккаунта
+            lead_keys: Ключи лидов
+            
+        Returns:
+            Set[str]: Ключи лидов, "забранные" этим вызовом
+        """
+        async with self._session() as db:
+            return await leads.claim_leads(db, account_id, lead_keys, self._dedup_since())
+    
+    async def release_leads(self, account_id: str, lead_keys: Iterable[str]) -> None:
+        """
+        Снимает отметку с лидов, которые были забраны, но не отправлены.
+        
+        Args:
+            account_id: ID аккаунта
+            lead_keys: Ключи лидов
+        """
+        async with self._session() as db:
+            await leads.release_leads(db, account_id, lead_keys, self._dedup_since())
+    
+    @staticmethod
+    def _dedup_since() -> datetime:
+        """Граница проверки уникальности в соседних партициях processed_leads (индексы старых партиций не читаются)."""
+        return datetime.now(timezone.utc) - timedelta(days=max(1, CONFIG.leads_dedup_lookback_days))
+    
+    async def run_leads_maintenance(
+        self, months_ahead: int, retention_months: int, archive: bool
+    ) -> Optional[Dict[str, list]]:
+        """
+        Обслуживание партиций processed_leads: создает партиции на months_ahead месяцев вперед
+        и убирает старше retention_months (0 - не убирать).
+        
+        Returns:
+            {"created": [...], "expired": [(партиция, действие)]} или None, если обслуживание
+            уже выполняется другим процессом
+        """
+        today = datetime.now(timezone.utc).date()
+        async with self.session_factory() as db:
+            if not await partitions.try_lock(db):
+                return None
+            created = await partitions.ensure_partitions(db, today, months_ahead)
+            expired = []
+            if retention_months > 0:
+                expired = await partitions.expire_partitions(db, today, retention_months, archive)
+            await db.commit()
+        return {"created": created, "expired": expired}
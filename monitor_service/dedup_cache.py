@@ -0,0 +1,82 @@
+"""
+In-process кэш дедупликации лидов для monitor_service.
+Стоит перед таблицей processed_leads: одни и те же bidPK приходят в newLeads
+на каждом опросе, пока лид не прочитан, и повторные ключи не должны идти в Postgres.
+"""
+import time
+from collections import OrderedDict
+from typing import Dict, Iterable, List, Set, Tuple
+
+
+class LeadDedupCache:
+    """
+    LRU-кэш с TTL для ключей уже обработанных лидов одного аккаунта.
+    Хранит только положительные ответы ("лид обработан") - отрицательные
+    не кэшируются, чтобы не пропустить отметку, сделанную другим процессом.
+    """
+    
+    def __init__(self, max_size: int = 1000, ttl_sec: float = 86400.0):
+        self.max_size = max_size
+        self.ttl_sec = ttl_sec
+        self._entries: "OrderedDict[str, float]" = OrderedDict()  # lead_key -> expires_at (monotonic)
+        self.hits = 0
+        self.misses = 0
+    
+    def __len__(self) -> int:
+        return len(self._entries)
+    
+    def contains(self, lead_key: str) -> bool:
+        """Проверяет ключ и обновляет счетчики hit/miss."""
+        expires_at = self._entries.get(lead_key)
+        if expires_at is None:
+            self.misses += 1
+            return False
+        if expires_at < time.monotonic():
+            del self._entries[lead_key]
+            self.misses += 1
+            return False
+        self._entries.move_to_end(lead_key)
+        self.hits += 1
+        return True
+    
+    def split(self, lead_keys: Iterable[str]) -> Tuple[Set[str], List[str]]:
+        """
+        Делит ключи на найденные в кэше и те, что нужно проверить в БД.
+        
+        Returns:
+            (cached, missing): множество обработанных ключей и список промахов
+        """
+        cached: Set[str] = set()
+        missing: List[str] = []
+        for key in dict.fromkeys(lead_keys):
+            if self.contains(key):
+                cached.add(key)
+            else:
+                missing.append(key)
+        return cached, missing
+    
+    def add(self, lead_key: str) -> None:
+        """Добавляет ключ обработанного лида (вытесняя самый старый при переполнении)."""
+        self._entries[lead_key] = time.monotonic() + self.ttl_sec
+        self._entries.move_to_end(lead_key)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+    
+    def add_many(self, lead_keys: Iterable[str]) -> None:
+        """Добавляет несколько ключей."""
+        for key in lead_keys:
+            self.add(key)
+    
+    def discard(self, lead_key: str) -> None:
+        """Удаляет ключ из кэша (если есть)."""
+        self._entries.pop(lead_key, None)
+    
+    def stats(self) -> Dict[str, float]:
+        """Возвращает счетчики кэша."""
+        total = self.hits + self.misses
+        return {
+            "size": len(self._entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": self.hits / total if total else 0.0,
+        }
@@ -0,0 +1,97 @@
+"""
+Hedged-запросы для опроса /api/pro/new-leads.
+Если первый запрос не ответил за порог (p95 недавних задержек),
+отправляется второй и берется тот ответ, что пришел первым.
+"""
+import asyncio
+import logging
+from collections import deque
+from typing import Awaitable, Callable, Deque, Dict, TypeVar
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+
+class RequestHedger:
+    """
+    Выполняет запрос с "подстраховкой" (hedging) и ведет статистику.
+    Порог hedge берется как квантиль скользящего окна задержек
+    и ограничивается [min_delay_sec, max_delay_sec].
+    """
+    
+    # Сколько замеров нужно, прежде чем доверять квантилю
+    MIN_SAMPLES = 20
+    
+    def __init__(
+        self,
+        min_delay_sec: float = 0.3,
+        max_delay_sec: float = 1.5,
+        quantile: float = 0.95,
+        window: int = 200,
+    ):
+        self.min_delay_sec = min_delay_sec
+        self.max_delay_sec = max_delay_sec
+        self.quantile = quantile
+        self._latencies: Deque[float] = deque(maxlen=window)
+        self.requests = 0
+        self.hedges = 0
+        self.hedge_wins = 0
+        self.primary_wins = 0  # hedge отправлен, но первым ответил исходный запрос
+    
+    def threshold(self) -> float:
+        """Текущий порог (сек), после которого отправляется второй запрос."""
+        if len(self._latencies) < self.MIN_SAMPLES:
+            return self.max_delay_sec
+        ordered = sorted(self._latencies)
+        value = ordered[min(len(ordered) - 1, int(len(ordered) * self.quantile))]
+        return min(self.max_delay_sec, max(self.min_delay_sec, value))
+    
+    async def run(self, make_request: Callable[[], Awaitable[T]]) -> T:
+        """
+        Выполняет make_request() с hedging.
+        Возвращает первый успешный результат; если оба запроса упали - пробрасывает последнюю ошибку.
+        """
+        loop = asyncio.get_event_loop()
+        self.requests += 1
+        start = loop.time()
+        primary = asyncio.ensure_future(make_request())
+        
+        done, _ = await asyncio.wait({primary}, timeout=self.threshold())
+        if done:
+            self._latencies.append(loop.time() - start)
+            return primary.result()
+        
+        # Первый запрос не успел - отправляем второй
+        self.hedges += 1
+        hedge = asyncio.ensure_future(make_request())
+        pending = {primary, hedge}
+        last_error: BaseException = None
+        try:
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is not None:
+                        last_error = task.exception()
+                        continue
+                    # Задержка первого запроса известна только снизу - берем прошедшее время
+                    self._latencies.append(loop.time() - start)
+                    if task is hedge:
+                        self.hedge_wins += 1
+                    else:
+                        self.primary_wins += 1
+                    return task.result()
+        finally:
+            for task in pending:
+                task.cancel()
+        raise last_error
+    
+    def stats(self) -> Dict[str, float]:
+        """Возвращает счетчики hedging."""
+        return {
+            "requests": self.requests,
+            "hedges": self.hedges,
+            "hedge_wins": self.hedge_wins,
+            "primary_wins": self.primary_wins,
+            "threshold_sec": self.threshold(),
+        }
@@ -0,0 +1,142 @@
+"""
+Браузерный fast-path для опроса /api/pro/new-leads.
+Cookies из storage_state переносятся в async HTTP-клиент (httpx, HTTP/2 keep-alive),
+и BrowserContext аккаунта можно закрыть - он нужен только для WAF challenge и логина.
+"""
+import logging
+from typing import Any, Dict, List, Optional, Tuple
+
+import httpx
+
+logger = logging.getLogger(__name__)
+
+# Общий пул соединений для всех аккаунтов процесса.
+# У каждого аккаунта свой AsyncClient (свой cookie jar) поверх этого транспорта.
+_shared_transport: Optional[httpx.AsyncHTTPTransport] = None
+
+
+def get_shared_transport(max_connections: int = 100) -> httpx.AsyncHTTPTransport:
+    """Возвращает (создает при первом вызове) общий HTTP/2 транспорт."""
+    global _shared_transport
+    if _shared_transport is None:
+        _shared_transport = httpx.AsyncHTTPTransport(
+            http2=True,
+            limits=httpx.Limits(
+                max_connections=max_connections,
+                max_keepalive_connections=max_connections,
+                keepalive_expiry=60.0
+            )
+        )
+    return _shared_transport
+
+
+async def close_shared_transport():
+    """Закрывает общий транспорт (при остановке сервиса)."""
+    global _shared_transport
+    if _shared_transport is not None:
+        await _shared_transport.aclose()
+        _shared_transport = None
+
+
+class _BorrowedTransport(httpx.AsyncBaseTransport):
+    """Обертка над общим транспортом: закрытие клиента аккаунта не закрывает общий пул."""
+    
+    def __init__(self, transport: httpx.AsyncBaseTransport):
+        self._transport = transport
+    
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        return await self._transport.handle_async_request(request)
+    
+    async def aclose(self) -> None:
+        pass
+
+
+class HttpResponse:
+    """Обертка над httpx.Response с интерфейсом Playwright APIResponse (status/headers/body/text/json)."""
+    
+    def __init__(self, response: httpx.Response):
+        self._response = response
+        self.status = response.status_code
+        self.headers = response.headers
+    
+    async def body(self) -> bytes:
+        return self._response.content
+    
+    async def text(self) -> str:
+        return self._response.text
+    
+    async def json(self) -> Any:
+        return self._response.json()
+
+
+class HttpSession:
+    """
+    HTTP-сессия одного аккаунта: cookies из storage_state + общий пул соединений.
+    Set-Cookie из ответов сохраняются в jar и попадают в storage_state().
+    Исходные cookies Playwright хранятся как есть (secure/httpOnly/sameSite/expires
+    в jar httpx не переносятся) - из jar берутся только обновления от сервера.
+    """
+    
+    def __init__(self, user_agent: str, max_connections: int = 100):
+        self._client = httpx.AsyncClient(
+            transport=_BorrowedTransport(get_shared_transport(max_connections)),
+            headers={"User-Agent": user_agent},
+            follow_redirects=False
+        )
+        self._origins: List[Dict[str, Any]] = []
+        # (name, domain, path) -> cookie в формате Playwright
+        self._cookies: Dict[Tuple[str, str, str], Dict[str, Any]] = {}
+        self.loaded = False  # cookies еще не загружены - сохранять нечего
+    
+    def load_storage_state(self, storage_state: Dict[str, Any]) -> None:
+        """Заменяет cookies клиента cookies из Playwright storage_state."""
+        self._client.cookies.clear()
+        self._cookies = {}
+        for cookie in storage_state.get("cookies", []):
+            domain = cookie.get("domain", "")
+            path = cookie.get("path", "/")
+            self._cookies[(cookie["name"], domain, path)] = dict(cookie)
+            self._client.cookies.set(cookie["name"], cookie["value"], domain=domain, path=path)
+        self._origins = storage_state.get("origins", [])
+        self.loaded = True
+    
+    def storage_state(self) -> Dict[str, Any]:
+        """
+        Текущие cookies в формате Playwright storage_state.
+        У исходных cookies меняются только value/expires, если сервер прислал Set-Cookie;
+        новые cookies берут атрибуты из Set-Cookie; удаленные сервером (истекшие) выпадают.
+        """
+        cookies = []
+        for cookie in self._client.cookies.jar:
+            original = self._cookies.get((cookie.name, cookie.domain, cookie.path))
+            if original is not None:
+                merged = dict(original)
+                # expires в jar появляется только из Set-Cookie (при загрузке не передается)
+                if cookie.value != original.get("value") or cookie.expires is not None:
+                    merged["value"] = cookie.value
+                    merged["expires"] = cookie.expires if cookie.expires is not None else -1
+                cookies.append(merged)
+                continue
+            same_site = (cookie.get_nonstandard_attr("SameSite") or "Lax").capitalize()
+            cookies.append({
+                "name": cookie.name,
+                "value": cookie.value,
+                "domain": cookie.domain,
+                "path": cookie.path,
+                "expires": cookie.expires if cookie.expires is not None else -1,
+                "httpOnly": cookie.has_nonstandard_attr("HttpOnly"),
+                "secure": cookie.secure,
+                "sameSite": same_site if same_site in ("Strict", "Lax", "None") else "Lax",
+            })
+        return {"cookies": cookies, "origins": self._origins}
+    
+    async def get(self, url: str, headers: Optional[Dict[str, str]] = None, timeout: float = 2000) -> HttpResponse:
+        """GET-запрос; timeout в миллисекундах, как у Playwright."""
+        response = await self._client.get(url, headers=headers, timeout=timeout / 1000)
+        return HttpResponse(response)
+    
+    async def close(self) -> None:
+        """Закрывает клиент аккаунта (cookie jar); общий пул соединений остается открытым."""
+        await self._client.aclose()
+        self._cookies = {}
+        self.loaded = False
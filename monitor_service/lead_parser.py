@@ -0,0 +1,111 @@
+# lead_parser.py
+"""
+Разбор ответа /api/pro/new-leads в компактные записи NewLead.
+Вызывается на каждом цикле опроса, поэтому без лишних аллокаций:
+запись со __slots__, lead_key кэшируется по bidPK, подробный лог - только на DEBUG.
+Стоимость разбора измеряется cli/bench_lead_parser.py.
+"""
+import hashlib
+import logging
+from dataclasses import dataclass, asdict
+from functools import lru_cache
+from typing import Any, Dict, List
+
+logger = logging.getLogger(__name__)
+
+LEADS_PATH = "/pro-leads/"
+MAP_PIN_ICON = "map-pin--small"
+
+
+@dataclass(frozen=True, slots=True)
+class NewLead:
+    """Новый лид из ответа API (формат полей идентичен ThumbTackBot.list_new_leads())."""
+    index: int
+    href: str
+    lead_id: str
+    lead_key: str
+    name: str
+    category: str
+    location: str
+    has_view: bool = True
+
+    def to_dict(self) -> Dict[str, Any]:
+        """Словарь для отправки в Celery (задача воркера принимает dict)."""
+        return asdict(self)
+
+
+@lru_cache(maxsize=4096)
+def lead_key_for_bid(bid_pk: str) -> str:
+    """lead_key по bidPK - то же значение, что ThumbTackBot.lead_key_from_url(f"/pro-leads/{bidPK}")."""
+    return hashlib.md5(f"{LEADS_PATH}{bid_pk}".encode("utf-8")).hexdigest()
+
+
+def _extract_fields(component_groups: List[Dict[str, Any]]):
+    """Имя, категория и адрес из componentGroups (при повторах берется последнее значение)."""
+    name = ""
+    category = ""
+    location = ""
+    for group in component_groups:
+        for component in group.get("intentComponents", ()):
+            if component.get("type") == "avatarTitleSubtitle":
+                name = component.get("title", "")
+        for component in group.get("requestDetailComponents", ()):
+            category = component.get("title", "")
+            for icon_group in component.get("iconTitleAddressGroups", ()):
+                for addr in icon_group.get("iconTitleAddresses", ()):
+                    if addr.get("icon") == MAP_PIN_ICON:
+                        location = addr.get("title", "")
+    return name, category, location
+
+
+def parse_new_leads(json_data: Any, log_prefix: str = "") -> List[NewLead]:
+    """
+    Извлекает лиды из ответа API /api/pro/new-leads.
+
+    Args:
+        json_data: JSON ответ от API
+        log_prefix: префикс для логов (например, "[Monitor <account_id>]")
+
+    Returns:
+        Список NewLead (лиды без bidPK пропускаются)
+    """
+    if not isinstance(json_data, dict):
+        logger.error(
+            f"{log_prefix} API ответ имеет неожиданный тип: {type(json_data)}. "
+            f"Ожидается dict с ключом 'newLeads'"
+        )
+        return []
+
+    new_leads = json_data.get("newLeads") or []
+    debug = logger.isEnabledFor(logging.DEBUG)
+    if debug and new_leads:
+        logger.debug(
+            f"{log_prefix} Найдено лидов в API: {len(new_leads)}, "
+            f"bidPK: {[lead.get('bidPK', 'N/A') for lead in new_leads]}"
+        )
+
+    leads: List[NewLead] = []
+    for index, lead_data in enumerate(new_leads):
+        bid_pk = lead_data.get("bidPK", "")
+        if debug:
+            logger.debug(
+                f"{log_prefix} Лид #{index + 1}: bidPK={bid_pk}, "
+                f"isUnread={lead_data.get('isUnread', True)}, "
+                f"customerContactTime={lead_data.get('customerContactTime', '')}"
+            )
+        if not bid_pk:
+            continue
+
+        bid_pk = str(bid_pk)
+        name, category, location = _extract_fields(lead_data.get("componentGroups", ()))
+        leads.append(NewLead(
+            index=index,
+            href=f"{LEADS_PATH}{bid_pk}",
+            lead_id=bid_pk,
+            lead_key=lead_key_for_bid(bid_pk),
+            name=name.strip(),
+            category=category.strip(),
+            location=location.strip(),
+        ))
+
+    return leads
@@ -0,0 +1,176 @@
+"""
+Неблокирующая отправка лидов в RabbitMQ (Celery) для monitor_service.
+send_task - синхронный AMQP publish; вызванный из корутины, он останавливает
+event loop, общий для всех AccountMonitor. Здесь публикация вынесена в отдельный
+поток с постоянным соединением из пула Celery, а мониторы только ждут future.
+"""
+import asyncio
+import logging
+import queue
+import threading
+from typing import List, Optional, Set, Tuple
+
+from celery import Celery
+
+from monitor_service.lead_parser import NewLead
+
+logger = logging.getLogger(__name__)
+
+# (account_id, leads, future, loop)
+_Job = Tuple[str, List[NewLead], asyncio.Future, asyncio.AbstractEventLoop]
+
+
+class LeadPublisher:
+    """
+    Публикует лиды в очередь Celery из выделенного потока.
+    Лиды одного цикла мониторинга отправляются пачкой через один producer
+    (соединение берется из producer_pool и переиспользуется между пачками).
+    Подтверждения брокера (publisher confirms) включаются в MonitorService
+    через broker_transport_options={"confirm_publish": True}.
+    """
+    
+    _STOP = object()
+    
+    def __init__(self, celery_app: Celery, task_name: str, queue_name: str):
+        self.celery_app = celery_app
+        self.task_name = task_name
+        self.queue_name = queue_name
+        self._queue: "queue.Queue" = queue.Queue()
+        self._thread: Optional[threading.Thread] = None
+        # Защищает _stopping и постановку в очередь: после остановки пачки не принимаются,
+        # а оставшиеся в очереди завершаются ошибкой (publish() не зависает)
+        self._lock = threading.Lock()
+        self._stopping = False
+    
+    def start(self):
+        """Запускает поток публикации."""
+        if self._thread and self._thread.is_alive():
+            return
+        self._stopping = False
+        self._thread = threading.Thread(target=self._run, name="lead-publisher", daemon=True)
+        self._thread.start()
+        logger.info("LeadPublisher запущен")
+    
+    async def stop(self, timeout: float = 10.0):
+        """Останавливает поток, дождавшись отправки уже поставленных пачек."""
+        if not self._thread:
+            return
+        with self._lock:
+            self._stopping = True
+            self._queue.put(self._STOP)
+        await asyncio.get_event_loop().run_in_executor(None, self._thread.join, timeout)
+        self._thread = None
+        logger.info("LeadPublisher остановлен")
+    
+    async def publish(self, account_id: str, leads: List[NewLead]) -> Set[str]:
+        """
+        Ставит лиды одного цикла в очередь на публикацию и ждет подтверждения.
+        Event loop при этом не блокируется.
+        
+        Returns:
+            Set[str]: lead_key лидов, которые отправить не удалось
+        """
+        if not leads:
+            return set()
+        loop = asyncio.get_event_loop()
+        future = loop.create_future()
+        with self._lock:
+            if self._stopping or not self._thread or not self._thread.is_alive():
+                raise RuntimeError("LeadPublisher не запущен")
+            self._queue.put((account_id, leads, future, loop))
+        return await future
+    
+    def _run(self):
+        """Поток публикации; при выходе (остановка или ошибка) ждущие пачки завершаются ошибкой."""
+        try:
+            self._loop()
+        except Exception as e:
+            logger.error(f"[Publisher] Поток публикации завершился с ошибкой: {e}", exc_info=True)
+        finally:
+            # Новые пачки больше не принимаются; ждущие в очереди завершаются ошибкой
+            with self._lock:
+                self._stopping = True
+                pending = []
+                while True:
+                    try:
+                        job = self._queue.get_nowait()
+                    except queue.Empty:
+                        break
+                    if job is not self._STOP:
+                        pending.append(job)
+            self._fail_jobs(pending, RuntimeError("LeadPublisher остановлен"))
+    
+    def _loop(self):
+        """Цикл потока: забирает все накопившиеся пачки и публикует их одним producer."""
+        while True:
+            job = self._queue.get()
+            if job is self._STOP:
+                return
+            jobs: List[_Job] = [job]
+            stop = False
+            # Добираем все, что уже ждет в очереди (лиды нескольких аккаунтов)
+            while True:
+                try:
+                    extra = self._queue.get_nowait()
+                except queue.Empty:
+                    break
+                if extra is self._STOP:
+                    stop = True
+                    break
+                jobs.append(extra)
+            
+            try:
+                self._publish_jobs(jobs)
+            except Exception as e:
+                self._fail_jobs(jobs, e)
+                raise
+            if stop:
+                return
+    
+    def _publish_jobs(self, jobs: List[_Job]):
+        # Лид считается отправленным только после успешного send_task (с confirm_publish -
+        # после подтверждения брокера); все, что не подтверждено, остается в failed
+        results: List[Set[str]] = [{lead.lead_key for lead in leads} for _, leads, _, _ in jobs]
+        try:
+            with self.celery_app.producer_pool.acquire(block=True) as producer:
+                for (account_id, leads, _, _), failed in zip(jobs, results):
+                    for lead in leads:
+                        try:
+                            self.celery_app.send_task(
+                                self.task_name,
+                                args=[account_id, lead.to_dict()],
+                                queue=self.queue_name,
+                                retry=False,
+                                producer=producer
+                            )
+                            failed.discard(lead.lead_key)
+                        except Exception as e:
+                            logger.error(
+                                f"[Publisher {account_id}] Ошибка при отправке лида {lead.lead_key}: {e}",
+                                exc_info=True
+                            )
+        except Exception as e:
+            # Ошибка соединения (в том числе при возврате producer в пул) касается только
+            # неподтвержденных лидов - подтвержденные повторно не отправляются
+            logger.error(f"[Publisher] Ошибка соединения с брокером: {e}", exc_info=True)
+        
+        for (_, _, future, loop), failed in zip(jobs, results):
+            loop.call_soon_threadsafe(self._resolve, future, failed)
+    
+    def _fail_jobs(self, jobs: List[_Job], error: Exception):
+        for _, _, future, loop in jobs:
+            try:
+                loop.call_soon_threadsafe(self._reject, future, error)
+            except RuntimeError:
+                # Event loop монитора уже закрыт
+                pass
+    
+    @staticmethod
+    def _resolve(future: asyncio.Future, failed: Set[str]):
+        if not future.done():
+            future.set_result(failed)
+    
+    @staticmethod
+    def _reject(future: asyncio.Future, error: Exception):
+        if not future.done():
+            future.set_exception(error)
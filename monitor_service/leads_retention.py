@@ -0,0 +1,69 @@
+# leads_retention.py
+"""
+Обслуживание таблицы processed_leads (помесячные партиции по processed_at):
+создает партиции наперед и удаляет/архивирует партиции старше срока хранения.
+
+Работает в фоне внутри MonitorService (раз в MONITOR_LEADS_MAINTENANCE_INTERVAL_SEC;
+при нескольких шардах выполняется одним из них - advisory lock в БД).
+Разовый запуск (например, из cron):
+    python -m monitor_service.leads_retention
+"""
+import asyncio
+import logging
+
+from monitor_service.config import CONFIG
+from monitor_service.db_client import DBClient
+
+logger = logging.getLogger(__name__)
+
+
+class LeadsRetentionJob:
+    """Периодическое обслуживание партиций processed_leads."""
+
+    def __init__(self, db_client: DBClient, interval_sec: float = CONFIG.leads_maintenance_interval_sec):
+        self.db_client = db_client
+        self.interval_sec = interval_sec
+
+    async def run_once(self):
+        """Один проход обслуживания (ошибки логируются, мониторинг не прерывается)."""
+        try:
+            result = await self.db_client.run_leads_maintenance(
+                months_ahead=CONFIG.leads_partitions_ahead,
+                retention_months=CONFIG.leads_retention_months,
+                archive=CONFIG.leads_retention_mode.lower() != "drop"
+            )
+        except Exception as e:
+            logger.error(f"Ошибка обслуживания партиций processed_leads: {e}", exc_info=True)
+            return
+        if result is None:
+            logger.info("Обслуживание processed_leads уже выполняется другим процессом, пропускаем")
+            return
+        for name in result["created"]:
+            logger.info(f"processed_leads: создана партиция {name}")
+        for name, action in result["expired"]:
+            logger.info(f"processed_leads: партиция {name} {'отсоединена (архив)' if action == 'archived' else 'удалена'}")
+
+    async def run(self, stop_event: asyncio.Event):
+        """Выполняет обслуживание сразу и затем раз в interval_sec до stop_event."""
+        while not stop_event.is_set():
+            await self.run_once()
+            try:
+                await asyncio.wait_for(stop_event.wait(), timeout=self.interval_sec)
+            except asyncio.TimeoutError:
+                pass
+
+
+async def main():
+    db_client = DBClient(CONFIG.db_url)
+    await db_client.initialize()
+    try:
+        await LeadsRetentionJob(db_client).run_once()
+    finally:
+        await db_client.close()
+
+
+if __name__ == "__main__":
+    from playwright_bot.log_config import setup_logging
+
+    setup_logging("monitor_service", CONFIG.log_level)
+    asyncio.run(main())
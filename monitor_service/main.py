@@ -1,25 +1,30 @@
 # main.py
 """
 Главный файл сервиса мониторинга.
-Запускает N параллельных мониторов аккаунтов.
+Запускает N параллельных мониторов аккаунтов и сверяет их набор с БД без перезапуска.
 """
 import asyncio
 import logging
 import signal
 import sys
-from typing import List
+from typing import Dict, List, Optional
 
 from celery import Celery
 from monitor_service.config import CONFIG
 from monitor_service.db_client import DBClient
 from monitor_service.account_monitor import AccountMonitor
+from monitor_service.database.schemas import Account
 from monitor_service.browser_pool import MonitorBrowserPool
+from monitor_service.lead_publisher import LeadPublisher
+from monitor_service.leads_retention import LeadsRetentionJob
+from monitor_service.metrics import MetricsRegistry, MetricsServer
+from monitor_service.restart_coordinator import RestartCoordinator
+from playwright_bot.session_store import create_session_store
+from playwright_bot.log_config import setup_logging
+from monitor_service.sharding import filter_accounts_for_shard
 
-# Настройка логирования
-logging.basicConfig(
-    level=getattr(logging, CONFIG.log_level.upper(), logging.INFO),
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
-)
+# Настройка логирования: запись в поток вывода вне event loop, выборка повторяющихся сообщений
+setup_logging("monitor_service", CONFIG.log_level, levels={"httpx": "WARNING", "httpcore": "WARNING"})
 logger = logging.getLogger(__name__)
 
 
@@ -30,11 +35,16 @@ class MonitorService:
     """
     
     def __init__(self):
-        self.monitors: List[AccountMonitor] = []
-        self.stop_event = asyncio.Event()
+        self.monitors: Dict[str, AccountMonitor] = {}
+        self._monitor_tasks: Dict[str, asyncio.Task] = {}
+        self.stop_event = asyncio.Event()  # выставляется, когда сервис полностью остановлен
+        self._stopping = asyncio.Event()
         
         # Инициализируем клиент БД
         self.db_client = DBClient(CONFIG.db_url)
+        # Партиции processed_leads: создание наперед и срок хранения
+        self.leads_retention = LeadsRetentionJob(self.db_client)
+        self._retention_task: Optional[asyncio.Task] = None
         
         # Создаем пул браузеров (один браузер для всех мониторов)
         self.browser_pool = MonitorBrowserPool(
@@ -42,6 +52,17 @@ class MonitorService:
             slow_mo=CONFIG.slow_mo
         )
         
+        # Общее хранилище сессий (SESSION_STORE_BACKEND: file/redis/postgres)
+        self.session_store = create_session_store(CONFIG.sessions_dir)
+        
+        # Координатор перезапусков контекстов: разносит рестарты и ограничивает их параллелизм
+        self.restart_coordinator = RestartCoordinator(
+            interval_sec=CONFIG.restart_interval_sec,
+            max_concurrent=CONFIG.max_concurrent_restarts,
+            memory_limit_mb=CONFIG.restart_memory_limit_mb,
+            rss_probe=self.browser_pool.get_uss_mb
+        )
+        
         # Инициализируем Celery как клиент (для отправки задач)
         self.celery_app = Celery(
             "monitor_service",
@@ -50,6 +71,25 @@ class MonitorService:
         self.celery_app.conf.task_serializer = "json"
         self.celery_app.conf.accept_content = ["json"]
         self.celery_app.conf.result_serializer = "json"
+        # Publisher confirms: publish возвращается только после подтверждения брокера
+        self.celery_app.conf.broker_transport_options = {"confirm_publish": True}
+        
+        # Отправка лидов в отдельном потоке (не блокирует event loop мониторов)
+        self.publisher = LeadPublisher(
+            self.celery_app,
+            task_name=CONFIG.task_name,
+            queue_name=CONFIG.queue_name
+        )
+        
+        # Метрики мониторов (гистограммы по аккаунтам) и HTTP /metrics
+        self.metrics = MetricsRegistry(window=CONFIG.metrics_window)
+        self.metrics.add_collector("db_pool", self.db_client.pool_metrics)
+        self.metrics_server: Optional[MetricsServer] = None
+        if CONFIG.metrics_port > 0:
+            self.metrics_server = MetricsServer(
+                self.metrics,
+                port=CONFIG.metrics_port + CONFIG.shard_index
+            )
         
         logger.info("MonitorService инициализирован")
     
@@ -62,58 +102,163 @@ class MonitorService:
         try:
             # 1. Инициализируем БД (таблицы должны быть созданы через Alembic миграции)
             await self.db_client.initialize()
+            self._retention_task = asyncio.ensure_future(self.leads_retention.run(self._stopping))
             
             # 2. Запускаем браузер (один для всех мониторов)
             await self.browser_pool.start()
             logger.info("Браузер запущен, готов к созданию контекстов")
             
-            # 3. Получаем список активных аккаунтов из БД
-            try:
-                accounts = await self.db_client.get_active_accounts()
-            except Exception as e:
-                logger.error(f"Ошибка получения аккаунтов из БД: {e}", exc_info=True)
-                logger.warning("Использую fallback на переменные окружения")
-                accounts = self._get_accounts_from_env()
-            
-            if not accounts:
-                logger.error("Нет активных аккаунтов для мониторинга!")
-                logger.error("Добавьте аккаунты в БД или установите переменные окружения")
-                return
+            # Запускаем поток отправки лидов в RabbitMQ
+            self.publisher.start()
             
-            logger.info(f"Найдено {len(accounts)} аккаунтов для мониторинга")
+            if self.metrics_server:
+                try:
+                    await self.metrics_server.start()
+                except OSError as e:
+                    logger.error(f"Не удалось запустить сервер метрик на порту {self.metrics_server.port}: {e}")
+                    self.metrics_server = None
             
-            # 4. Создаем мониторы для каждого аккаунта
-            # Каждый монитор будет использовать один браузер, но свой контекст
-            for account in accounts:
-                monitor = AccountMonitor(account, self.celery_app, self.browser_pool, self.db_client)
-                self.monitors.append(monitor)
-                logger.info(f"Создан монитор для аккаунта: {account.account_id} ({account.email})")
+            # 3. Запускаем мониторы активных аккаунтов
+            # Каждый монитор использует один браузер, но свой контекст
+            await self._reconcile()
             
-            # 5. Запускаем все мониторы параллельно
-            logger.info(f"Запуск {len(self.monitors)} мониторов (все используют один браузер)...")
+            if not self.monitors:
+                logger.warning("Нет активных аккаунтов для мониторинга!")
+                logger.warning("Добавьте аккаунты в БД (add_account.py) - они подхватятся без перезапуска")
             
-            tasks = [monitor.start() for monitor in self.monitors]
-            
-            # Ждем завершения всех задач (или остановки)
-            try:
-                await asyncio.gather(*tasks)
-            except asyncio.CancelledError:
-                logger.info("Получен сигнал остановки")
+            # 4. Периодически сверяем набор мониторов с БД (добавление/отключение/смена пароля)
+            while not self._stopping.is_set():
+                try:
+                    await asyncio.wait_for(self._stopping.wait(), timeout=CONFIG.accounts_reload_interval_sec)
+                except asyncio.TimeoutError:
+                    pass
+                if self._stopping.is_set():
+                    break
+                try:
+                    await self._reconcile()
+                except Exception as e:
+                    logger.error(f"Ошибка при сверке аккаунтов: {e}", exc_info=True)
             
         except Exception as e:
             logger.error(f"Критическая ошибка в MonitorService: {e}", exc_info=True)
         finally:
             await self.stop()
     
+    async def _load_accounts(self) -> Optional[List[Account]]:
+        """Активные аккаунты этого процесса (None - если БД недоступна и fallback пуст)."""
+        try:
+            accounts = await self.db_client.get_active_accounts()
+        except Exception as e:
+            logger.error(f"Ошибка получения аккаунтов из БД: {e}", exc_info=True)
+            if self.monitors:
+                # БД временно недоступна - оставляем текущие мониторы как есть
+                return None
+            logger.warning("Использую fallback на переменные окружения")
+            accounts = self._get_accounts_from_env()
+        
+        # В шардированном режиме берем только свои аккаунты
+        if CONFIG.shard_count > 1:
+            accounts = filter_accounts_for_shard(accounts, CONFIG.shard_index, CONFIG.shard_count)
+            logger.debug(f"Шард {CONFIG.shard_index}/{CONFIG.shard_count}: {len(accounts)} аккаунтов")
+        return accounts
+    
+    async def _reconcile(self):
+        """
+        Приводит набор мониторов к списку активных аккаунтов:
+        запускает новые, останавливает отключенные/удаленные и перезапускает
+        мониторы с измененными credentials или неожиданно завершившиеся.
+        Остальные мониторы не трогаются.
+        """
+        accounts = await self._load_accounts()
+        if accounts is None:
+            return
+        
+        # Пул соединений с БД растет вместе с числом мониторов
+        await self.db_client.ensure_pool_capacity(len(accounts))
+        
+        wanted = {account.account_id: account for account in accounts}
+        
+        for account_id in list(self.monitors):
+            account = wanted.get(account_id)
+            monitor = self.monitors[account_id]
+            if account is None:
+                logger.info(f"Аккаунт {account_id} отключен или удален, остановка монитора")
+                await self._stop_monitor(account_id)
+            elif (account.email, account.password) != (monitor.account.email, monitor.account.password):
+                logger.info(f"Credentials аккаунта {account_id} изменились, перезапуск монитора")
+                await self._stop_monitor(account_id)
+            elif self._monitor_tasks[account_id].done():
+                logger.warning(f"Монитор {account_id} завершился, перезапуск")
+                await self._stop_monitor(account_id)
+        
+        for account_id, account in wanted.items():
+            if account_id not in self.monitors:
+                self._start_monitor(account)
+    
+    def _start_monitor(self, account: Account):
+        monitor = AccountMonitor(
+            account,
+            self.publisher,
+            self.browser_pool,
+            self.db_client,
+            restart_coordinator=self.restart_coordinator,
+            session_store=self.session_store,
+            metrics=self.metrics.for_account(account.account_id)
+        )
+        self.monitors[account.account_id] = monitor
+        self._monitor_tasks[account.account_id] = asyncio.ensure_future(monitor.start())
+        logger.info(f"Запущен монитор для аккаунта: {account.account_id} ({account.email}), всего: {len(self.monitors)}")
+    
+    async def _stop_monitor(self, account_id: str, timeout: float = 30.0):
+        monitor = self.monitors.pop(account_id, None)
+        task = self._monitor_tasks.pop(account_id, None)
+        if monitor:
+            await monitor.stop()
+        self.metrics.remove(account_id)
+        if task and not task.done():
+            try:
+                await asyncio.wait_for(asyncio.shield(task), timeout=timeout)
+            except asyncio.TimeoutError:
+                logger.warning(f"Монитор {account_id} не остановился за {timeout} сек, отмена")
+                task.cancel()
+                # Отмена прерывает цикл, но не очистку: дожидаемся закрытия контекста и сессии
+                done, _ = await asyncio.wait({task}, timeout=timeout)
+                if not done:
+                    logger.error(f"Монитор {account_id} не завершил очистку за {timeout} сек после отмены")
+            except Exception:
+                pass
+    
     async def stop(self):
         """Останавливает все мониторы и браузер."""
+        if self._stopping.is_set():
+            await self.stop_event.wait()
+            return
+        self._stopping.set()
         logger.info("Остановка всех мониторов...")
         
         # Останавливаем все мониторы
-        stop_tasks = [monitor.stop() for monitor in self.monitors]
+        stop_tasks = [self._stop_monitor(account_id) for account_id in list(self.monitors)]
         if stop_tasks:
             await asyncio.gather(*stop_tasks, return_exceptions=True)
         
+        if self.metrics_server:
+            await self.metrics_server.stop()
+        
+        if self._retention_task is not None:
+            self._retention_task.cancel()
+            self._retention_task = None
+        
+        # Дожидаемся отправки уже поставленных лидов
+        await self.publisher.stop()
+        
+        # Закрываем общий пул HTTP-соединений (HTTP fast-path)
+        if CONFIG.poll_backend == "http":
+            from monitor_service.http_poller import close_shared_transport
+            await close_shared_transport()
+        
+        # Закрываем хранилище сессий
+        await self.session_store.close()
+        
         # Закрываем соединения с БД
         await self.db_client.close()
         
@@ -125,7 +270,6 @@ class MonitorService:
     
     def _get_accounts_from_env(self):
         """Fallback: получает список аккаунтов из переменных окружения."""
-        from monitor_service.database.schemas import Account
         import os
         
         accounts = []
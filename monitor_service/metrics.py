@@ -0,0 +1,221 @@
+# metrics.py
+"""
+Метрики мониторов аккаунтов: гистограммы по скользящему окну (p50/p95/p99) и счетчики.
+Отдаются встроенным HTTP-сервером (без внешних зависимостей):
+  GET /metrics       - текстовый формат Prometheus
+  GET /metrics.json  - те же данные в JSON
+Кроме метрик аккаунтов регистрируются коллекторы уровня процесса (например, пул БД).
+"""
+import asyncio
+import json
+import logging
+import math
+from collections import deque
+from typing import Callable, Deque, Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+# Гистограммы цикла мониторинга (имя -> описание для Prometheus HELP)
+HISTOGRAMS: Dict[str, str] = {
+    "poll_latency_seconds": "Время запроса /api/pro/new-leads",
+    "cycle_seconds": "Полное время цикла мониторинга",
+    "dedup_seconds": "Время дедупликации лидов (кэш + claim в БД)",
+    "publish_seconds": "Время отправки лидов в RabbitMQ",
+    "leads_per_cycle": "Лидов в ответе API за цикл",
+    "session_repair_seconds": "Время восстановления сессии (WAF challenge / 401)",
+}
+
+# Счетчики (монотонные с момента запуска монитора)
+COUNTERS: Dict[str, str] = {
+    "cycles_total": "Циклов мониторинга",
+    "leads_published_total": "Лидов отправлено в очередь",
+    "waf_challenges_total": "Ответов API с WAF challenge",
+    "unauthorized_total": "Ответов API 401",
+    "errors_total": "Циклов, завершившихся ошибкой",
+    "dedup_cache_hits_total": "Ключей лидов, найденных в кэше дедупликации",
+    "dedup_cache_misses_total": "Ключей лидов, не найденных в кэше дедупликации (claim в БД)",
+    "hedges_total": "Отправлено hedge-запросов к /api/pro/new-leads",
+    "hedge_wins_total": "Hedge-запрос ответил раньше исходного",
+    "primary_wins_total": "Исходный запрос ответил раньше отправленного hedge",
+}
+
+QUANTILES = (0.5, 0.95, 0.99)
+
+
+class Histogram:
+    """Последние window наблюдений; квантили считаются только при чтении."""
+
+    def __init__(self, window: int = 1024):
+        self._values: Deque[float] = deque(maxlen=window)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value: float):
+        self._values.append(value)
+        self.count += 1
+        self.sum += value
+
+    def snapshot(self) -> Dict[str, float]:
+        values = sorted(self._values)
+        result = {"count": self.count, "sum": self.sum}
+        for q in QUANTILES:
+            result[f"p{int(q * 100)}"] = self._quantile(values, q)
+        result["max"] = values[-1] if values else 0.0
+        return result
+
+    @staticmethod
+    def _quantile(values, q: float) -> float:
+        if not values:
+            return 0.0
+        index = min(len(values) - 1, max(0, math.ceil(q * len(values)) - 1))
+        return values[index]
+
+
+class AccountMetrics:
+    """Метрики одного аккаунта."""
+
+    def __init__(self, window: int = 1024):
+        self.histograms: Dict[str, Histogram] = {name: Histogram(window) for name in HISTOGRAMS}
+        self.counters: Dict[str, int] = {name: 0 for name in COUNTERS}
+
+    def observe(self, name: str, value: float):
+        self.histograms[name].observe(value)
+
+    def inc(self, name: str, value: int = 1):
+        self.counters[name] += value
+
+    def set(self, name: str, value: int):
+        """Счетчик, который ведет сам компонент (например, RequestHedger), - копируется как есть."""
+        self.counters[name] = value
+
+    def snapshot(self) -> Dict[str, Dict]:
+        return {
+            "histograms": {name: h.snapshot() for name, h in self.histograms.items()},
+            "counters": dict(self.counters),
+        }
+
+
+class MetricsRegistry:
+    """Метрики всех мониторов процесса (по account_id)."""
+
+    def __init__(self, window: int = 1024):
+        self.window = window
+        self._accounts: Dict[str, AccountMetrics] = {}
+        self._collectors: Dict[str, Callable[[], Dict[str, float]]] = {}
+
+    def for_account(self, account_id: str) -> AccountMetrics:
+        metrics = self._accounts.get(account_id)
+        if metrics is None:
+            metrics = self._accounts[account_id] = AccountMetrics(self.window)
+        return metrics
+
+    def remove(self, account_id: str):
+        self._accounts.pop(account_id, None)
+
+    def add_collector(self, name: str, collect: Callable[[], Dict[str, float]]):
+        """Метрики процесса: collect() возвращает {имя: значение}, отдаются как gauge <prefix>_<name>_<имя>."""
+        self._collectors[name] = collect
+
+    def _collect(self) -> Dict[str, Dict[str, float]]:
+        result = {}
+        for name, collect in self._collectors.items():
+            try:
+                result[name] = collect()
+            except Exception as e:
+                logger.debug(f"Ошибка коллектора метрик {name}: {e}")
+        return result
+
+    def snapshot(self) -> Dict[str, Dict]:
+        return {
+            "accounts": {account_id: m.snapshot() for account_id, m in self._accounts.items()},
+            **self._collect(),
+        }
+
+    def render_prometheus(self, prefix: str = "tt_monitor") -> str:
+        lines = []
+        for name, help_text in HISTOGRAMS.items():
+            metric = f"{prefix}_{name}"
+            lines.append(f"# HELP {metric} {help_text}")
+            lines.append(f"# TYPE {metric} summary")
+            for account_id, m in self._accounts.items():
+                snap = m.histograms[name].snapshot()
+                label = _escape_label(account_id)
+                for q in QUANTILES:
+                    lines.append(
+                        f'{metric}{{account_id="{label}",quantile="{q}"}} {snap[f"p{int(q * 100)}"]:.6f}'
+                    )
+                lines.append(f'{metric}_sum{{account_id="{label}"}} {snap["sum"]:.6f}')
+                lines.append(f'{metric}_count{{account_id="{label}"}} {snap["count"]}')
+        for name, help_text in COUNTERS.items():
+            metric = f"{prefix}_{name}"
+            lines.append(f"# HELP {metric} {help_text}")
+            lines.append(f"# TYPE {metric} counter")
+            for account_id, m in self._accounts.items():
+                lines.append(f'{metric}{{account_id="{_escape_label(account_id)}"}} {m.counters[name]}')
+        lines.append(f"# HELP {prefix}_accounts Мониторов в процессе")
+        lines.append(f"# TYPE {prefix}_accounts gauge")
+        lines.append(f"{prefix}_accounts {len(self._accounts)}")
+        for name, values in self._collect().items():
+            for key, value in values.items():
+                metric = f"{prefix}_{name}_{key}"
+                lines.append(f"# TYPE {metric} {'counter' if key.endswith('_total') else 'gauge'}")
+                lines.append(f"{metric} {value}")
+        return "\n".join(lines) + "\n"
+
+
+def _escape_label(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+class MetricsServer:
+    """Минимальный HTTP-сервер метрик на asyncio (GET /metrics, /metrics.json)."""
+
+    def __init__(self, registry: MetricsRegistry, host: str = "0.0.0.0", port: int = 9100):
+        self.registry = registry
+        self.host = host
+        self.port = port
+        self._server: Optional[asyncio.AbstractServer] = None
+
+    async def start(self):
+        self._server = await asyncio.start_server(self._handle, self.host, self.port)
+        logger.info(f"Метрики доступны на http://{self.host}:{self.port}/metrics")
+
+    async def stop(self):
+        if self._server is None:
+            return
+        self._server.close()
+        await self._server.wait_closed()
+        self._server = None
+
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        try:
+            request_line = await asyncio.wait_for(reader.readline(), timeout=5)
+            # Заголовки запроса не нужны - дочитываем до пустой строки
+            while True:
+                line = await asyncio.wait_for(reader.readline(), timeout=5)
+                if not line or line in (b"\r\n", b"\n"):
+                    break
+
+            parts = request_line.decode("latin-1").split()
+            path = parts[1].split("?", 1)[0] if len(parts) > 1 else ""
+            if parts and parts[0] == "GET" and path == "/metrics":
+                status, content_type = "200 OK", "text/plain; version=0.0.4; charset=utf-8"
+                body = self.registry.render_prometheus().encode("utf-8")
+            elif parts and parts[0] == "GET" and path == "/metrics.json":
+                status, content_type = "200 OK", "application/json"
+                body = json.dumps(self.registry.snapshot(), ensure_ascii=False).encode("utf-8")
+            else:
+                status, content_type, body = "404 Not Found", "text/plain", b"not found\n"
+
+            writer.write(
+                f"HTTP/1.1 {status}\r\nContent-Type: {content_type}\r\n"
+                f"Content-Length: {len(body)}\r\nConnection: close\r\n\r\n".encode("latin-1") + body
+            )
+            await writer.drain()
+        except Exception as e:
+            logger.debug(f"Ошибка обработки запроса метрик: {e}")
+        finally:
+            try:
+                writer.close()
+            except Exception:
+                pass
@@ -0,0 +1,110 @@
+"""
+Планировщики опроса /api/pro/new-leads для AccountMonitor.
+Определяют паузу между циклами мониторинга.
+"""
+import random
+import time
+from typing import Optional, Tuple
+
+from monitor_service.config import MonitorConfig
+
+
+class PollScheduler:
+    """Базовый планировщик: фиксированная пауза после каждого цикла (fixed-delay)."""
+    
+    def __init__(self, interval_sec: float):
+        self.interval_sec = interval_sec
+    
+    def initial_delay(self) -> float:
+        """Пауза перед первым циклом."""
+        return 0.0
+    
+    def on_cycle_result(self, new_leads: int) -> None:
+        """Сообщает планировщику, сколько новых лидов найдено в цикле."""
+        pass
+    
+    def next_delay(self, cycle_duration: float) -> float:
+        """Возвращает паузу до следующего цикла."""
+        return self.interval_sec
+
+
+class AdaptivePollScheduler(PollScheduler):
+    """
+    Адаптивный планировщик (fixed-rate):
+    - сразу после нового лида опрашивает чаще (min_interval_sec в течение burst_window_sec);
+    - в тихие часы опрашивает реже (max_interval_sec);
+    - вычитает длительность цикла, чтобы период был постоянным, а не пауза;
+    - добавляет jitter, чтобы N аккаунтов не ходили в Thumbtack синхронно.
+    """
+    
+    def __init__(
+        self,
+        interval_sec: float,
+        min_interval_sec: float,
+        max_interval_sec: float,
+        burst_window_sec: float,
+        jitter_ratio: float = 0.1,
+        quiet_hours: Optional[Tuple[int, int]] = None,
+    ):
+        super().__init__(interval_sec)
+        self.min_interval_sec = min_interval_sec
+        self.max_interval_sec = max_interval_sec
+        self.burst_window_sec = burst_window_sec
+        self.jitter_ratio = jitter_ratio
+        self.quiet_hours = quiet_hours  # (start, end) - часы UTC, end не включается
+        self._last_lead_at: Optional[float] = None
+    
+    def initial_delay(self) -> float:
+        # Разносим старт мониторов по первому периоду
+        return random.uniform(0, self.interval_sec)
+    
+    def on_cycle_result(self, new_leads: int) -> None:
+        if new_leads > 0:
+            self._last_lead_at = time.monotonic()
+    
+    def _is_quiet_hour(self) -> bool:
+        if not self.quiet_hours:
+            return False
+        start, end = self.quiet_hours
+        hour = time.gmtime().tm_hour
+        if start <= end:
+            return start <= hour < end
+        # Интервал через полночь, например 22-6
+        return hour >= start or hour < end
+    
+    def current_interval(self) -> float:
+        """Текущий целевой период опроса."""
+        if self._last_lead_at is not None and time.monotonic() - self._last_lead_at < self.burst_window_sec:
+            return self.min_interval_sec
+        if self._is_quiet_hour():
+            return self.max_interval_sec
+        return self.interval_sec
+    
+    def next_delay(self, cycle_duration: float) -> float:
+        interval = self.current_interval()
+        jitter = random.uniform(-self.jitter_ratio, self.jitter_ratio) * interval
+        return max(0.0, interval - cycle_duration + jitter)
+
+
+def _parse_quiet_hours(value: str) -> Optional[Tuple[int, int]]:
+    """Разбирает строку вида "2-7" в (2, 7). Пустая строка - тихих часов нет."""
+    if not value:
+        return None
+    start, end = value.split("-", 1)
+    return int(start) % 24, int(end) % 24
+
+
+def create_poll_scheduler(config: MonitorConfig) -> PollScheduler:
+    """Создает планировщик по config.poll_scheduler ("fixed" или "adaptive")."""
+    if config.poll_scheduler == "adaptive":
+        return AdaptivePollScheduler(
+            interval_sec=config.poll_interval_sec,
+            min_interval_sec=config.poll_min_interval_sec,
+            max_interval_sec=config.poll_max_interval_sec,
+            burst_window_sec=config.poll_burst_window_sec,
+            jitter_ratio=config.poll_jitter_ratio,
+            quiet_hours=_parse_quiet_hours(config.poll_quiet_hours_utc),
+        )
+    if config.poll_scheduler != "fixed":
+        raise ValueError(f"Неизвестный планировщик опроса: {config.poll_scheduler}")
+    return PollScheduler(config.poll_interval_sec)
@@ -0,0 +1,123 @@
+"""
+Координатор перезапусков контекстов AccountMonitor.
+Разносит плановые перезапуски по интервалу (а не все мониторы на одних 3-часовых часах),
+ограничивает число одновременных перезапусков и может запросить внеплановый
+перезапуск при превышении порога памяти браузера.
+"""
+import asyncio
+import logging
+import time
+from contextlib import asynccontextmanager
+from typing import Callable, Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+# Дробная часть золотого сечения - фазы k*φ mod 1 равномерно заполняют интервал
+_GOLDEN_RATIO_FRACTION = 0.6180339887498949
+
+
+class RestartCoordinator:
+    """
+    Общий для всех мониторов процесса планировщик перезапусков.
+    
+    - Первый плановый перезапуск k-го монитора: interval * (1 + фаза_k), дальше каждые interval.
+    - Одновременно выполняется не больше max_concurrent перезапусков.
+    - Если memory_limit_mb > 0 и память браузера (USS) выше порога, перезапускается монитор
+      с самым "старым" контекстом (не чаще раза в memory_cooldown_sec).
+    """
+    
+    def __init__(
+        self,
+        interval_sec: float,
+        max_concurrent: int = 1,
+        memory_limit_mb: float = 0,
+        memory_check_interval_sec: float = 30.0,
+        memory_cooldown_sec: float = 120.0,
+        rss_probe: Optional[Callable[[], Optional[float]]] = None,
+    ):
+        self.interval_sec = interval_sec
+        self.memory_limit_mb = memory_limit_mb
+        self.memory_check_interval_sec = memory_check_interval_sec
+        self.memory_cooldown_sec = memory_cooldown_sec
+        self.rss_probe = rss_probe
+        self._semaphore = asyncio.Semaphore(max(1, max_concurrent))
+        self._registered = 0
+        self._due_at: Dict[str, float] = {}
+        self._restarted_at: Dict[str, float] = {}
+        self._memory_checked_at = 0.0
+        self._memory_restart_at = 0.0
+        self._memory_victim: Optional[str] = None
+        # Память браузера считается в потоке (скан /proc), решение - по последнему замеру
+        self._rss_mb: Optional[float] = None
+        self._rss_task: Optional[asyncio.Task] = None
+    
+    def register(self, account_id: str) -> None:
+        """Регистрирует монитор и назначает ему фазу планового перезапуска."""
+        now = time.monotonic()
+        phase = (self._registered * _GOLDEN_RATIO_FRACTION) % 1.0
+        self._registered += 1
+        self._due_at[account_id] = now + self.interval_sec * (1.0 + phase)
+        self._restarted_at[account_id] = now
+    
+    def unregister(self, account_id: str) -> None:
+        self._due_at.pop(account_id, None)
+        self._restarted_at.pop(account_id, None)
+        if self._memory_victim == account_id:
+            self._memory_victim = None
+    
+    def should_restart(self, account_id: str) -> bool:
+        """Пора ли перезапускать контекст монитора (по расписанию или из-за памяти)."""
+        due_at = self._due_at.get(account_id)
+        if due_at is not None and time.monotonic() >= due_at:
+            return True
+        return self._check_memory() == account_id
+    
+    @asynccontextmanager
+    async def slot(self, account_id: str):
+        """Ограничивает число одновременных перезапусков и фиксирует время перезапуска."""
+        async with self._semaphore:
+            try:
+                yield
+            finally:
+                now = time.monotonic()
+                # Монитор мог быть снят с учета (горячая перезагрузка аккаунтов) - не возвращаем запись
+                if account_id in self._due_at:
+                    self._restarted_at[account_id] = now
+                    self._due_at[account_id] = now + self.interval_sec
+                if self._memory_victim == account_id:
+                    self._memory_victim = None
+                    self._memory_restart_at = now
+    
+    def _check_memory(self) -> Optional[str]:
+        """Выбирает монитор для внепланового перезапуска, если браузер превысил порог памяти."""
+        if self.memory_limit_mb <= 0 or self.rss_probe is None:
+            return None
+        if self._memory_victim is not None:
+            return self._memory_victim
+        now = time.monotonic()
+        if now - self._memory_restart_at < self.memory_cooldown_sec:
+            return None
+        if now - self._memory_checked_at >= self.memory_check_interval_sec and self._rss_task is None:
+            self._memory_checked_at = now
+            self._rss_task = asyncio.get_running_loop().create_task(self._probe_rss())
+        
+        # Каждый замер используется один раз
+        rss_mb, self._rss_mb = self._rss_mb, None
+        if rss_mb is None or rss_mb <= self.memory_limit_mb or not self._restarted_at:
+            return None
+        
+        self._memory_victim = min(self._restarted_at, key=self._restarted_at.get)
+        logger.warning(
+            f"[RestartCoordinator] Память браузера (USS) {rss_mb:.0f}MB > {self.memory_limit_mb:.0f}MB, "
+            f"внеплановый перезапуск контекста {self._memory_victim}"
+        )
+        return self._memory_victim
+    
+    async def _probe_rss(self):
+        """Замер памяти браузера в отдельном потоке, чтобы скан /proc не блокировал event loop."""
+        try:
+            self._rss_mb = await asyncio.to_thread(self.rss_probe)
+        except Exception as e:
+            logger.debug(f"[RestartCoordinator] Ошибка замера памяти браузера: {e}")
+        finally:
+            self._rss_task = None
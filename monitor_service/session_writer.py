@@ -0,0 +1,88 @@
+"""
+Отложенная запись сессии (Playwright storage_state) одного аккаунта.
+Запись пропускается, если содержимое не изменилось, а серия сохранений подряд
+схлопывается в одну. Сама запись идет в общее хранилище сессий
+(playwright_bot.session_store: файлы, Redis или Postgres) вне event loop.
+"""
+import asyncio
+import hashlib
+import json
+import logging
+from typing import Any, Dict, Optional
+
+from playwright_bot.session_store import SessionStore
+
+logger = logging.getLogger(__name__)
+
+
+class SessionWriter:
+    """
+    Debounce-обертка над SessionStore для одного аккаунта.
+    load() возвращает последнее известное состояние, даже если оно еще не записано.
+    """
+    
+    def __init__(self, account_id: str, store: SessionStore, debounce_sec: float = 1.0):
+        self.account_id = account_id
+        self.store = store
+        self.debounce_sec = debounce_sec
+        self._latest: Optional[Dict[str, Any]] = None
+        self._latest_hash: Optional[bytes] = None
+        self._written_hash: Optional[bytes] = None
+        self._flush_task: Optional[asyncio.Task] = None
+        self._lock = asyncio.Lock()
+    
+    @staticmethod
+    def _hash(storage_state: Dict[str, Any]) -> bytes:
+        data = json.dumps(storage_state, sort_keys=True).encode("utf-8")
+        return hashlib.blake2b(data, digest_size=16).digest()
+    
+    async def load(self) -> Optional[Dict[str, Any]]:
+        """Возвращает текущий storage_state (из памяти или из хранилища) или None."""
+        if self._latest is not None:
+            return self._latest
+        entry = await self.store.get(self.account_id)
+        if entry is None:
+            return None
+        self._latest = entry.storage_state
+        self._latest_hash = self._written_hash = self._hash(entry.storage_state)
+        return self._latest
+    
+    async def save(self, storage_state: Dict[str, Any]) -> None:
+        """Запоминает состояние и планирует запись (если содержимое изменилось)."""
+        digest = self._hash(storage_state)
+        self._latest = storage_state
+        self._latest_hash = digest
+        if digest == self._written_hash:
+            return
+        if self._flush_task is None or self._flush_task.done():
+            self._flush_task = asyncio.ensure_future(self._delayed_flush())
+    
+    async def _delayed_flush(self):
+        # save() во время записи не планирует новую (задача еще не завершена) -
+        # повторяем, пока последнее состояние не будет записано
+        while True:
+            await asyncio.sleep(self.debounce_sec)
+            try:
+                await self.flush()
+            except Exception as e:
+                logger.warning(f"[SessionWriter {self.account_id}] Ошибка при записи сессии: {e}")
+                return
+            if self._latest_hash == self._written_hash:
+                return
+    
+    async def flush(self) -> None:
+        """Немедленно записывает последнее состояние, если оно еще не сохранено."""
+        async with self._lock:
+            if self._latest is None or self._latest_hash == self._written_hash:
+                return
+            state, digest = self._latest, self._latest_hash
+            version = await self.store.put(self.account_id, state)
+            self._written_hash = digest
+            logger.debug(f"[SessionWriter {self.account_id}] Сессия записана (версия {version})")
+    
+    async def close(self) -> None:
+        """Отменяет отложенную запись и сразу сохраняет состояние."""
+        if self._flush_task is not None and not self._flush_task.done():
+            self._flush_task.cancel()
+        self._flush_task = None
+        await self.flush()
@@ -0,0 +1,55 @@
+"""
+Шардирование аккаунтов между процессами monitor_service.
+Каждый шард (процесс со своим браузером) обслуживает детерминированное
+подмножество аккаунтов - консистентное хеширование по account_id.
+"""
+import bisect
+import hashlib
+from typing import Dict, Iterable, List, Sequence, TypeVar
+
+T = TypeVar("T")
+
+
+def _hash(value: str) -> int:
+    # Встроенный hash() рандомизирован между процессами - берем md5
+    return int.from_bytes(hashlib.md5(value.encode("utf-8")).digest()[:8], "big")
+
+
+class HashRing:
+    """
+    Кольцо консистентного хеширования с виртуальными узлами.
+    При изменении набора аккаунтов переезжают только затронутые аккаунты,
+    а не все подряд, как при account_id % N.
+    """
+    
+    def __init__(self, shard_count: int, vnodes: int = 100):
+        if shard_count < 1:
+            raise ValueError("shard_count должен быть >= 1")
+        self.shard_count = shard_count
+        points = []
+        for shard in range(shard_count):
+            for vnode in range(vnodes):
+                points.append((_hash(f"shard-{shard}-{vnode}"), shard))
+        points.sort()
+        self._keys = [point for point, _ in points]
+        self._shards = [shard for _, shard in points]
+    
+    def shard_for(self, account_id: str) -> int:
+        """Номер шарда для аккаунта."""
+        if self.shard_count == 1:
+            return 0
+        index = bisect.bisect(self._keys, _hash(account_id)) % len(self._keys)
+        return self._shards[index]
+    
+    def assign(self, account_ids: Iterable[str]) -> Dict[int, List[str]]:
+        """Распределение аккаунтов по шардам: {shard: [account_id, ...]}."""
+        assignment: Dict[int, List[str]] = {shard: [] for shard in range(self.shard_count)}
+        for account_id in sorted(account_ids):
+            assignment[self.shard_for(account_id)].append(account_id)
+        return assignment
+
+
+def filter_accounts_for_shard(accounts: Sequence[T], shard_index: int, shard_count: int) -> List[T]:
+    """Оставляет только аккаунты (объекты с account_id), принадлежащие шарду."""
+    ring = HashRing(shard_count)
+    return [account for account in accounts if ring.shard_for(account.account_id) == shard_index]
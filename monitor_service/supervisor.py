@@ -0,0 +1,161 @@
+"""
+Супервизор шардированного monitor_service.
+Запускает MONITOR_SHARD_COUNT процессов `python -m monitor_service.main`
+(каждый со своим браузером и своим подмножеством аккаунтов), перезапускает
+упавшие шарды. Новые аккаунты (например, после add_account.py) шарды
+подхватывают сами, без перезапуска процесса.
+
+Запуск:
+    MONITOR_SHARD_COUNT=4 python -m monitor_service.supervisor
+"""
+import asyncio
+import logging
+import os
+import signal
+import sys
+import time
+from typing import Dict, List, Optional
+
+from monitor_service.config import CONFIG
+from monitor_service.db_client import DBClient
+from monitor_service.sharding import HashRing
+from playwright_bot.log_config import setup_logging
+
+setup_logging("monitor_supervisor", CONFIG.log_level)
+logger = logging.getLogger(__name__)
+
+
+class ShardSupervisor:
+    """Управляет процессами-шардами monitor_service."""
+    
+    # Пауза перед перезапуском упавшего шарда (растет при частых падениях)
+    MIN_RESTART_DELAY_SEC = 1.0
+    MAX_RESTART_DELAY_SEC = 60.0
+    # Пауза сбрасывается, только если шард проработал без падений столько секунд
+    STABLE_UPTIME_SEC = 120.0
+    
+    def __init__(self, shard_count: int):
+        self.shard_count = shard_count
+        self.ring = HashRing(shard_count)
+        self.db_client = DBClient(CONFIG.db_url)
+        self.processes: Dict[int, asyncio.subprocess.Process] = {}
+        self.assignment: Dict[int, List[str]] = {}
+        self._restart_delay: Dict[int, float] = {}
+        self._started_at: Dict[int, float] = {}
+        self._restart_tasks: Dict[int, asyncio.Task] = {}
+        self.stop_event = asyncio.Event()
+    
+    async def _spawn(self, shard: int):
+        env = dict(os.environ)
+        env["MONITOR_SHARD_COUNT"] = str(self.shard_count)
+        env["MONITOR_SHARD_INDEX"] = str(shard)
+        process = await asyncio.create_subprocess_exec(
+            sys.executable, "-m", "monitor_service.main",
+            env=env
+        )
+        self.processes[shard] = process
+        self._started_at[shard] = time.monotonic()
+        logger.info(f"[Supervisor] Шард {shard} запущен (PID: {process.pid}, аккаунтов: {len(self.assignment.get(shard, []))})")
+    
+    async def _terminate(self, shard: int, timeout: float = 30.0):
+        process = self.processes.pop(shard, None)
+        if not process or process.returncode is not None:
+            return
+        process.send_signal(signal.SIGTERM)
+        try:
+            await asyncio.wait_for(process.wait(), timeout=timeout)
+        except asyncio.TimeoutError:
+            logger.warning(f"[Supervisor] Шард {shard} не остановился за {timeout} сек, kill")
+            process.kill()
+            await process.wait()
+    
+    async def _load_assignment(self) -> Optional[Dict[int, List[str]]]:
+        try:
+            accounts = await self.db_client.get_active_accounts()
+        except Exception as e:
+            logger.warning(f"[Supervisor] Не удалось получить аккаунты из БД: {e}")
+            return None
+        return self.ring.assign(account.account_id for account in accounts)
+    
+    async def _rebalance(self):
+        """
+        Отслеживает изменения распределения аккаунтов по шардам.
+        Перезапуск шардов не нужен: каждый шард сам сверяет свой набор
+        аккаунтов с БД (MonitorService._reconcile) и запускает/останавливает
+        отдельные мониторы.
+        """
+        assignment = await self._load_assignment()
+        if assignment is None or assignment == self.assignment:
+            return
+        changed = [shard for shard in range(self.shard_count) if assignment[shard] != self.assignment.get(shard)]
+        self.assignment = assignment
+        logger.info(f"[Supervisor] Набор аккаунтов изменился в шардах {changed}, шарды подхватят его сами")
+    
+    async def _restart_later(self, shard: int, delay: float):
+        """Перезапускает шард после своей паузы, не задерживая остальные шарды."""
+        try:
+            await asyncio.sleep(delay)
+            if not self.stop_event.is_set():
+                await self._spawn(shard)
+        finally:
+            self._restart_tasks.pop(shard, None)
+    
+    async def _check_processes(self):
+        """Планирует перезапуск упавших шардов с экспоненциальной паузой."""
+        now = time.monotonic()
+        for shard, process in list(self.processes.items()):
+            if shard in self._restart_tasks:
+                continue
+            if process.returncode is None:
+                if now - self._started_at.get(shard, now) >= self.STABLE_UPTIME_SEC:
+                    self._restart_delay[shard] = self.MIN_RESTART_DELAY_SEC
+                continue
+            delay = self._restart_delay.get(shard, self.MIN_RESTART_DELAY_SEC)
+            logger.warning(f"[Supervisor] Шард {shard} завершился (код {process.returncode}), перезапуск через {delay:.0f} сек")
+            self._restart_delay[shard] = min(delay * 2, self.MAX_RESTART_DELAY_SEC)
+            self._restart_tasks[shard] = asyncio.create_task(self._restart_later(shard, delay))
+    
+    async def start(self):
+        logger.info("=" * 60)
+        logger.info(f"🔍 СУПЕРВИЗОР МОНИТОРИНГА - {self.shard_count} шардов")
+        logger.info("=" * 60)
+        
+        self.assignment = await self._load_assignment() or {}
+        for shard in range(self.shard_count):
+            await self._spawn(shard)
+        
+        try:
+            while not self.stop_event.is_set():
+                try:
+                    await asyncio.wait_for(self.stop_event.wait(), timeout=CONFIG.supervisor_check_interval_sec)
+                except asyncio.TimeoutError:
+                    pass
+                if self.stop_event.is_set():
+                    break
+                await self._check_processes()
+                await self._rebalance()
+        finally:
+            await self.stop()
+    
+    async def stop(self):
+        self.stop_event.set()
+        logger.info("[Supervisor] Остановка всех шардов...")
+        restart_tasks = list(self._restart_tasks.values())
+        for task in restart_tasks:
+            task.cancel()
+        await asyncio.gather(*restart_tasks, return_exceptions=True)
+        await asyncio.gather(*(self._terminate(shard) for shard in list(self.processes)), return_exceptions=True)
+        await self.db_client.close()
+        logger.info("[Supervisor] Все шарды остановлены")
+
+
+async def main():
+    supervisor = ShardSupervisor(CONFIG.shard_count)
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(sig, supervisor.stop_event.set)
+    await supervisor.start()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
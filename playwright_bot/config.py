@@ -22,6 +22,9 @@ class Settings:
     # В новой архитектуре передается через lead_data из monitor_service
     message_template: str = os.getenv("TT_TEMPLATE_MESSAGE", "Hi! We can help. When is a good time to talk?")
     
+    # GraphQL-операция отправки сообщения (regex по operationName): ее ответ подтверждает отправку
+    send_message_operation_re: str = os.getenv("TT_SEND_MESSAGE_OPERATION_RE", r"^(send|create|post|reply)\w*message")
+    
     # Credentials (используются в browser_service, если потребуется логин)
     # В monitor_service credentials передаются из БД, но в browser_service используются из env
     # Должны быть установлены в .env файле
@@ -0,0 +1,155 @@
+# log_config.py
+"""
+Общая настройка логирования для monitor_service, browser_service и workers.
+
+- Логгеры пишут в очередь (QueueHandler), вывод в stdout делает отдельный поток
+  (QueueListener) - event loop / greenlet не ждет записи в поток вывода.
+- Повторяющиеся сообщения помечаются extra={"sample_key": ...}: из серии с одним
+  ключом в окне LOG_SAMPLE_WINDOW_SEC выводится первое, остальные считаются и
+  сводкой прикладываются к следующему выведенному.
+- Уровни по подсистемам: LOG_LEVELS="playwright_bot=INFO,monitor_service.account_monitor=WARNING".
+- LOG_FORMAT=json - одна JSON-строка на запись (поля из extra попадают в JSON).
+
+Модуль без внешних зависимостей: workers копируют его в свой образ отдельно.
+"""
+import atexit
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import sys
+import threading
+import time
+from typing import Dict, Optional, Tuple
+
+TEXT_FORMAT = "%(asctime)s - %(name)s - %(levelname)s - %(message)s"
+
+# Атрибуты LogRecord, которые не считаются пользовательскими полями (extra)
+_RESERVED_ATTRS = set(vars(logging.LogRecord("", 0, "", 0, "", (), None))) | {"message", "asctime", "sample_key"}
+
+_listener: Optional[logging.handlers.QueueListener] = None
+
+
+class SamplingFilter(logging.Filter):
+    """
+    Пропускает одну запись на sample_key за окно window_sec.
+    Записи без sample_key и записи уровня WARNING и выше проходят всегда.
+    """
+
+    def __init__(self, window_sec: float = 60.0):
+        super().__init__()
+        self.window_sec = window_sec
+        self._lock = threading.Lock()
+        # (logger, sample_key) -> (время последней выведенной записи, пропущено с тех пор)
+        self._seen: Dict[Tuple[str, str], Tuple[float, int]] = {}
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        sample_key = getattr(record, "sample_key", None)
+        if sample_key is None or record.levelno >= logging.WARNING or self.window_sec <= 0:
+            return True
+
+        key = (record.name, sample_key)
+        now = time.monotonic()
+        with self._lock:
+            last, suppressed = self._seen.get(key, (0.0, 0))
+            if now - last < self.window_sec:
+                self._seen[key] = (last, suppressed + 1)
+                return False
+            self._seen[key] = (now, 0)
+        if suppressed:
+            record.suppressed = suppressed
+            record.msg = f"{record.msg} (+{suppressed} похожих за {self.window_sec:g}сек не выведено)"
+        return True
+
+
+class JsonFormatter(logging.Formatter):
+    """Одна JSON-строка на запись; extra-поля записи попадают в JSON как есть."""
+
+    def __init__(self, service: str):
+        super().__init__()
+        self.service = service
+
+    def format(self, record: logging.LogRecord) -> str:
+        data = {
+            "ts": self.formatTime(record, "%Y-%m-%dT%H:%M:%S") + f".{int(record.msecs):03d}",
+            "level": record.levelname,
+            "service": self.service,
+            "logger": record.name,
+            "msg": record.getMessage(),
+        }
+        for name, value in vars(record).items():
+            if name not in _RESERVED_ATTRS and name not in data:
+                data[name] = value if isinstance(value, (str, int, float, bool, type(None))) else str(value)
+        if record.exc_info:
+            data["exc"] = self.formatException(record.exc_info)
+        return json.dumps(data, ensure_ascii=False)
+
+
+def parse_levels(spec: str) -> Dict[str, int]:
+    """'a=INFO,b.c=WARNING' -> {'a': 20, 'b.c': 30} (неизвестные уровни пропускаются)."""
+    levels = {}
+    for item in (spec or "").split(","):
+        name, sep, level = item.partition("=")
+        level_no = logging.getLevelName(level.strip().upper()) if sep else None
+        if name.strip() and isinstance(level_no, int):
+            levels[name.strip()] = level_no
+    return levels
+
+
+def setup_logging(
+    service: str,
+    level: Optional[str] = None,
+    levels: Optional[Dict[str, str]] = None,
+) -> logging.handlers.QueueListener:
+    """
+    Настраивает корневой логгер процесса (повторный вызов перенастраивает).
+
+    Args:
+        service: имя сервиса (поле service в JSON)
+        level: уровень корневого логгера (по умолчанию LOG_LEVEL или INFO)
+        levels: уровни подсистем по умолчанию; LOG_LEVELS из окружения их дополняет
+    """
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+
+    level = (level or os.getenv("LOG_LEVEL", "INFO")).upper()
+    if os.getenv("LOG_FORMAT", "text").lower() == "json":
+        formatter: logging.Formatter = JsonFormatter(service)
+    else:
+        formatter = logging.Formatter(TEXT_FORMAT)
+
+    output = logging.StreamHandler(sys.stdout)
+    output.setFormatter(formatter)
+
+    # queue.Queue, а не SimpleQueue: на threading-примитивах, которые gevent патчит в workers
+    log_queue: "queue.Queue" = queue.Queue()
+    queue_handler = logging.handlers.QueueHandler(log_queue)
+    queue_handler.addFilter(SamplingFilter(float(os.getenv("LOG_SAMPLE_WINDOW_SEC", "60"))))
+
+    root = logging.getLogger()
+    for handler in list(root.handlers):
+        root.removeHandler(handler)
+    root.addHandler(queue_handler)
+    root.setLevel(getattr(logging, level, logging.INFO))
+
+    subsystem_levels = {name: logging.getLevelName(lvl.upper()) for name, lvl in (levels or {}).items()}
+    subsystem_levels.update(parse_levels(os.getenv("LOG_LEVELS", "")))
+    for name, level_no in subsystem_levels.items():
+        logging.getLogger(name).setLevel(level_no)
+
+    _listener = logging.handlers.QueueListener(log_queue, output, respect_handler_level=True)
+    _listener.start()
+    return _listener
+
+
+def stop_logging():
+    """Дописывает оставшиеся в очереди записи и останавливает поток вывода."""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
+
+
+atexit.register(stop_logging)
@@ -0,0 +1,255 @@
+"""
+Общее хранилище сессий (Playwright storage_state) для monitor_service и browser_service.
+
+Бэкенды: файлы (общая папка), Redis, Postgres. Записи версионируются,
+распарсенные cookies кэшируются в памяти процесса: повторное чтение стоит
+только проверки версии (stat файла / короткий запрос), а не разбора JSON.
+
+Выбор бэкенда через переменные окружения:
+    SESSION_STORE_BACKEND=file|redis|postgres
+    SESSION_STORE_URL=redis://... | postgresql://...
+"""
+import abc
+import asyncio
+import json
+import logging
+import os
+import tempfile
+import time
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional
+
+logger = logging.getLogger("playwright_bot")
+
+
+@dataclass(frozen=True)
+class SessionEntry:
+    """Версионированная запись сессии аккаунта."""
+    version: int
+    storage_state: Dict[str, Any]
+    
+    @property
+    def cookies(self) -> List[Dict[str, Any]]:
+        return self.storage_state.get("cookies", [])
+
+
+class SessionStore(abc.ABC):
+    """
+    Базовый класс хранилища сессий с кэшем в памяти.
+    Наследники реализуют _read, _read_version и _write.
+    """
+    
+    def __init__(self, cache_ttl_sec: float = 2.0):
+        # В течение cache_ttl_sec запись из кэша отдается без проверки версии
+        self.cache_ttl_sec = cache_ttl_sec
+        self._cache: Dict[str, SessionEntry] = {}
+        self._checked_at: Dict[str, float] = {}
+    
+    async def get(self, account_id: str) -> Optional[SessionEntry]:
+        """Возвращает актуальную сессию аккаунта (из кэша, если версия не изменилась)."""
+        cached = self._cache.get(account_id)
+        now = time.monotonic()
+        if cached is not None:
+            if now - self._checked_at.get(account_id, 0.0) < self.cache_ttl_sec:
+                return cached
+            version = await self._read_version(account_id)
+            self._checked_at[account_id] = now
+            if version == cached.version:
+                return cached
+        
+        entry = await self._read(account_id)
+        self._checked_at[account_id] = now
+        if entry is None:
+            self._cache.pop(account_id, None)
+            return None
+        self._cache[account_id] = entry
+        return entry
+    
+    async def get_cookies(self, account_id: str) -> List[Dict[str, Any]]:
+        """Cookies аккаунта (пустой список, если сессии нет)."""
+        entry = await self.get(account_id)
+        return entry.cookies if entry else []
+    
+    async def put(self, account_id: str, storage_state: Dict[str, Any]) -> int:
+        """Сохраняет сессию и возвращает ее новую версию."""
+        version = await self._write(account_id, storage_state)
+        self._cache[account_id] = SessionEntry(version=version, storage_state=storage_state)
+        self._checked_at[account_id] = time.monotonic()
+        return version
+    
+    async def close(self) -> None:
+        pass
+    
+    @abc.abstractmethod
+    async def _read(self, account_id: str) -> Optional[SessionEntry]:
+        """Читает запись целиком (None, если сессии нет)."""
+    
+    @abc.abstractmethod
+    async def _read_version(self, account_id: str) -> Optional[int]:
+        """Читает только версию записи (None, если сессии нет)."""
+    
+    @abc.abstractmethod
+    async def _write(self, account_id: str, storage_state: Dict[str, Any]) -> int:
+        """Записывает сессию и возвращает ее новую версию."""
+
+
+def _atomic_write(path: str, data: bytes) -> None:
+    """Пишет файл через временный файл в той же папке и os.replace (без частично записанных файлов)."""
+    directory = os.path.dirname(path) or "."
+    fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=".session_", suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+    except BaseException:
+        try:
+            os.unlink(tmp_path)
+        except OSError:
+            pass
+        raise
+
+
+class FileSessionStore(SessionStore):
+    """Файлы session_<account_id>.json в общей папке; версия - mtime файла (ns)."""
+    
+    def __init__(self, sessions_dir: str, cache_ttl_sec: float = 2.0):
+        super().__init__(cache_ttl_sec)
+        self.sessions_dir = sessions_dir
+        os.makedirs(sessions_dir, exist_ok=True)
+    
+    def path_for(self, account_id: str) -> str:
+        return os.path.join(self.sessions_dir, f"session_{account_id}.json")
+    
+    def _stat_version(self, path: str) -> Optional[int]:
+        try:
+            return os.stat(path).st_mtime_ns
+        except FileNotFoundError:
+            return None
+    
+    def _read_sync(self, path: str) -> Optional[SessionEntry]:
+        version = self._stat_version(path)
+        if version is None:
+            return None
+        with open(path, "rb") as f:
+            storage_state = json.loads(f.read())
+        return SessionEntry(version=version, storage_state=storage_state)
+    
+    def _write_sync(self, path: str, storage_state: Dict[str, Any]) -> int:
+        _atomic_write(path, json.dumps(storage_state).encode("utf-8"))
+        return self._stat_version(path)
+    
+    async def _read(self, account_id: str) -> Optional[SessionEntry]:
+        return await asyncio.to_thread(self._read_sync, self.path_for(account_id))
+    
+    async def _read_version(self, account_id: str) -> Optional[int]:
+        # stat на общей (сетевой) папке может блокировать, поэтому тоже в потоке
+        return await asyncio.to_thread(self._stat_version, self.path_for(account_id))
+    
+    async def _write(self, account_id: str, storage_state: Dict[str, Any]) -> int:
+        return await asyncio.to_thread(self._write_sync, self.path_for(account_id), storage_state)
+
+
+class RedisSessionStore(SessionStore):
+    """Redis: hash session:<account_id> с полями version и state."""
+    
+    def __init__(self, url: str, key_prefix: str = "session:", cache_ttl_sec: float = 2.0):
+        super().__init__(cache_ttl_sec)
+        import redis.asyncio as redis_asyncio
+        self.redis = redis_asyncio.from_url(url)
+        self.key_prefix = key_prefix
+    
+    def _key(self, account_id: str) -> str:
+        return f"{self.key_prefix}{account_id}"
+    
+    async def _read(self, account_id: str) -> Optional[SessionEntry]:
+        version, state = await self.redis.hmget(self._key(account_id), "version", "state")
+        if version is None or state is None:
+            return None
+        return SessionEntry(version=int(version), storage_state=json.loads(state))
+    
+    async def _read_version(self, account_id: str) -> Optional[int]:
+        version = await self.redis.hget(self._key(account_id), "version")
+        return int(version) if version is not None else None
+    
+    async def _write(self, account_id: str, storage_state: Dict[str, Any]) -> int:
+        key = self._key(account_id)
+        async with self.redis.pipeline(transaction=True) as pipe:
+            pipe.hincrby(key, "version", 1)
+            pipe.hset(key, "state", json.dumps(storage_state))
+            version, _ = await pipe.execute()
+        return int(version)
+    
+    async def close(self) -> None:
+        await self.redis.aclose()
+
+
+class PostgresSessionStore(SessionStore):
+    """Postgres: таблица account_sessions (миграция в monitor_service/alembic)."""
+    
+    def __init__(self, dsn: str, cache_ttl_sec: float = 2.0):
+        super().__init__(cache_ttl_sec)
+        # asyncpg не понимает SQLAlchemy-префикс драйвера
+        self.dsn = dsn.replace("postgresql+asyncpg://", "postgresql://")
+        self._pool = None
+        self._pool_lock = asyncio.Lock()
+    
+    async def _get_pool(self):
+        if self._pool is None:
+            async with self._pool_lock:
+                if self._pool is None:
+                    import asyncpg
+                    self._pool = await asyncpg.create_pool(self.dsn, min_size=1, max_size=5)
+        return self._pool
+    
+    async def _read(self, account_id: str) -> Optional[SessionEntry]:
+        pool = await self._get_pool()
+        row = await pool.fetchrow(
+            "SELECT version, storage_state::text AS state FROM account_sessions WHERE account_id = $1",
+            account_id
+        )
+        if row is None:
+            return None
+        return SessionEntry(version=row["version"], storage_state=json.loads(row["state"]))
+    
+    async def _read_version(self, account_id: str) -> Optional[int]:
+        pool = await self._get_pool()
+        return await pool.fetchval("SELECT version FROM account_sessions WHERE account_id = $1", account_id)
+    
+    async def _write(self, account_id: str, storage_state: Dict[str, Any]) -> int:
+        pool = await self._get_pool()
+        return await pool.fetchval(
+            """
+            INSERT INTO account_sessions (account_id, version, storage_state, updated_at)
+            VALUES ($1, 1, $2::jsonb, now())
+            ON CONFLICT (account_id) DO UPDATE
+            SET version = account_sessions.version + 1,
+                storage_state = EXCLUDED.storage_state,
+                updated_at = now()
+            RETURNING version
+            """,
+            account_id,
+            json.dumps(storage_state)
+        )
+    
+    async def close(self) -> None:
+        if self._pool is not None:
+            await self._pool.close()
+            self._pool = None
+
+
+def create_session_store(sessions_dir: str, backend: Optional[str] = None, url: Optional[str] = None) -> SessionStore:
+    """
+    Создает хранилище сессий по SESSION_STORE_BACKEND / SESSION_STORE_URL.
+    sessions_dir используется файловым бэкендом (по умолчанию).
+    """
+    backend = (backend or os.getenv("SESSION_STORE_BACKEND", "file")).lower()
+    url = url or os.getenv("SESSION_STORE_URL", "")
+    if backend == "file":
+        return FileSessionStore(sessions_dir)
+    if backend == "redis":
+        return RedisSessionStore(url or "redis://localhost:6379/0")
+    if backend == "postgres":
+        return PostgresSessionStore(url or os.getenv("DATABASE_URL", ""))
+    raise ValueError(f"Неизвестный бэкенд хранилища сессий: {backend}")
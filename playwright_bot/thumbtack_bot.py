@@ -1,5 +1,6 @@
 import asyncio
 import hashlib
+import json
 import logging
 import re
 
@@ -16,6 +17,13 @@ PHONE_TEXT_RE = re.compile(r"(click|show).*(phone|number)", re.I)
 RE_REPLY = re.compile(r"^\s*reply\s*$", re.I)
 RE_SEND = re.compile(r"^\s*send\s*$", re.I)
 MSG_PLACEHOLDER = "Answer any questions and let them know next steps."
+# GraphQL-мутация отправки сообщения (по operationName), ответ на которую подтверждает отправку
+SEND_MESSAGE_OPERATION_RE = re.compile(SETTINGS.send_message_operation_re, re.I)
+# Ожидание условий вместо фиксированных пауз (мс); UI_SETTLE_WAIT_MS - не дольше прежних пауз
+PHONE_WAIT_MS = 3000
+UI_SETTLE_WAIT_MS = 300
+# Подтверждение отправки сообщения (ответ мутации или очистка поля ввода)
+SEND_CONFIRM_WAIT_MS = 5000
 
 
 
@@ -227,17 +235,34 @@ class ThumbTackBot:
         return results
 
 
-    async def open_lead_details(self, lead: dict):
+    def _on_lead_page(self) -> bool:
+        """Открыта страница лида (не логин и не редирект в другой раздел)."""
+        url = self.page.url.lower()
+        return "login" not in url and "/pro-leads/" in url
+
+    async def open_lead_details(self, lead: dict, *, detect_login: bool = False):
         """
         Открывает страницу деталей лида.
         1) Если есть href — идём напрямую (предпочтительно).
         2) Иначе кликаем по кнопке "View details" в карточке по индексу.
+        detect_login=True - быстрый путь без open_leads: сессия проверяется на самой странице
+        лида; если она не открылась (логин или редирект), выполняется полный путь -
+        open_leads (с той же проверкой и входом) и повторное открытие страницы лида.
         """
         href = (lead or {}).get("href")
         if href:
             url = href if href.startswith("http") else f"{SETTINGS.base_url}{href}"
             await self.page.goto(url, wait_until="domcontentloaded", timeout=10000)
+            if detect_login and not self._on_lead_page():
+                logger.warning(f"ThumbTackBot: lead page did not open on the fast path ({self.page.url}), falling back to /pro-leads...")
+                await self.open_leads()
+                await self.page.goto(url, wait_until="domcontentloaded", timeout=10000)
+                if not self._on_lead_page():
+                    raise RuntimeError(f"ThumbTackBot: lead page did not open after /pro-leads: {self.page.url}")
         else:
+            if detect_login:
+                # Карточка по индексу есть только в списке - без href список открывается как обычно
+                await self.open_leads()
             btn = self.page.get_by_role("button", name=re.compile(r"view\s*details", re.I)).nth(lead["index"])
             await btn.scroll_into_view_if_needed()
             await btn.wait_for(state="visible", timeout=5000)
@@ -283,6 +308,53 @@ class ThumbTackBot:
             return None
 
 
+    async def _wait_for_reply_ui(self, timeout: int = UI_SETTLE_WAIT_MS) -> bool:
+        """Ждет появления поля ввода сообщения или кнопки Reply (вместо фиксированной паузы)."""
+        try:
+            await self.page.locator("textarea[placeholder]").or_(
+                self.page.get_by_role("button", name=RE_REPLY)
+            ).first.wait_for(state="visible", timeout=timeout)
+            return True
+        except PWTimeoutError:
+            return False
+
+    @staticmethod
+    def _is_send_response(response) -> bool:
+        """Ответ на мутацию отправки сообщения (аналитика и запросы чтения не подходят)."""
+        request = response.request
+        if request.method != "POST":
+            return False
+        try:
+            body = json.loads(request.post_data or "")
+        except Exception:
+            return False
+        # Батч операций приходит списком
+        for operation in body if isinstance(body, list) else [body]:
+            if not isinstance(operation, dict):
+                continue
+            if not SEND_MESSAGE_OPERATION_RE.search(operation.get("operationName") or ""):
+                continue
+            # Persisted query приходит без текста запроса - достаточно operationName
+            if (operation.get("query") or "mutation").lstrip().startswith("mutation"):
+                return True
+        return False
+
+    @staticmethod
+    async def _check_send_response(response) -> None:
+        """Проверяет ответ мутации отправки: HTTP-ошибка или errors в GraphQL-ответе - сообщение не отправлено."""
+        if not response.ok:
+            raise RuntimeError(f"ThumbTackBot: send message failed, HTTP {response.status} from {response.url}")
+        try:
+            payload = await response.json()
+        except Exception:
+            payload = None
+        results = payload if isinstance(payload, list) else [payload]
+        errors = [error for result in results if isinstance(result, dict) for error in (result.get("errors") or [])]
+        if errors:
+            raise RuntimeError(f"ThumbTackBot: send message failed, GraphQL errors: {errors}")
+        logger.info(f"ThumbTackBot: message sent, response {response.status} from {response.url}")
+
+
     async def send_template_message(self, text: Optional[str] = None, *, dry_run: bool = False) -> None:
         text = text or SETTINGS.message_template
         logger.info(f"ThumbTackBot: send_template_message started, dry_run={dry_run}")
@@ -314,17 +386,15 @@ class ThumbTackBot:
             except Exception as e:
                 if attempt < max_retries - 1:
                     logger.warning(f"ThumbTackBot: React load attempt {attempt + 1} failed: {e}, retrying...")
-                    # Делаем refresh и ждем
+                    # Делаем refresh; следующая попытка сама ждет наполнения #app-page-root
                     await self.page.reload(wait_until="domcontentloaded", timeout=8000)  # Уменьшили с 15000 до 8000
-                    await self.page.wait_for_timeout(500)  # Уменьшили с 1000 до 500
                 else:
                     logger.error(f"ThumbTackBot: React failed to load after {max_retries} attempts: {e}")
                     # Сохраняем диагностику
                     await self._run_diagnostics("react_load_failure_lead_page")
         
-        # Дополнительное ожидание для стабильности (оптимизировано)
-        await self.page.wait_for_timeout(300)  # Уменьшили с 500ms до 300ms
-        logger.info("ThumbTackBot: additional 0.3s wait completed")
+        # Вместо фиксированной паузы ждем, пока отрисуется поле ввода или кнопка Reply
+        await self._wait_for_reply_ui()
         
         # Проверяем и закрываем модальные окна
         try:
@@ -336,7 +406,8 @@ class ThumbTackBot:
                         close_btn = self.page.locator("[data-test*='modal'], [role='dialog'] button, .modal button").nth(i)
                         if await close_btn.is_visible():
                             await close_btn.click()
-                            await self.page.wait_for_timeout(300)  # Уменьшили с 500 до 300
+                            # Ждем, пока кнопка (вместе с окном) исчезнет
+                            await close_btn.wait_for(state="hidden", timeout=UI_SETTLE_WAIT_MS)
                     except Exception:
                         pass
         except Exception:
@@ -360,7 +431,7 @@ class ThumbTackBot:
                     arrow_found = True
                     await arrow.first.scroll_into_view_if_needed()
                     await arrow.first.click()
-                    await self.page.wait_for_timeout(300)  # Уменьшили с 500 до 300
+                    await self._wait_for_reply_ui()
                     break
             
             if not arrow_found:
@@ -483,15 +554,52 @@ class ThumbTackBot:
         try:
             await send_btn.first.wait_for(state="visible", timeout=3_000)  # Уменьшили с 5000 до 3000
             await send_btn.first.scroll_into_view_if_needed()
-            await send_btn.first.click()
-            try:
-                await self.page.wait_for_load_state("networkidle", timeout=2_000)  # Уменьшили с 3000 до 2000
-            except Exception:
-                pass
+            box_handle = await box.first.element_handle()
         except Exception:
             pass
             # не смогли нажать — мягко выходим
             return
+        
+        await self._confirm_send(ctx, box_handle, send_btn.first)
+    
+    async def _confirm_send(self, ctx, box_handle, send_btn) -> None:
+        """
+        Нажимает Send и ждет подтверждения: ответ на мутацию отправки (ошибки в нем - провал) или,
+        если мутация не распознана по operationName, очистка/исчезновение поля ввода.
+        Возвращается по первому подтверждению; нет ни того, ни другого - сообщение не отправлено.
+        """
+        response_wait = asyncio.ensure_future(self.page.wait_for_event(
+            "response", predicate=self._is_send_response, timeout=SEND_CONFIRM_WAIT_MS
+        ))
+        try:
+            await send_btn.click()
+        except Exception:
+            await self._cancel_waits(response_wait)
+            # не смогли нажать — мягко выходим
+            return
+        cleared_wait = asyncio.ensure_future(ctx.wait_for_function(
+            "el => !el.isConnected || el.value === ''", arg=box_handle, timeout=SEND_CONFIRM_WAIT_MS
+        ))
+        
+        try:
+            pending = {response_wait, cleared_wait}
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                if response_wait in done and response_wait.exception() is None:
+                    await self._check_send_response(response_wait.result())
+                    return
+                if cleared_wait in done and cleared_wait.exception() is None:
+                    logger.info("ThumbTackBot: message sent (input cleared; send mutation response not recognized)")
+                    return
+            raise RuntimeError(f"ThumbTackBot: message send not confirmed within {SEND_CONFIRM_WAIT_MS} ms")
+        finally:
+            await self._cancel_waits(response_wait, cleared_wait)
+    
+    @staticmethod
+    async def _cancel_waits(*waits: asyncio.Future):
+        for wait in waits:
+            wait.cancel()
+        await asyncio.gather(*waits, return_exceptions=True)
 
 
     async def open_messages(self):
@@ -536,16 +644,6 @@ class ThumbTackBot:
             pass  # Молча игнорируем ошибки диагностики
 
 
-    async def _scroll_messages_list(self, steps: int = 3):
-        panel = self.page.locator("main")
-        for _ in range(steps):
-            try:
-                await panel.evaluate("el => el.scrollTo(0, el.scrollHeight)")
-                await self.page.wait_for_timeout(300)
-            except Exception:
-                break
-
-
     async def get_first_thread_url_from_html(self) -> Optional[str]:
         """Извлекает URL первого треда напрямую из HTML"""
         html = await self.page.content()
@@ -564,8 +662,13 @@ class ThumbTackBot:
         """
         import re
         
-        # Небольшая пауза для загрузки
-        await self.page.wait_for_timeout(600)
+        # Ждем, пока правая панель отрисует ссылку tel: или кнопку показа телефона
+        try:
+            await self.page.locator(
+                f"{PHONE_LINK}, {SHOW_PHONE_BUTTON_CLASS}, {SHOW_PHONE_BUTTON}"
+            ).first.wait_for(state="attached", timeout=PHONE_WAIT_MS)
+        except PWTimeoutError:
+            logger.info("DEBUG: Neither phone link nor 'show phone' button appeared")
         
         # Берем весь HTML и ищем телефон регуляркой
         html = await self.page.content()
@@ -591,7 +694,11 @@ class ThumbTackBot:
             
             if count > 0:
                 await show_phone_btn.first.click()
-                await self.page.wait_for_timeout(600)  # Ждем появления телефона
+                # Ждем появления ссылки tel: после клика
+                try:
+                    await self.page.locator(PHONE_LINK).first.wait_for(state="attached", timeout=PHONE_WAIT_MS)
+                except PWTimeoutError:
+                    pass
                 
                 # Ищем телефон еще раз после клика
                 html = await self.page.content()
@@ -624,9 +731,6 @@ class ThumbTackBot:
         await self.page.goto(f"https://www.thumbtack.com{first_thread_url}", wait_until="domcontentloaded", timeout=8000)
         logger.info(f"DEBUG: Successfully loaded thread page, final URL: {self.page.url}")
         
-        # Небольшая пауза для загрузки правой панели
-        await self.page.wait_for_timeout(500)
-        
-        # Извлекаем и возвращаем телефон
+        # Извлекаем и возвращаем телефон (загрузку правой панели ждет сам метод)
         phone = await self._show_and_extract_in_current_thread()
         return phone
\ No newline at end of file
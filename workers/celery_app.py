@@ -6,10 +6,30 @@
 import gevent.monkey
 gevent.monkey.patch_all(ssl=False)  # Не патчим SSL, чтобы избежать конфликта с requests/urllib3
 
+import logging
+import os
+import sys
+
 from celery import Celery
 from celery.schedules import crontab
+from celery.signals import setup_logging as celery_setup_logging
 from config import CONFIG
 
+# Общий модуль логирования лежит в playwright_bot/ (корень проекта, в образе - /app)
+_PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if _PROJECT_ROOT not in sys.path:
+    sys.path.append(_PROJECT_ROOT)
+from playwright_bot.log_config import setup_logging
+
+
+@celery_setup_logging.connect
+def _setup_worker_logging(loglevel=None, **kwargs):
+    """Вместо логирования Celery - общая настройка (очередь + выборка повторов), уровень из --loglevel."""
+    if isinstance(loglevel, int):
+        loglevel = logging.getLevelName(loglevel)
+    setup_logging("workers", loglevel or None)
+
+
 # Создаем Celery приложение
 celery_app = Celery(
     "workers",
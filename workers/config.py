@@ -20,6 +20,20 @@ class WorkerConfig:
     factory_ws_url: str = os.getenv("FACTORY_WS_URL", "ws://localhost:8080/api/ws")
     # Алиас для совместимости с factory_client.py
     FACTORY_API_URL: str = os.getenv("FACTORY_WS_URL", "ws://localhost:8080/api/ws")
+    # Соединение с Заводом: pool - пул соединений с одной сессией на соединение,
+    # mux - одно мультиплексированное на процесс (все лиды одновременно; включается явно)
+    factory_connection_mode: str = os.getenv("FACTORY_CONNECTION_MODE", "pool")
+    factory_response_timeout_sec: float = float(os.getenv("FACTORY_RESPONSE_TIMEOUT_SEC", "60"))  # на каждый ответ (mux)
+    # Пул соединений с Заводом на процесс воркера (соединение переиспользуется между лидами)
+    factory_pool_size: int = int(os.getenv("FACTORY_POOL_SIZE", os.getenv("CELERY_WORKER_CONCURRENCY", "50")))
+    factory_pool_idle_timeout_sec: float = float(os.getenv("FACTORY_POOL_IDLE_TIMEOUT_SEC", "300"))
+    factory_pool_ping_after_sec: float = float(os.getenv("FACTORY_POOL_PING_AFTER_SEC", "30"))  # проверка после простоя
+    factory_connect_timeout_sec: float = float(os.getenv("FACTORY_CONNECT_TIMEOUT_SEC", "15"))
+    # Сценарий обработки лида: steps - по шагам, pipeline - одной командой process_lead (включается явно)
+    factory_pipeline_mode: str = os.getenv("FACTORY_PIPELINE_MODE", "steps")
+    # Быстрый путь: без открытия /pro-leads, сразу страница лида (сессия проверяется на ней,
+    # при неудаче - полный путь через /pro-leads)
+    factory_fast_path: bool = os.getenv("FACTORY_FAST_PATH", "False").lower() == "true"
     
     # Celery Worker Pool
     worker_pool: str = os.getenv("CELERY_WORKER_POOL", "gevent")  # gevent или eventlet
@@ -3,14 +3,19 @@
 WebSocket клиент для подключения к "Заводу" (MS).
 Использует синхронную библиотеку websocket-client для работы с gevent.
 """
+import itertools
 import json
 import logging
 import time
-from typing import Optional, Dict, Any
+from typing import Optional, Dict, Any, Callable
 import websocket
+from factory_pool import FactoryConnectionPool, FactoryMultiplexer, PooledConnection
 
 logger = logging.getLogger(__name__)
 
+# Сквозной номер запроса процесса: request_id уникален и при повторе задачи (тот же task_id)
+_request_seq = itertools.count(1)
+
 
 class FactoryApiError(Exception):
     """Кастомная ошибка, если "Завод" (MS) вернул 'status: error'"""
@@ -22,7 +27,13 @@ class FactoryClient:
     WebSocket клиент для связи с browser_service.
     Использует синхронную библиотеку websocket-client (совместима с gevent).
     """
-    def __init__(self, factory_url: str, req_id_base: str):
+    def __init__(
+        self,
+        factory_url: str,
+        req_id_base: str,
+        pool: Optional[FactoryConnectionPool] = None,
+        mux: Optional[FactoryMultiplexer] = None
+    ):
         # Преобразуем ws:// в формат для websocket-client
         if factory_url.startswith("ws://"):
             self.factory_url = factory_url.replace("ws://", "ws://")
@@ -34,11 +45,27 @@ class FactoryClient:
         self.req_id_base = req_id_base
         self.ws: Optional[websocket.WebSocket] = None
         self.session_id: Optional[str] = None
+        # С пулом соединение берется из пула и возвращается в него в close()
+        self.pool = pool
+        self._conn: Optional[PooledConnection] = None
+        # С мультиплексором соединение общее для всех клиентов процесса, ответы - по response_to
+        self.mux = mux
+        # Соединение в неизвестном состоянии (обрыв, таймаут, чужой ответ) - в пул не возвращаем
+        self._broken = False
         logger.info(f"[{self.req_id_base}] [W1-Client] Инициализирован.")
 
     def connect(self):
         """Подключается к browser_service через WebSocket."""
         try:
+            self._broken = False
+            if self.mux is not None:
+                self.mux.connect()
+                return
+            if self.pool is not None:
+                self._conn = self.pool.acquire()
+                self.ws = self._conn.ws
+                logger.debug(f"[{self.req_id_base}] [W1-Client] Соединение с Заводом (MS) из пула.")
+                return
             # websocket-client создает синхронное соединение
             # gevent.monkey.patch_all() сделает его неблокирующим
             self.ws = websocket.create_connection(
@@ -51,7 +78,19 @@ class FactoryClient:
             raise FactoryApiError(f"Connection error: {e}")
     
     def close(self):
-        """Закрывает WebSocket соединение."""
+        """Закрывает WebSocket соединение (с пулом - возвращает его в пул, общее соединение mux не закрывается)."""
+        if self.mux is not None:
+            if self.session_id:
+                # Завод закроет сессию при обрыве общего соединения или при остановке
+                logger.warning(f"[{self.req_id_base}] [W1-Client] Сессия {self.session_id} осталась открытой.")
+            self.session_id = None
+            return
+        if self._conn is not None:
+            # Незакрытая сессия осталась бы на соединении - такое соединение закрываем
+            self.pool.release(self._conn, broken=self._broken or self.session_id is not None)
+            self._conn = None
+            self.ws = None
+            return
         if self.ws:
             try:
                 self.ws.close()
@@ -61,12 +100,21 @@ class FactoryClient:
             finally:
                 self.ws = None
 
-    def _send_and_receive(self, command: str, data: dict = None) -> Dict[str, Any]:
-        """Отправляет команду и ожидает ответ (синхронно, но неблокирующе через gevent)."""
-        if not self.ws:
+    def _send_and_receive(
+        self,
+        command: str,
+        data: dict = None,
+        on_progress: Optional[Callable[[Dict[str, Any]], None]] = None
+    ) -> Dict[str, Any]:
+        """
+        Отправляет команду и ожидает ответ (синхронно, но неблокирующе через gevent).
+        События {"status": "progress"} (команда process_lead) передаются в on_progress
+        до финального ответа; таймаут recv действует на каждое событие отдельно.
+        """
+        if not self.ws and self.mux is None:
             raise FactoryApiError("WebSocket не подключен.")
         
-        req_id = f"{self.req_id_base}-{command}"
+        req_id = f"{self.req_id_base}-{command}-{next(_request_seq)}"
         
         # Формируем payload
         payload = {
@@ -82,28 +130,61 @@ class FactoryClient:
         logger.debug(f"[{req_id}] -> {command} (Отправка)")
         
         try:
-            # Отправляем команду (gevent сделает это неблокирующим)
-            self.ws.send(json.dumps(payload))
-            
-            # Ожидаем ответ (gevent сделает это неблокирующим)
-            response_str = self.ws.recv()
-            response = json.loads(response_str)
+            if self.mux is not None:
+                # Общее соединение: ответ на этот запрос выбирает читатель мультиплексора
+                response = self.mux.request(payload, on_progress=on_progress)
+            else:
+                response = self._exchange(req_id, command, payload, on_progress)
             
             if response.get("status") == "error":
                 msg = response.get("error", response.get("message", "Неизвестная ошибка Завода (MS)"))
+                if response.get("step"):
+                    msg = f"[{response['step']}] {msg}"
                 logger.error(f"[{req_id}] <- Ошибка от Завода (MS): {msg}")
                 raise FactoryApiError(msg)
             
             logger.debug(f"[{req_id}] <- {command} (Успешно)")
             return response
             
+        except FactoryApiError:
+            raise
         except websocket.WebSocketException as e:
+            self._broken = True
             logger.error(f"[{req_id}] WebSocket ошибка: {e}")
             raise FactoryApiError(f"WebSocket error: {e}")
         except Exception as e:
+            self._broken = True
             logger.error(f"[{req_id}] Неожиданная ошибка: {e}")
             raise FactoryApiError(f"Unexpected error: {e}")
     
+    def _exchange(
+        self,
+        req_id: str,
+        command: str,
+        payload: Dict[str, Any],
+        on_progress: Optional[Callable[[Dict[str, Any]], None]] = None
+    ) -> Dict[str, Any]:
+        """Запрос по собственному соединению: отправка и чтение ответов до финального."""
+        # Отправляем команду (gevent сделает это неблокирующим)
+        self.ws.send(json.dumps(payload))
+        
+        while True:
+            # Ожидаем ответ (gevent сделает это неблокирующим)
+            response_str = self.ws.recv()
+            response = json.loads(response_str)
+            
+            # На переиспользуемом соединении ответ обязан относиться к этому запросу
+            response_to = response.get("response_to")
+            if response_to is not None and response_to != req_id:
+                self._broken = True
+                raise FactoryApiError(f"Ответ на чужой запрос: {response_to}")
+            
+            if response.get("status") != "progress":
+                return response
+            logger.debug(f"[{req_id}] <- {command}: шаг {response.get('step')} выполнен")
+            if on_progress:
+                on_progress(response)
+    
     def start_session(self, account_id: str) -> str:
         """Запрашивает создание новой сессии."""
         response = self._send_and_receive("session_start", {"account_id": account_id})
@@ -120,6 +201,8 @@ class FactoryClient:
                 self._send_and_receive("session_stop", {})
                 logger.info(f"[{self.req_id_base}] [W1-Client] Сессия {self.session_id} остановлена.")
             except Exception as e:
+                # Сессия могла остаться открытой - соединение закрываем, Завод очистит ее сам
+                self._broken = True
                 logger.warning(f"[{self.req_id_base}] [W1-Client] Ошибка при остановке сессии: {e}")
             finally:
                 self.session_id = None
@@ -134,3 +217,26 @@ class FactoryClient:
         
         response = self._send_and_receive(command, data)
         return response.get("result")
+    
+    def process_lead(
+        self,
+        account_id: str,
+        lead: dict,
+        message_text: Optional[str] = None,
+        on_progress: Optional[Callable[[Dict[str, Any]], None]] = None,
+        mode: str = "full"
+    ) -> Dict[str, Any]:
+        """
+        Весь сценарий обработки лида одной командой (сессию открывает и закрывает Завод).
+        mode: full - с открытием /pro-leads, fast - сразу на страницу лида.
+        Возвращает {"session_id", "full_name", "phone"}.
+        """
+        if self.session_id:
+            raise FactoryApiError("На соединении уже открыта пошаговая сессия.")
+        
+        response = self._send_and_receive(
+            "process_lead",
+            {"account_id": account_id, "lead": lead, "message_text": message_text, "mode": mode},
+            on_progress=on_progress
+        )
+        return response.get("result") or {}
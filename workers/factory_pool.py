@@ -0,0 +1,299 @@
+# factory_pool.py
+"""
+Соединения воркера с "Заводом" (MS).
+FactoryMultiplexer - одно соединение на процесс, по нему одновременно идут запросы всех
+greenlet'ов; ответ находится по response_to == request_id (отдельный greenlet-читатель).
+FactoryConnectionPool - пул соединений, одна сессия на соединение за раз
+(для Завода без мультиплексирования): перед выдачей давно простаивавшее соединение
+проверяется командой ping, простаивающие дольше idle_timeout закрываются при каждой
+выдаче и возврате (в том числе оставшиеся в пуле после затишья), сломанные - не возвращаются в пул.
+Работает под gevent (threading-примитивы и queue пропатчены monkey.patch_all()).
+"""
+import json
+import logging
+import os
+import queue
+import threading
+import time
+from collections import deque
+from typing import Any, Callable, Deque, Dict, Optional
+
+import websocket
+
+from config import CONFIG
+
+logger = logging.getLogger(__name__)
+
+
+class PooledConnection:
+    """WebSocket-соединение пула и время последнего использования."""
+
+    def __init__(self, ws: websocket.WebSocket):
+        self.ws = ws
+        self.created_at = time.monotonic()
+        self.last_used = self.created_at
+        self.sessions = 0
+
+    def close(self):
+        try:
+            self.ws.close()
+        except Exception:
+            pass
+
+
+class FactoryConnectionPool:
+    """
+    Ограниченный пул соединений к FACTORY_WS_URL (не больше max_size одновременно).
+    acquire() блокирует greenlet, пока не освободится соединение.
+    """
+
+    def __init__(
+        self,
+        url: str,
+        max_size: int,
+        idle_timeout_sec: float = 300.0,
+        ping_after_idle_sec: float = 30.0,
+        connect_timeout_sec: float = 15.0,
+    ):
+        self.url = url
+        self.max_size = max_size
+        self.idle_timeout_sec = idle_timeout_sec
+        self.ping_after_idle_sec = ping_after_idle_sec
+        self.connect_timeout_sec = connect_timeout_sec
+        self._idle: Deque[PooledConnection] = deque()
+        self._lock = threading.Lock()
+        self._slots = threading.BoundedSemaphore(max_size)
+        self.connects = 0
+        self.reuses = 0
+
+    def acquire(self, timeout: Optional[float] = None) -> PooledConnection:
+        """Выдает проверенное соединение (из пула или новое)."""
+        if not self._slots.acquire(timeout=timeout):
+            raise TimeoutError(f"Нет свободного соединения с Заводом за {timeout} сек")
+        try:
+            # После затишья release не вызывался - просроченные соединения закрываем здесь
+            self._evict_idle()
+            while True:
+                conn = self._pop_idle()
+                if conn is None:
+                    return self._connect()
+                if time.monotonic() - conn.last_used < self.ping_after_idle_sec or self._ping(conn):
+                    self.reuses += 1
+                    return conn
+                conn.close()
+        except Exception:
+            self._slots.release()
+            raise
+
+    def release(self, conn: PooledConnection, broken: bool = False):
+        """Возвращает соединение в пул; сломанное (или после ошибки протокола) закрывается."""
+        try:
+            if broken:
+                conn.close()
+                return
+            conn.last_used = time.monotonic()
+            conn.sessions += 1
+            with self._lock:
+                self._idle.append(conn)
+            self._evict_idle()
+        finally:
+            self._slots.release()
+
+    def close(self):
+        """Закрывает все простаивающие соединения."""
+        with self._lock:
+            idle, self._idle = list(self._idle), deque()
+        for conn in idle:
+            conn.close()
+
+    def stats(self) -> dict:
+        return {"idle": len(self._idle), "connects": self.connects, "reuses": self.reuses}
+
+    def _pop_idle(self) -> Optional[PooledConnection]:
+        # Самое свежее соединение - меньше шансов, что его закрыл сервер или балансировщик
+        with self._lock:
+            return self._idle.pop() if self._idle else None
+
+    def _evict_idle(self):
+        now = time.monotonic()
+        expired = []
+        with self._lock:
+            while self._idle and now - self._idle[0].last_used > self.idle_timeout_sec:
+                expired.append(self._idle.popleft())
+        for conn in expired:
+            conn.close()
+        if expired:
+            logger.info(f"[W1-Pool] Закрыто {len(expired)} простаивающих соединений")
+
+    def _connect(self) -> PooledConnection:
+        ws = websocket.create_connection(self.url, timeout=self.connect_timeout_sec)
+        self.connects += 1
+        logger.info(f"[W1-Pool] Новое соединение с Заводом (MS), всего открыто: {self.connects}")
+        return PooledConnection(ws)
+
+    def _ping(self, conn: PooledConnection) -> bool:
+        """Проверка соединения перед выдачей после простоя."""
+        request_id = f"ping-{id(conn)}-{time.monotonic_ns()}"
+        try:
+            conn.ws.send(json.dumps({"command": "ping", "request_id": request_id, "data": {}}))
+            response = json.loads(conn.ws.recv())
+            return response.get("status") == "ok" and response.get("response_to") == request_id
+        except Exception as e:
+            logger.info(f"[W1-Pool] Соединение не прошло проверку, переподключение: {e}")
+            return False
+
+
+class FactoryMultiplexer:
+    """
+    Одно WebSocket-соединение процесса воркера для всех одновременных запросов.
+    request() регистрирует request_id, отправляет команду и ждет свои ответы из очереди;
+    читатель раскладывает входящие ответы по очередям по response_to.
+    При обрыве все ожидающие запросы получают ошибку, следующий запрос переподключается.
+    """
+
+    def __init__(self, url: str, connect_timeout_sec: float = 15.0, response_timeout_sec: float = 60.0):
+        self.url = url
+        self.connect_timeout_sec = connect_timeout_sec
+        self.response_timeout_sec = response_timeout_sec
+        self._ws: Optional[websocket.WebSocket] = None
+        self._pending: Dict[str, queue.Queue] = {}
+        self._lock = threading.Lock()  # Соединение и _pending
+        self._connect_lock = threading.Lock()  # Одно подключение за раз; _lock на время подключения не держится
+        self._send_lock = threading.Lock()  # Кадры разных запросов не перемешиваются
+        self.connects = 0
+        self.requests = 0
+
+    def connect(self) -> websocket.WebSocket:
+        """
+        Возвращает текущее соединение (подключается, если его нет).
+        Переподключается один greenlet; остальные ждут его на _connect_lock, а читатель
+        и регистрация запросов (_lock) во время подключения не блокируются.
+        """
+        ws = self._ws
+        if ws is not None:
+            return ws
+        with self._connect_lock:
+            ws = self._ws
+            if ws is None:
+                ws = websocket.create_connection(self.url, timeout=self.connect_timeout_sec)
+                # Читатель ждет ответы без ограничения; таймауты - на уровне запросов
+                ws.settimeout(None)
+                with self._lock:
+                    self._ws = ws
+                self.connects += 1
+                threading.Thread(target=self._read_loop, args=(ws,), name="factory-mux-reader", daemon=True).start()
+                logger.info(f"[W1-Mux] Новое соединение с Заводом (MS), всего открыто: {self.connects}")
+            return ws
+
+    def request(
+        self,
+        payload: Dict[str, Any],
+        on_progress: Optional[Callable[[Dict[str, Any]], None]] = None
+    ) -> Dict[str, Any]:
+        """
+        Отправляет команду и возвращает финальный ответ на нее.
+        События {"status": "progress"} передаются в on_progress; response_timeout_sec - на каждое событие.
+        """
+        req_id = payload["request_id"]
+        events: queue.Queue = queue.Queue()
+        with self._lock:
+            if req_id in self._pending:
+                raise ValueError(f"request_id {req_id} уже ожидает ответа")
+            # Регистрируемся до отправки: обрыв соединения разбудит и этот запрос
+            self._pending[req_id] = events
+        try:
+            ws = self.connect()
+            with self._send_lock:
+                ws.send(json.dumps(payload))
+            self.requests += 1
+            while True:
+                try:
+                    response = events.get(timeout=self.response_timeout_sec)
+                except queue.Empty:
+                    raise TimeoutError(f"Нет ответа от Завода (MS) за {self.response_timeout_sec} сек")
+                if isinstance(response, Exception):
+                    raise response
+                if response.get("status") != "progress":
+                    return response
+                if on_progress:
+                    on_progress(response)
+        finally:
+            with self._lock:
+                self._pending.pop(req_id, None)
+
+    def close(self):
+        with self._lock:
+            ws, self._ws = self._ws, None
+        if ws is not None:
+            try:
+                ws.close()
+            except Exception:
+                pass
+
+    def stats(self) -> dict:
+        return {"pending": len(self._pending), "connects": self.connects, "requests": self.requests}
+
+    def _read_loop(self, ws: websocket.WebSocket):
+        try:
+            while True:
+                response = json.loads(ws.recv())
+                with self._lock:
+                    events = self._pending.get(response.get("response_to"))
+                if events is None:
+                    # Запрос уже завершился по таймауту - опоздавший ответ отбрасываем
+                    logger.debug(f"[W1-Mux] Ответ без ожидающего запроса: {response.get('response_to')}")
+                    continue
+                events.put(response)
+        except Exception as e:
+            with self._lock:
+                if self._ws is ws:
+                    self._ws = None
+                pending = list(self._pending.values())
+            if pending:
+                logger.warning(f"[W1-Mux] Соединение с Заводом (MS) потеряно, запросов в работе: {len(pending)}: {e}")
+            error = ConnectionError(f"Соединение с Заводом (MS) потеряно: {e}")
+            for events in pending:
+                events.put(error)
+            try:
+                ws.close()
+            except Exception:
+                pass
+
+
+_pool: Optional[FactoryConnectionPool] = None
+_pool_pid: Optional[int] = None
+_pool_lock = threading.Lock()
+
+
+def get_factory_pool() -> FactoryConnectionPool:
+    """Пул процесса воркера (после fork создается заново)."""
+    global _pool, _pool_pid
+    with _pool_lock:
+        if _pool is None or _pool_pid != os.getpid():
+            _pool = FactoryConnectionPool(
+                CONFIG.factory_ws_url,
+                max_size=CONFIG.factory_pool_size,
+                idle_timeout_sec=CONFIG.factory_pool_idle_timeout_sec,
+                ping_after_idle_sec=CONFIG.factory_pool_ping_after_sec,
+                connect_timeout_sec=CONFIG.factory_connect_timeout_sec,
+            )
+            _pool_pid = os.getpid()
+        return _pool
+
+
+_mux: Optional[FactoryMultiplexer] = None
+_mux_pid: Optional[int] = None
+
+
+def get_factory_mux() -> FactoryMultiplexer:
+    """Мультиплексированное соединение процесса воркера (после fork создается заново)."""
+    global _mux, _mux_pid
+    with _pool_lock:
+        if _mux is None or _mux_pid != os.getpid():
+            _mux = FactoryMultiplexer(
+                CONFIG.factory_ws_url,
+                connect_timeout_sec=CONFIG.factory_connect_timeout_sec,
+                response_timeout_sec=CONFIG.factory_response_timeout_sec,
+            )
+            _mux_pid = os.getpid()
+        return _mux
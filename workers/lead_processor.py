@@ -5,9 +5,10 @@
 """
 import logging
 import os
-from typing import Dict, Any
+from typing import Dict, Any, Optional, Tuple
 import config
 from factory_client import FactoryClient, FactoryApiError
+from factory_pool import get_factory_mux, get_factory_pool
 
 logger = logging.getLogger(__name__)
 
@@ -22,35 +23,21 @@ class LeadProcessor:
         self.account_id = account_id
         self.lead_data = lead_data
         self.req_id_base = f"lead-{self.lead_data.get('lead_key', 'unknown')}-{task_id[:8]}"
-        self.client = FactoryClient(config.FACTORY_API_URL, self.req_id_base)
+        # Соединение с Заводом общее для процесса (mux) или берется из пула (без нового handshake на каждый лид)
+        if config.CONFIG.factory_connection_mode == "mux":
+            self.client = FactoryClient(config.FACTORY_API_URL, self.req_id_base, mux=get_factory_mux())
+        else:
+            self.client = FactoryClient(config.FACTORY_API_URL, self.req_id_base, pool=get_factory_pool())
 
     def process_lead(self) -> Dict[str, Any]:
-        """Выполняет весь пошаговый сценарий обработки лида (синхронно)."""
+        """Выполняет весь сценарий обработки лида (синхронно)."""
         try:
-            # Подключение и старт сессии
             self.client.connect()
-            self.client.start_session(self.account_id)
+            if config.CONFIG.factory_pipeline_mode == "pipeline":
+                full_name, phone = self._run_pipeline()
+            else:
+                full_name, phone = self._run_steps()
             
-            # Выполнение шагов обработки
-            self.client.execute_step("step_open_leads")
-            
-            self.client.execute_step(
-                "step_open_lead_details",
-                {"lead": self.lead_data}
-            )
-            
-            name_result = self.client.execute_step("step_extract_full_name")
-            full_name = name_result.get("full_name") if name_result else None
-            
-            message = self.lead_data.get("message_template")
-            self.client.execute_step(
-                "step_send_message",
-                {"message_text": message}
-            )
-            
-            phone_result = self.client.execute_step("step_extract_phone")
-            phone = phone_result.get("phone") if phone_result else None
-
             # Формируем результат
             lead_key = self.lead_data.get("lead_key", "unknown")
             href = self.lead_data.get("href", "") or ""
@@ -84,7 +71,7 @@ class LeadProcessor:
             logger.error(f"[{self.req_id_base}] [W1-Мозг] Необработанная ошибка: {e}", exc_info=True)
             raise
         finally:
-            # Гарантированная очистка ресурсов
+            # Гарантированная очистка ресурсов (в режиме pipeline сессию закрывает Завод)
             logger.info(f"[{self.req_id_base}] [W1-Мозг] Очистка ресурсов...")
             try:
                 self.client.stop_session()
@@ -92,3 +79,48 @@ class LeadProcessor:
                 logger.warning(f"[{self.req_id_base}] [W1-Мозг] Ошибка при остановке сессии: {e}")
             finally:
                 self.client.close()
+    
+    def _run_pipeline(self) -> Tuple[Optional[str], Optional[str]]:
+        """Сценарий одной командой process_lead: один запрос вместо нескольких, прогресс - событиями."""
+        def on_progress(event: Dict[str, Any]):
+            logger.info(f"[{self.req_id_base}] [W1-Мозг] Шаг {event.get('step')} выполнен")
+        
+        result = self.client.process_lead(
+            self.account_id,
+            self.lead_data,
+            message_text=self.lead_data.get("message_template"),
+            on_progress=on_progress,
+            mode="fast" if config.CONFIG.factory_fast_path else "full"
+        )
+        return result.get("full_name"), result.get("phone")
+    
+    def _run_steps(self) -> Tuple[Optional[str], Optional[str]]:
+        """Пошаговый сценарий (каждый шаг - отдельный запрос), для отладки."""
+        self.client.start_session(self.account_id)
+        
+        if config.CONFIG.factory_fast_path:
+            # Одна навигация сразу на страницу лида (логин проверяется на ней)
+            self.client.execute_step(
+                "step_open_lead_fast",
+                {"lead": self.lead_data}
+            )
+        else:
+            self.client.execute_step("step_open_leads")
+            
+            self.client.execute_step(
+                "step_open_lead_details",
+                {"lead": self.lead_data}
+            )
+        
+        name_result = self.client.execute_step("step_extract_full_name")
+        full_name = name_result.get("full_name") if name_result else None
+        
+        message = self.lead_data.get("message_template")
+        self.client.execute_step(
+            "step_send_message",
+            {"message_text": message}
+        )
+        
+        phone_result = self.client.execute_step("step_extract_phone")
+        phone = phone_result.get("phone") if phone_result else None
+        return full_name, phone